@@ -1,13 +1,32 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import path
+from django.utils.translation import gettext as _
 
+from cms.constants import DUPLICATE_APPROVED, DUPLICATE_REJECTED
 from cms.forms import ProductAttributeForm, AttributeTypeForm
 from cms.models import Website, Url, Category, Selector, Unit, Product, ProductAttribute, WebsiteProductAttribute, \
-    ProductImage, AttributeType, CategoryAttributeConfig, SpiderResult, EprelCategory, Brand
+    ProductImage, AttributeType, CategoryAttributeConfig, SpiderResult, EprelCategory, Brand, ChangeEvent, ProductAlias, \
+    AttributeTypeAlias, DuplicateCandidate
+from cms.pagination import EstimatedCountPaginator
+from cms.tasks import queue_duplicate_detection, merge_approved_duplicates, queue_product_scores_update
 from cms.views.admin import ProductMapView, AttributeTypeMapView, ProductAttributeBulkCreateView, \
     AttributeTypeConversionView, ProductBrandBulkUpdateView
 
 
+class LargeTableAdminMixin:
+    """Pages through tables with millions of rows without counting them, see EstimatedCountPaginator."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ProductScoresAdminMixin:
+    """Rescores the categories of product attributes changed in the admin, once the change commits."""
+
+    def queue_scores_update(self, category_ids) -> None:
+        for category_id in set(category_ids) - {None}:
+            queue_product_scores_update(category_id)
+
+
 class SelectorInlineAdmin(admin.TabularInline):
     model = Selector
     extra = 0
@@ -19,6 +38,7 @@ class SelectorInlineAdmin(admin.TabularInline):
 class WebsiteAdmin(admin.ModelAdmin):
     list_display = 'id', 'name', 'domain'
     list_editable = 'name', 'domain'
+    search_fields = 'name', 'domain',
     inlines = SelectorInlineAdmin,
 
 
@@ -27,6 +47,7 @@ class UrlAdmin(admin.ModelAdmin):
     list_display = 'id', 'website', 'category', 'url', 'url_type', 'last_scanned'
     list_editable = 'website', 'category', 'url', 'url_type'
     list_filter = 'website', 'category', 'url_type'
+    list_select_related = 'website', 'category',
     exclude = 'last_scanned',
 
 
@@ -34,8 +55,12 @@ class CategoryAttributeConfigInlineAdmin(admin.TabularInline):
     model = CategoryAttributeConfig
     extra = 0
     fields = 'order', 'attribute_type', 'weight', 'scoring', 'publish',
+    autocomplete_fields = 'attribute_type',
     show_change_link = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('attribute_type', 'company')
+
 
 class EprelCategoryInlineAdmin(admin.TabularInline):
     model = EprelCategory
@@ -55,7 +80,16 @@ class CategoryUrlInlineAdmin(admin.TabularInline):
 class CategoryAdmin(admin.ModelAdmin):
     list_display = 'id', 'name', 'parent', 'alternate_names',
     list_filter = 'parent',
+    list_select_related = 'parent',
+    search_fields = 'name',
     inlines = CategoryAttributeConfigInlineAdmin, EprelCategoryInlineAdmin, CategoryUrlInlineAdmin,
+    actions = 'detect_duplicates',
+
+    def detect_duplicates(self, request, queryset):
+        for category in queryset:
+            queue_duplicate_detection(category.pk)
+        self.message_user(request, _('Duplicate detection queued for {count} categories.').format(count=len(queryset)))
+    detect_duplicates.short_description = _('Detect duplicate products')
 
 
 @admin.register(Unit)
@@ -67,10 +101,14 @@ class ProductAttributeInlineAdmin(admin.TabularInline):
     model = ProductAttribute
     extra = 0
     fields = 'attribute_type', 'data',
+    autocomplete_fields = 'attribute_type',
     show_change_link = True
     classes = ['collapse']
     form = ProductAttributeForm
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'attribute_type__unit')
+
 
 class ProductImageInlineAdmin(admin.TabularInline):
     model = ProductImage
@@ -80,20 +118,44 @@ class ProductImageInlineAdmin(admin.TabularInline):
     classes = ['collapse']
 
 
+class AliasInlineAdmin(admin.TabularInline):
+    """Aliases are derived from names and alternate names when the object is saved, so they're read only."""
+    extra = 0
+    fields = 'alias', 'category',
+    readonly_fields = 'alias', 'category',
+    can_delete = False
+    classes = ['collapse']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class ProductAliasInlineAdmin(AliasInlineAdmin):
+    model = ProductAlias
+
+
+class AttributeTypeAliasInlineAdmin(AliasInlineAdmin):
+    model = AttributeTypeAlias
+
+
 class ProductInlineAdmin(admin.TabularInline):
     model = Product
     extra = 0
     fields = 'model', 'category',
+    autocomplete_fields = 'category',
     show_change_link = True
     classes = ['collapse']
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdminMixin, ProductScoresAdminMixin, admin.ModelAdmin):
     list_display = 'id', 'model', 'category', 'brand', 'alternate_models',
     list_filter = 'category', 'brand',
+    list_select_related = 'category', 'brand',
     list_per_page = 25
-    inlines = ProductAttributeInlineAdmin, ProductImageInlineAdmin,
+    search_fields = 'model',
+    autocomplete_fields = 'category', 'brand',
+    inlines = ProductAttributeInlineAdmin, ProductImageInlineAdmin, ProductAliasInlineAdmin,
 
     def get_urls(self):
         return [
@@ -102,19 +164,52 @@ class ProductAdmin(admin.ModelAdmin):
             path('map_product_brands/', self.admin_site.admin_view(ProductBrandBulkUpdateView.as_view()), name="map_product_brands"),
         ] + super().get_urls()
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # attributes edited inline, or the product moving category, change the scores of the product's categories
+        self.queue_scores_update([form.instance.category_id, form.initial.get('category')])
+
 
 @admin.register(WebsiteProductAttribute)
-class WebsiteProductAttributeAdmin(admin.ModelAdmin):
+class WebsiteProductAttributeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = 'id', 'website', 'attribute_type', 'data', 'product',
     list_editable = 'data',
-    list_filter = 'website', 'product', 'product__category', 'attribute_type',
+    # filtering by product lists every product, so products are searched instead
+    list_filter = 'website', 'product__category', 'attribute_type',
+    list_select_related = 'website', 'attribute_type', 'product',
+    search_fields = 'product__model',
+    autocomplete_fields = 'website', 'attribute_type', 'product',
+
+
+@admin.register(ProductAttribute)
+class ProductAttributeAdmin(LargeTableAdminMixin, ProductScoresAdminMixin, admin.ModelAdmin):
+    list_display = 'id', 'product', 'attribute_type', 'data',
+    list_filter = 'product__category', 'attribute_type',
+    list_select_related = 'product', 'attribute_type',
+    search_fields = 'product__model',
+    autocomplete_fields = 'product', 'attribute_type',
+
+    def save_model(self, request, obj: ProductAttribute, form, change):
+        super().save_model(request, obj, form, change)
+        self.queue_scores_update([obj.product.category_id])
+
+    def delete_model(self, request, obj: ProductAttribute):
+        super().delete_model(request, obj)
+        self.queue_scores_update([obj.product.category_id])
+
+    def delete_queryset(self, request, queryset):
+        category_ids = list(queryset.values_list('product__category_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        self.queue_scores_update(category_ids)
 
 
 @admin.register(AttributeType)
 class AttributeTypeAdmin(admin.ModelAdmin):
     list_display = 'id', 'name', 'alternate_names', 'unit', 'category',
     list_filter = 'name', 'alternate_names', 'unit', 'category',
-    inlines = ProductAttributeInlineAdmin,
+    list_select_related = 'unit', 'category',
+    search_fields = 'name',
+    inlines = ProductAttributeInlineAdmin, AttributeTypeAliasInlineAdmin,
     form = AttributeTypeForm
 
     def get_urls(self):
@@ -127,9 +222,42 @@ class AttributeTypeAdmin(admin.ModelAdmin):
 @admin.register(SpiderResult)
 class SpiderResultAdmin(admin.ModelAdmin):
     list_display = 'created', 'spider_name', 'website', 'category', 'items_scraped',
+    list_select_related = 'website', 'category',
 
 
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     list_display = 'name', 'image', 'website',
+    search_fields = 'name',
     inlines = ProductInlineAdmin,
+
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = 'created', 'category', 'version', 'event_type', 'product', 'attribute_type', 'data',
+    list_filter = 'event_type', 'category',
+    list_select_related = 'category', 'product', 'attribute_type',
+    raw_id_fields = 'product', 'attribute_type',
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = 'product_model', 'duplicate_model', 'category', 'score', 'model_similarity', 'spec_agreement', 'status', 'modified',
+    list_filter = 'status', 'category',
+    list_select_related = 'category',
+    search_fields = 'product_model', 'duplicate_model',
+    raw_id_fields = 'product', 'duplicate',
+    actions = 'approve', 'reject', 'merge_approved',
+
+    def approve(self, request, queryset):
+        self.message_user(request, _('{count} candidates approved.').format(count=queryset.pending().update(status=DUPLICATE_APPROVED)))
+    approve.short_description = _('Approve selected candidates')
+
+    def reject(self, request, queryset):
+        self.message_user(request, _('{count} candidates rejected.').format(count=queryset.pending().update(status=DUPLICATE_REJECTED)))
+    reject.short_description = _('Reject selected candidates')
+
+    def merge_approved(self, request, queryset):
+        merge_approved_duplicates.delay()
+        self.message_user(request, _('Approved candidates queued to be merged.'), messages.INFO)
+    merge_approved.short_description = _('Merge all approved candidates')
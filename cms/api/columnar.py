@@ -0,0 +1,59 @@
+import io
+import itertools
+import tempfile
+from typing import Iterable, Iterator, Sequence, Any, IO
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PRICE_HISTORY_SCHEMA = pa.schema([
+    ('product_id', pa.int64()),
+    ('website', pa.dictionary(pa.int32(), pa.string())),
+    ('price', pa.float64()),
+    ('created', pa.timestamp('us', tz='UTC')),
+])
+
+
+def record_batches(schema: pa.Schema, rows: Iterable[Sequence[Any]], batch_size: int) -> Iterator[pa.RecordBatch]:
+    """
+    Converts rows, in the order of the schema's fields, into record batches of up to batch_size rows.
+    Rows should be a lazy iterable, such as a queryset iterator, so only one batch is held in memory at a time.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, batch_size))
+        if not chunk:
+            return
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)]
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def arrow_stream(schema: pa.Schema, batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    """Yields record batches serialized in the Arrow IPC streaming format, one message at a time."""
+    sink = io.BytesIO()
+
+    def flush() -> bytes:
+        data: bytes = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield flush()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield flush()
+    yield flush()
+
+
+def parquet_file(schema: pa.Schema, batches: Iterable[pa.RecordBatch]) -> IO:
+    """
+    Writes record batches to a temporary parquet file, a row group per batch.
+    Parquet's footer is written last, so the file can't be streamed as it is built.
+    """
+    file: IO = tempfile.TemporaryFile()
+    with pq.ParquetWriter(file, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    file.seek(0)
+    return file
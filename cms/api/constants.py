@@ -0,0 +1,8 @@
+COLUMNAR_ARROW = 'arrow'
+COLUMNAR_PARQUET = 'parquet'
+COLUMNAR_CONTENT_TYPES = {
+    COLUMNAR_ARROW: 'application/vnd.apache.arrow.stream',
+    COLUMNAR_PARQUET: 'application/vnd.apache.parquet',
+}
+# days of price history returned when no start date is given
+PRICE_HISTORY_DEFAULT_DAYS = 30
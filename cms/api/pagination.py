@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ModifiedCursorPagination(CursorPagination):
+    """
+    Keyset pagination in order of modification, so bulk consumers can page through large tables at a constant cost per page
+    and resume from their last cursor to pick up only what has changed since.
+    """
+    ordering = ('modified', 'pk')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
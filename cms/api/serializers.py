@@ -1,5 +1,12 @@
+import datetime
+from typing import List
+
+from django.utils import timezone
 from rest_framework import serializers
 
+from cms.api.constants import PRICE_HISTORY_DEFAULT_DAYS
+from cms.dashboard.models import CategoryTable
+from cms.models import Product, ProductAttribute, WebsiteProductAttribute
 from cms.settings import ADMINS
 from cms.tasks import send_email
 
@@ -14,3 +21,128 @@ class ContactSerializer(serializers.Serializer):
         html += f'<p>{self.validated_data["email"]}</p>'
         html += f'<p>{self.validated_data["message"]}</p>'
         send_email.delay('Contact', html, [email for name, email in ADMINS])
+
+
+class SparseFieldsetMixin:
+    """Limits the serialized fields to those listed in the request's comma separated fields parameter, if given."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields: str = request.query_params.get('fields') if request else None
+        if fields:
+            for field_name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(field_name)
+
+
+class SpecSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='attribute_type.name', default=None)
+    unit = serializers.CharField(source='attribute_type.unit.name', default=None)
+    value = serializers.JSONField(source='data.value')
+
+    class Meta:
+        model = ProductAttribute
+        fields = 'name', 'value', 'unit',
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    category = serializers.StringRelatedField()
+    brand = serializers.StringRelatedField()
+    price = serializers.IntegerField(source='current_average_price_int', read_only=True)
+    score = serializers.FloatField(read_only=True)
+    specs = SpecSerializer(source='productattributes', many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = 'id', 'model', 'alternate_models', 'category', 'brand', 'price', 'score', 'specs', 'created', 'modified',
+
+
+class PriceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    website = serializers.StringRelatedField()
+    currency = serializers.CharField(source='attribute_type.unit.name', default=None)
+    value = serializers.JSONField(source='data.value')
+
+    class Meta:
+        model = WebsiteProductAttribute
+        fields = 'id', 'product', 'website', 'value', 'currency', 'created', 'modified',
+
+
+class CategoryTableSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    category = serializers.StringRelatedField()
+    x_axis_attribute = serializers.StringRelatedField()
+    y_axis_attribute = serializers.StringRelatedField()
+    specs = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CategoryTable
+        fields = 'id', 'name', 'category', 'x_axis_attribute', 'x_axis_values', 'y_axis_attribute', 'y_axis_values', 'specs', 'created', 'modified',
+
+    def get_specs(self, table: CategoryTable):
+        return [str(table_attribute.attribute) for table_attribute in table.category_table_attributes.all()]
+
+
+class CategoryTableDetailSerializer(CategoryTableSerializer):
+    """A category table along with its computed grid, as a row for each product in the order of header."""
+    header = serializers.ListField(source='export_header', read_only=True)
+    rows = serializers.SerializerMethodField()
+
+    class Meta(CategoryTableSerializer.Meta):
+        fields = CategoryTableSerializer.Meta.fields + ('header', 'rows',)
+
+    def get_rows(self, table: CategoryTable):
+        return list(table.export_rows())
+
+
+class ModifiedAfterQuerySerializer(serializers.Serializer):
+    """Validates the query of the read only endpoints, which can be limited to results changed since modified_after."""
+    modified_after = serializers.DateTimeField(required=False)
+
+
+class ProductQuerySerializer(ModifiedAfterQuerySerializer):
+    category = serializers.IntegerField(required=False)
+    brand = serializers.IntegerField(required=False)
+
+
+class PriceQuerySerializer(ModifiedAfterQuerySerializer):
+    product = serializers.IntegerField(required=False)
+    website = serializers.IntegerField(required=False)
+
+
+class PriceHistoryQuerySerializer(serializers.Serializer):
+    """
+    Validates the query of the bulk price history endpoint.
+    Products are selected by exactly one of a comma separated list of ids, a category, or a category table in the user's company.
+    """
+    products = serializers.CharField(required=False)
+    category = serializers.IntegerField(required=False)
+    table = serializers.IntegerField(required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate_products(self, value: str) -> List[int]:
+        try:
+            return [int(product_id) for product_id in value.split(',')]
+        except ValueError:
+            raise serializers.ValidationError("Enter a comma separated list of product ids.")
+
+    def validate_table(self, value: int) -> CategoryTable:
+        try:
+            return CategoryTable.objects.for_user(self.context['request'].user).get(pk=value)
+        except CategoryTable.DoesNotExist:
+            raise serializers.ValidationError("Category table not found.")
+
+    def validate(self, attrs: dict) -> dict:
+        if len({'products', 'category', 'table'} & set(attrs)) != 1:
+            raise serializers.ValidationError("Select products by exactly one of products, category or table.")
+        attrs.setdefault('end', timezone.now())
+        attrs.setdefault('start', attrs['end'] - datetime.timedelta(days=PRICE_HISTORY_DEFAULT_DAYS))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("The start must be before the end.")
+        return attrs
+
+    def get_products(self):
+        if 'table' in self.validated_data:
+            return self.validated_data['table'].get_products.values('pk')
+        if 'category' in self.validated_data:
+            return Product.objects.filter(category_id=self.validated_data['category'])
+        return Product.objects.filter(pk__in=self.validated_data['products'])
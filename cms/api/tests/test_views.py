@@ -0,0 +1,180 @@
+import datetime
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_mommy import mommy
+from rest_framework.response import Response
+
+from cms.accounts.models import Company
+from cms.dashboard.models import CategoryTable, CategoryTableAttribute
+from cms.models import Product, ProductAttribute, AttributeType, Category, WebsiteProductAttribute, ProductScore
+
+
+class TestViews(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.company: Company = mommy.make(Company)
+        cls.user: User = User.objects.create_user('testuser', password='password')
+        cls.user.profile.company = cls.company
+        cls.user.save()
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:products-list')).status_code, 403)
+
+    def test_products(self):
+        category: Category = mommy.make(Category)
+        load_size: AttributeType = mommy.make(AttributeType, name="load size", unit__name="kilogram")
+        products = mommy.make(Product, category=category, brand__name="brand", _quantity=3)
+        for product in products:
+            mommy.make(ProductAttribute, product=product, attribute_type=load_size, data={'value': 7})
+        mommy.make(ProductScore, product=products[0], category=category, company=self.company, score=80)
+
+        with self.subTest("specs and company scores"):
+            response: Response = self.client.get(reverse('api:products-list'))
+            self.assertEqual([product['id'] for product in response.json()['results']], [product.pk for product in products])
+            product_data: dict = response.json()['results'][0]
+            self.assertEqual(product_data['specs'], [{'name': 'load size', 'value': 7, 'unit': 'kilogram'}])
+            self.assertEqual(product_data['brand'], 'brand')
+            self.assertEqual(product_data['score'], 80)
+
+        with self.subTest("constant number of queries"):
+            def page_queries() -> int:
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(reverse('api:products-list')).status_code, 200)
+                return len(queries)
+
+            queries: int = page_queries()
+            mommy.make(Product, category=category, _quantity=5)
+            self.assertEqual(page_queries(), queries)
+
+        with self.subTest("sparse fieldsets"):
+            response: Response = self.client.get(reverse('api:products-list'), {'fields': 'id,model'})
+            self.assertEqual(set(response.json()['results'][0]), {'id', 'model'})
+
+        with self.subTest("cursor pagination"):
+            response: Response = self.client.get(reverse('api:products-list'), {'page_size': 2})
+            self.assertEqual(len(response.json()['results']), 2)
+            response = self.client.get(response.json()['next'])
+            self.assertEqual(response.json()['results'][0]['id'], products[2].pk)
+
+        with self.subTest("modified after"):
+            since: str = timezone.now().isoformat()
+            products[1].save()
+            response: Response = self.client.get(reverse('api:products-list'), {'modified_after': since})
+            self.assertEqual([product['id'] for product in response.json()['results']], [products[1].pk])
+            self.assertEqual(self.client.get(reverse('api:products-list'), {'modified_after': 'yesterday'}).status_code, 400)
+
+        with self.subTest("modified after a change to specs, prices or scores"):
+            since: str = products[1].modified.isoformat()
+            self.assertEqual(self.client.get(reverse('api:products-list'), {'modified_after': since}).json()['results'], [])
+            mommy.make(ProductAttribute, product=products[0])
+            mommy.make(WebsiteProductAttribute, product=products[2], attribute_type__name="price", data={'value': 10})
+            response: Response = self.client.get(reverse('api:products-list'), {'modified_after': since})
+            self.assertEqual({product['id'] for product in response.json()['results']}, {products[0].pk, products[2].pk})
+
+        with self.subTest("invalid filters"):
+            for params in [{'category': 'washers'}, {'brand': '1,2'}]:
+                self.assertEqual(self.client.get(reverse('api:products-list'), params).status_code, 400, params)
+
+        with self.subTest("etag"):
+            response: Response = self.client.get(reverse('api:products-detail', kwargs={'pk': products[0].pk}))
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse('api:products-detail', kwargs={'pk': products[0].pk}), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            products[0].model = "changed"
+            products[0].save()
+            response = self.client.get(reverse('api:products-detail', kwargs={'pk': products[0].pk}), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+
+    def test_prices(self):
+        product: Product = mommy.make(Product)
+        price_attr: AttributeType = mommy.make(AttributeType, name="price", unit__name="euro")
+        price: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, product=product, attribute_type=price_attr, website__name="shop", data={'value': 99.99})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr)
+        mommy.make(WebsiteProductAttribute, product=product)
+        self.assertEqual(self.client.get(reverse('api:prices-list'), {'website': 'shop'}).status_code, 400)
+        response: Response = self.client.get(reverse('api:prices-list'), {'product': product.pk})
+        self.assertEqual(response.json()['results'], [{
+            'id': price.pk,
+            'product': product.pk,
+            'website': 'shop',
+            'value': 99.99,
+            'currency': 'euro',
+            'created': response.json()['results'][0]['created'],
+            'modified': response.json()['results'][0]['modified'],
+        }])
+
+    def test_category_tables(self):
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        table: CategoryTable = mommy.make(CategoryTable, user=self.user, category=mommy.make(Category), name="table")
+        mommy.make(CategoryTableAttribute, table=table, attribute__name="load size")
+        mommy.make(CategoryTable, name="other company's table")
+        product: Product = mommy.make(Product, model="model a", category=table.category)
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product=product, data={'value': 100})
+
+        with self.subTest("company scoped"):
+            response: Response = self.client.get(reverse('api:category-tables-list'))
+            self.assertEqual([table['name'] for table in response.json()['results']], ["table"])
+            self.assertEqual(response.json()['results'][0]['specs'], ["load size"])
+
+        with self.subTest("rows"):
+            response: Response = self.client.get(reverse('api:category-tables-detail', kwargs={'pk': table.pk}))
+            self.assertEqual(response.json()['header'], ['', '', 'Model', 'Brand', 'Price', 'load size'])
+            self.assertEqual(response.json()['rows'], [[None, None, 'model a', '', 100, None]])
+
+    def test_price_history(self):
+        category: Category = mommy.make(Category)
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        products = mommy.make(Product, category=category, _quantity=2)
+        now: datetime.datetime = timezone.now()
+        for days_ago, product in [(1, products[0]), (2, products[0]), (3, products[1]), (60, products[1])]:
+            price: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, product=product, attribute_type=price_attr, website__name=f"shop {days_ago}", data={'value': days_ago * 10})
+            WebsiteProductAttribute.objects.filter(pk=price.pk).update(created=now - datetime.timedelta(days=days_ago))
+        mommy.make(WebsiteProductAttribute, product=products[0], data={'value': 1})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, data={'value': 1})
+        table: CategoryTable = mommy.make(CategoryTable, user=self.user, category=category)
+
+        def read_arrow(**params) -> pd.DataFrame:
+            response = self.client.get(reverse('api:price-history', kwargs={'export_format': 'arrow'}), params)
+            self.assertEqual(response.status_code, 200)
+            return pa.ipc.open_stream(b''.join(response.streaming_content)).read_pandas()
+
+        with self.subTest("product ids"):
+            df: pd.DataFrame = read_arrow(products=f"{products[0].pk},{products[1].pk}")
+            self.assertEqual(list(df.columns), ['product_id', 'website', 'price', 'created'])
+            self.assertEqual(list(df['product_id']), [products[0].pk, products[0].pk, products[1].pk])
+            self.assertEqual(list(df['price']), [20.0, 10.0, 30.0])
+            self.assertEqual(list(df['website']), ["shop 2", "shop 1", "shop 3"])
+
+        with self.subTest("date range"):
+            df: pd.DataFrame = read_arrow(category=category.pk, start=(now - datetime.timedelta(days=90)).isoformat(), end=(now - datetime.timedelta(days=2, hours=1)).isoformat())
+            self.assertEqual(list(df['price']), [600.0, 30.0])
+
+        with self.subTest("category table"):
+            self.assertEqual(len(read_arrow(table=table.pk)), 3)
+
+        with self.subTest("parquet"):
+            response = self.client.get(reverse('api:price-history', kwargs={'export_format': 'parquet'}), {'category': category.pk})
+            df: pd.DataFrame = pd.read_parquet(BytesIO(b''.join(response.streaming_content)))
+            self.assertEqual(list(df['price']), [20.0, 10.0, 30.0])
+
+        with self.subTest("invalid queries"):
+            other_table: CategoryTable = mommy.make(CategoryTable, category=category)
+            for params in [{}, {'products': 'a,b'}, {'products': products[0].pk, 'category': category.pk}, {'table': other_table.pk},
+                           {'category': category.pk, 'start': now.isoformat(), 'end': (now - datetime.timedelta(days=1)).isoformat()}]:
+                response = self.client.get(reverse('api:price-history', kwargs={'export_format': 'arrow'}), params)
+                self.assertEqual(response.status_code, 400, params)
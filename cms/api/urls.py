@@ -1,9 +1,16 @@
 from django.conf.urls import url
+from rest_framework.routers import DefaultRouter
 
-from cms.api.views import Contact
+from cms.api.views import Contact, Products, Prices, CategoryTables, PriceHistory
 
 app_name = 'api'
 
+router = DefaultRouter()
+router.register(r'products', Products, basename='products')
+router.register(r'prices', Prices, basename='prices')
+router.register(r'category-tables', CategoryTables, basename='category-tables')
+
 urlpatterns = [
     url(r'contact/$', Contact.as_view(), name='contact'),
-]
+    url(r'price-history\.(?P<export_format>arrow|parquet)$', PriceHistory.as_view(), name='price-history'),
+] + router.urls
@@ -1,9 +1,29 @@
+import datetime
+import hashlib
+import json
+from typing import Dict, Any
+
+from django.db.models import Prefetch, FloatField, QuerySet
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.http import HttpResponseNotModified, StreamingHttpResponse, FileResponse
+from django.utils.functional import cached_property
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
-from rest_framework.viewsets import ViewSet
+from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from cms.api.serializers import ContactSerializer
+from cms.api.columnar import PRICE_HISTORY_SCHEMA, record_batches, arrow_stream, parquet_file
+from cms.api.constants import COLUMNAR_PARQUET, COLUMNAR_CONTENT_TYPES
+from cms.api.pagination import ModifiedCursorPagination
+from cms.api.serializers import ContactSerializer, ProductSerializer, PriceSerializer, CategoryTableSerializer, \
+    CategoryTableDetailSerializer, PriceHistoryQuerySerializer, ModifiedAfterQuerySerializer, ProductQuerySerializer, \
+    PriceQuerySerializer
+from cms.dashboard.constants import EXPORT_CHUNK_SIZE
+from cms.dashboard.models import CategoryTable, CategoryTableAttribute
+from cms.models import Product, ProductAttribute, WebsiteProductAttribute, ProductQuerySet
 
 
 class Contact(APIView):
@@ -15,3 +35,125 @@ class Contact(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class ETagMixin:
+    """
+    Adds an ETag of the response data to successful reads, and answers 304 Not Modified when it matches If-None-Match,
+    so consumers polling for changes don't download data they already have.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD') or response.status_code != status.HTTP_200_OK:
+            return response
+        etag: str = f'"{hashlib.md5(json.dumps(response.data, cls=JSONEncoder, sort_keys=True).encode()).hexdigest()}"'
+        if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+
+class ReadOnlyAPIViewSet(ETagMixin, ReadOnlyModelViewSet):
+    """
+    Read only endpoints paginated in order of modification.
+    A modified_after parameter limits results to those changed since a timestamp, for incremental pulls.
+    Query parameters are validated with query_serializer_class, answering 400 Bad Request when they're invalid.
+    """
+    permission_classes = IsAuthenticated,
+    pagination_class = ModifiedCursorPagination
+    query_serializer_class = ModifiedAfterQuerySerializer
+
+    @cached_property
+    def query(self) -> Dict[str, Any]:
+        serializer = self.query_serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def filter_modified_after(self, queryset: QuerySet, modified_after: datetime.datetime) -> QuerySet:
+        return queryset.filter(modified__gt=modified_after)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.query.get('modified_after'):
+            queryset = self.filter_modified_after(queryset, self.query['modified_after'])
+        return queryset
+
+
+class Products(ReadOnlyAPIViewSet):
+    serializer_class = ProductSerializer
+    queryset = Product.objects.published()
+    query_serializer_class = ProductQuerySerializer
+
+    def filter_modified_after(self, queryset: ProductQuerySet, modified_after: datetime.datetime) -> ProductQuerySet:
+        # specs, prices and scores change without the product itself being saved
+        return queryset.modified_after(modified_after)
+
+    def get_queryset(self):
+        queryset = super().get_queryset().for_listing().with_scores(self.request.user.profile.company)
+        fields: str = self.request.query_params.get('fields')
+        if not fields or 'specs' in fields.split(','):
+            queryset = queryset.prefetch_related(Prefetch('productattributes', queryset=ProductAttribute.objects.published().select_related('attribute_type__unit')))
+        if self.query.get('category'):
+            queryset = queryset.filter(category_id=self.query['category'])
+        if self.query.get('brand'):
+            queryset = queryset.filter(brand_id=self.query['brand'])
+        return queryset
+
+
+class Prices(ReadOnlyAPIViewSet):
+    serializer_class = PriceSerializer
+    queryset = WebsiteProductAttribute.objects.published().filter(attribute_type__name="price").select_related('website', 'attribute_type__unit')
+    query_serializer_class = PriceQuerySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.query.get('product'):
+            queryset = queryset.filter(product_id=self.query['product'])
+        if self.query.get('website'):
+            queryset = queryset.filter(website_id=self.query['website'])
+        return queryset
+
+
+class CategoryTables(ReadOnlyAPIViewSet):
+    serializer_class = CategoryTableSerializer
+    queryset = CategoryTable.objects.published()\
+        .select_related('category', 'x_axis_attribute', 'y_axis_attribute')\
+        .prefetch_related(Prefetch('category_table_attributes', queryset=CategoryTableAttribute.objects.order_by('order').select_related('attribute')))
+
+    def get_queryset(self):
+        return super().get_queryset().for_user(self.request.user)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return CategoryTableDetailSerializer
+        return super().get_serializer_class()
+
+
+class PriceHistory(APIView):
+    """
+    Price observations for a set of products over a date range, as an Arrow IPC stream or a Parquet file.
+    Rows are read from a server side cursor and converted to record batches as they arrive,
+    so large histories load straight into pandas without being parsed as json.
+    """
+    permission_classes = IsAuthenticated,
+
+    def get(self, request, export_format, format=None):
+        serializer = PriceHistoryQuerySerializer(data=request.query_params, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        prices = WebsiteProductAttribute.objects.published()\
+            .filter(
+                attribute_type__name="price",
+                product__in=serializer.get_products(),
+                created__range=[serializer.validated_data['start'], serializer.validated_data['end']],
+            )\
+            .annotate(price=Cast(KeyTextTransform('value', 'data'), FloatField()))\
+            .order_by('product_id', 'created')\
+            .values_list('product_id', 'website__name', 'price', 'created')\
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        batches = record_batches(PRICE_HISTORY_SCHEMA, prices, EXPORT_CHUNK_SIZE)
+        content_type: str = COLUMNAR_CONTENT_TYPES[export_format]
+        if export_format == COLUMNAR_PARQUET:
+            return FileResponse(parquet_file(PRICE_HISTORY_SCHEMA, batches), as_attachment=True, filename=f"price-history.{export_format}", content_type=content_type)
+        response: StreamingHttpResponse = StreamingHttpResponse(arrow_stream(PRICE_HISTORY_SCHEMA, batches), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="price-history.{export_format}"'
+        return response
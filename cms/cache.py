@@ -0,0 +1,94 @@
+import hashlib
+import json
+import time
+from collections import namedtuple
+from typing import Optional, Any, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+# a cached value and the time after which it should be recomputed
+CachedValue = namedtuple('CachedValue', ['value', 'stale_at'])
+
+
+def data_version_key(category_id: Optional[int]) -> str:
+    return f"data-version:category:{category_id}"
+
+
+def get_data_version(category_id: Optional[int]) -> int:
+    """
+    Returns the data version stamp for a category.
+    Cache keys built with the stamp are invalidated whenever ingestion changes data for the category.
+    """
+    return cache.get_or_set(data_version_key(category_id), time.time_ns, timeout=None)
+
+
+def bump_data_version(category_id: Optional[int]) -> None:
+    """
+    Marks data for a category as changed by setting a new data version stamp.
+    A stamp is used rather than a counter so an evicted version can never be confused with an old one.
+    """
+    cache.set(data_version_key(category_id), time.time_ns(), timeout=None)
+
+
+def hashed_cache_key(prefix: str, data: Any) -> str:
+    """Builds a cache key from a prefix and a hash of json serializable data, such as an object's config."""
+    return f"{prefix}:{hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()}"
+
+
+def namespaced_cache_key(namespace: str, data: Any = None, category_id: Optional[int] = None) -> str:
+    """
+    Builds a cache key in a category namespace, versioned with the category's data version.
+    Every key in a category changes when ingestion bumps its data version, so stale entries are never read.
+    """
+    return hashed_cache_key(f"{namespace}:category:{category_id}:{get_data_version(category_id)}", data)
+
+
+def set_cached(key: str, value: Any, timeout: Optional[int] = None) -> None:
+    """
+    Caches a value as fresh for timeout seconds, defaulting to CACHE_DURATION.
+    The value is kept for as long again after that, so it can be served stale while it is recomputed.
+    """
+    timeout = settings.CACHE_DURATION if timeout is None else timeout
+    cache.set(key, CachedValue(value, time.time() + timeout), timeout * 2)
+
+
+def compute_locked(key: str, compute: Callable[[], Any], timeout: Optional[int] = None) -> Optional[CachedValue]:
+    """
+    Computes and caches a value unless another process holds the key's lock.
+    Returns the value wrapped in a CachedValue, so a computed None can be told apart from the lock being held.
+    """
+    lock_key: str = f"lock:{key}"
+    if not cache.add(lock_key, True, settings.CACHE_LOCK_TIMEOUT):
+        return None
+    try:
+        value: Any = compute()
+        set_cached(key, value, timeout)
+        return CachedValue(value, None)
+    finally:
+        cache.delete(lock_key)
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], timeout: Optional[int] = None) -> Any:
+    """
+    Returns the value cached with set_cached, computing and caching it when missing or stale.
+    Only the process holding the key's lock recomputes it. Other processes are served the stale value meanwhile,
+    or wait up to CACHE_LOCK_WAIT seconds for the new one when there is nothing cached yet, so an expiring report isn't recomputed by every worker at once.
+    Processes still waiting after that compute the value themselves, so a lock left behind by a failed process doesn't hold up requests.
+    """
+    cached: Optional[CachedValue] = cache.get(key)
+    if cached is not None and cached.stale_at > time.time():
+        return cached.value
+    computed: Optional[CachedValue] = compute_locked(key, compute, timeout)
+    if computed is not None:
+        return computed.value
+    if cached is not None:
+        return cached.value
+    for _poll in range(int(settings.CACHE_LOCK_WAIT / settings.CACHE_LOCK_POLL_INTERVAL)):
+        time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+        cached = cache.get(key) or compute_locked(key, compute, timeout)
+        if cached is not None:
+            return cached.value
+    value: Any = compute()
+    set_cached(key, value, timeout)
+    return value
@@ -1,4 +1,4 @@
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from typing import Dict, Type
 
 from django import forms
@@ -123,3 +123,61 @@ WEBSITE_TYPES = (
     (WEBSITE_TYPE_RETAILER, _('Retailer')),
     (WEBSITE_TYPE_SUPPLIER, _('Supplier')),
 )
+
+CHANGE_PRODUCT_CREATED = 'product_created'
+CHANGE_ATTRIBUTE_ADDED = 'attribute_added'
+CHANGE_PRICE_CHANGED = 'price_changed'
+CHANGE_BRAND_SET = 'brand_set'
+CHANGE_PRODUCTS_MERGED = 'products_merged'
+CHANGE_ATTRIBUTE_TYPES_MERGED = 'attribute_types_merged'
+CHANGE_EVENT_TYPES = (
+    (CHANGE_PRODUCT_CREATED, _('Product created')),
+    (CHANGE_ATTRIBUTE_ADDED, _('Attribute added')),
+    (CHANGE_PRICE_CHANGED, _('Price changed')),
+    (CHANGE_BRAND_SET, _('Brand set')),
+    (CHANGE_PRODUCTS_MERGED, _('Products merged')),
+    (CHANGE_ATTRIBUTE_TYPES_MERGED, _('Attribute types merged')),
+)
+
+FACET_BRAND = 'brand'
+FACET_CATEGORY = 'category'
+FACET_PRICE = 'price'
+FACET_WEBSITE = 'website'
+FACETS = (
+    (FACET_BRAND, _('Brand')),
+    (FACET_CATEGORY, _('Category')),
+    (FACET_PRICE, _('Price')),
+    (FACET_WEBSITE, _('Website')),
+)
+# a facet value, such as a brand pk or the low end of a price bucket, with its label and number of matching products
+Facet = namedtuple('Facet', ['name', 'value', 'label', 'count'])
+# width of the price ranges products are counted in
+FACET_PRICE_BUCKET_SIZE = 250
+
+DUPLICATE_PENDING = 'pending'
+DUPLICATE_APPROVED = 'approved'
+DUPLICATE_REJECTED = 'rejected'
+DUPLICATE_MERGED = 'merged'
+DUPLICATE_STATUSES = (
+    (DUPLICATE_PENDING, _('Pending')),
+    (DUPLICATE_APPROVED, _('Approved')),
+    (DUPLICATE_REJECTED, _('Rejected')),
+    (DUPLICATE_MERGED, _('Merged')),
+)
+# pairs of products scoring at least this, from 0 to 1, are queued as merge candidates
+DUPLICATE_SCORE_THRESHOLD = 0.75
+# share of a pair's score given by how many of their specs agree, the rest is model similarity
+DUPLICATE_SPEC_WEIGHT = 0.3
+# approved candidates merged per transaction
+DUPLICATE_MERGE_BATCH_SIZE = 100
+
+# admin lists of tables estimated to have more rows than this show the estimate rather than an exact count
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# longer text values aren't indexed as attribute values, they're descriptions rather than values to group products by
+ATTRIBUTE_VALUE_MAX_LENGTH = 255
+# attribute values suggested at a time for axis values
+ATTRIBUTE_VALUE_SUGGESTIONS = 20
+
+# name of the change event consumer recomputing product scores of categories changed by crawls
+PRODUCT_SCORES_CONSUMER = 'product-scores'
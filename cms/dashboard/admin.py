@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from cms.dashboard.models import CategoryTable, CategoryGapAnalysisReport, CategoryTableAttribute
+from cms.dashboard.models import CategoryTable, CategoryGapAnalysisReport, CategoryTableAttribute, CategoryGapAnalysisSnapshot, CacheWarmup
 
 
 class CategoryTableAttributeInlineAdmin(admin.TabularInline):
@@ -13,9 +13,25 @@ class CategoryTableAttributeInlineAdmin(admin.TabularInline):
 @admin.register(CategoryTable)
 class CategoryTableAdmin(admin.ModelAdmin):
     list_display = 'id', 'name', 'user', 'category',
+    list_select_related = 'user', 'category',
     inlines = CategoryTableAttributeInlineAdmin,
 
 
 @admin.register(CategoryGapAnalysisReport)
 class CategoryGapAnalysisReportAdmin(admin.ModelAdmin):
     list_display = 'id', 'name', 'user', 'category', 'brand',
+    list_select_related = 'user', 'category', 'brand',
+
+
+@admin.register(CategoryGapAnalysisSnapshot)
+class CategoryGapAnalysisSnapshotAdmin(admin.ModelAdmin):
+    list_display = 'id', 'report', 'status', 'progress', 'computed_at',
+    list_select_related = 'report',
+    list_filter = 'status',
+
+
+@admin.register(CacheWarmup)
+class CacheWarmupAdmin(admin.ModelAdmin):
+    list_display = 'id', 'object_type', 'name', 'duration', 'created',
+    list_filter = 'object_type',
+    ordering = '-duration',
@@ -1,5 +1,7 @@
 from collections import namedtuple
 
+from django.utils.translation import gettext as _
+
 COMPETITIVE_SCORE_GOOD = 'good'
 COMPETITIVE_SCORE_ATTENTION = 'attention'
 COMPETITIVE_SCORE_BAD = 'bad'
@@ -7,3 +9,54 @@ COMPETITIVE_SCORE_BAD = 'bad'
 CategoryTableProduct = namedtuple('CategoryTableProduct', ['x_axis_grouper', 'y_axis_grouper', 'product'])
 CategoryTableEmpty = namedtuple('CategoryTableEmpty', ['x_axis_grouper', 'y_axis_grouper'])
 
+
+PRICE_CLUSTERS_MANUAL = 'manual'
+PRICE_CLUSTERS_QUANTILES = 'quantiles'
+PRICE_CLUSTERS_JENKS = 'jenks'
+PRICE_CLUSTER_METHODS = (
+    (PRICE_CLUSTERS_MANUAL, _("Manual")),
+    (PRICE_CLUSTERS_QUANTILES, _("Quantiles")),
+    (PRICE_CLUSTERS_JENKS, _("Natural breaks")),
+)
+# jenks natural breaks is quadratic in the number of prices, so larger categories are sampled down to this many prices
+JENKS_MAX_PRICES = 1000
+
+COMPARABLE_PRODUCTS_LIMIT = 5
+# values listed per facet of the products page
+FACET_LIMIT = 10
+
+SNAPSHOT_PENDING = 'pending'
+SNAPSHOT_RUNNING = 'running'
+SNAPSHOT_COMPLETE = 'complete'
+SNAPSHOT_FAILED = 'failed'
+SNAPSHOT_STATUSES = (
+    (SNAPSHOT_PENDING, _("Pending")),
+    (SNAPSHOT_RUNNING, _("Running")),
+    (SNAPSHOT_COMPLETE, _("Complete")),
+    (SNAPSHOT_FAILED, _("Failed")),
+)
+
+EXPORT_CSV = 'csv'
+EXPORT_XLSX = 'xlsx'
+EXPORT_FORMATS = (
+    (EXPORT_CSV, _("CSV")),
+    (EXPORT_XLSX, _("Excel")),
+)
+# rows fetched per round trip by the server side cursors exports are streamed from
+EXPORT_CHUNK_SIZE = 2000
+
+PRICE_CHART_RANGES = (
+    (7, _("7 days")),
+    (30, _("30 days")),
+    (90, _("90 days")),
+    (365, _("1 year")),
+)
+PRICE_CHART_DEFAULT_DAYS = 7
+# points plotted per series, about one per horizontal pixel of a chart, longer series are downsampled to this many
+CHART_MAX_POINTS = 500
+
+# choices returned per page of autocomplete results
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+# the change event consumer recording which category changes the cache warm-up has seen
+CACHE_WARMUP_CONSUMER = 'cache-warmup'
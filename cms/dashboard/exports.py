@@ -0,0 +1,68 @@
+import csv
+import tempfile
+from typing import Iterable, Sequence, Iterator, Any, IO, List
+
+from django.http import StreamingHttpResponse, FileResponse
+from django.urls import reverse
+from django.utils.translation import gettext as _
+from openpyxl import Workbook
+
+from cms.dashboard.constants import EXPORT_XLSX, EXPORT_FORMATS
+from cms.dashboard.toolbar import DropdownMenu, DropdownItem
+
+
+class Echo:
+    """A file-like object that returns what is written to it, so csv.writer rows can be streamed."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_rows(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def xlsx_file(header: Sequence[str], rows: Iterable[Sequence[Any]]) -> IO:
+    """
+    Writes rows to a temporary xlsx file.
+    The workbook is write only, so rows are spooled to disk as they are appended rather than held in memory.
+    """
+    workbook: Workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(header)
+    for row in rows:
+        worksheet.append(row)
+    file: IO = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+
+def export_response(export_format: str, filename: str, header: Sequence[str], rows: Iterable[Sequence[Any]]) -> StreamingHttpResponse:
+    """Streams rows as a csv or xlsx attachment. Rows should be a lazy iterable, such as a queryset iterator."""
+    if export_format == EXPORT_XLSX:
+        return FileResponse(xlsx_file(header, rows), as_attachment=True, filename=f"{filename}.{EXPORT_XLSX}")
+    response: StreamingHttpResponse = StreamingHttpResponse(csv_rows(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def export_menu(url_name: str, dropdown_id: str, query_string: str = '', **url_kwargs) -> DropdownMenu:
+    """A dropdown of links to an export view in each format, passing on the current filters."""
+    items: List[DropdownItem] = [
+        DropdownItem(
+            url=f"{reverse(url_name, kwargs=dict(url_kwargs, export_format=export_format))}?{query_string}",
+            icon='fas fa-download fa-sm fa-fw text-gray-400',
+            label=label,
+        )
+        for export_format, label in EXPORT_FORMATS
+    ]
+    return DropdownMenu(
+        dropdown_icon='fas fa-download fa-sm fa-fw text-gray-400',
+        dropdown_id=dropdown_id,
+        dropdown_label=_('Export'),
+        items=items,
+    )
@@ -1,20 +1,23 @@
-from typing import List
+import datetime
+from typing import List, Tuple
 
 from bootstrap_daterangepicker.fields import DateRangeField
 from bootstrap_daterangepicker.widgets import DateRangeWidget
 from django import forms
 from django.contrib.postgres.forms import SimpleArrayField
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import Q, F
 from django.forms import modelformset_factory
+from django.urls import reverse_lazy
 from django.utils.translation import gettext as _
 from django.utils import timezone
 
+from cms.dashboard.constants import PRICE_CLUSTERS_MANUAL, PRICE_CHART_RANGES, PRICE_CHART_DEFAULT_DAYS
 from cms.dashboard.models import CategoryTable, CategoryTableQuerySet, CategoryGapAnalysisReport, \
     CategoryGapAnalysisQuerySet, CategoryTableAttribute
-from cms.form_widgets import TagWidget
+from cms.form_widgets import TagWidget, AutocompleteSelect, AutocompleteSelectMultiple
 from cms.models import AttributeType, Category, ProductQuerySet, Website, WebsiteProductAttributeQuerySet, Product, \
-    Brand
+    Brand, WebsiteProductAttribute, AttributeValue
 from cms.serializers import to_float
 from cms.utils import serialized_values_for_attribute_type, is_value_numeric
 
@@ -30,14 +33,25 @@ class CategoryTableForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         attributes_queryset = AttributeType.objects.order_by('name')
-        self.fields['x_axis_values'].widget = TagWidget()
+        # choices are loaded by select2 from the autocompletes as the user types, set before the querysets they render from
+        self.fields['x_axis_attribute'].widget = AutocompleteSelect(reverse_lazy('dashboard:autocomplete-attribute-types'))
+        self.fields['y_axis_attribute'].widget = AutocompleteSelect(reverse_lazy('dashboard:autocomplete-attribute-types'))
+        self.fields['websites'].widget = AutocompleteSelectMultiple(reverse_lazy('dashboard:autocomplete-websites'))
+        self.fields['brands'].widget = AutocompleteSelectMultiple(reverse_lazy('dashboard:autocomplete-brands'))
+        self.fields['brands'].queryset = Brand.objects.published()
+        self.fields['products'].widget = AutocompleteSelectMultiple(reverse_lazy('dashboard:autocomplete-products'))
+        self.fields['x_axis_values'].widget = TagWidget(attrs={
+            'data-suggestions-url': reverse_lazy('dashboard:autocomplete-attribute-values'), 'data-attribute-field': 'id_x_axis_attribute',
+        })
         self.fields['x_axis_attribute'].label = _('Horizontal label')
         self.fields['x_axis_values'].label = _('Horizontal values')
         self.fields['x_axis_values'].required = False
         self.fields['x_axis_attribute'].required = False
         self.fields['x_axis_attribute'].queryset = attributes_queryset
 
-        self.fields['y_axis_values'].widget = TagWidget()
+        self.fields['y_axis_values'].widget = TagWidget(attrs={
+            'data-suggestions-url': reverse_lazy('dashboard:autocomplete-attribute-values'), 'data-attribute-field': 'id_y_axis_attribute',
+        })
         self.fields['y_axis_attribute'].label = _('Vertical label')
         self.fields['y_axis_values'].label = _('Vertical values')
         self.fields['y_axis_values'].required = False
@@ -72,11 +86,11 @@ class CategoryTableForm(forms.ModelForm):
             raise ValidationError(_("Pivot values and labels must either be both selected or empty."))
         if is_value_numeric(values[0]):
             return serialized_values_for_attribute_type(values, attribute_type)
-        for value in values:
-            if not attribute_type.productattributes.filter(data__value=value).exists() \
-                    and not attribute_type.websiteproductattributes.filter(data__value=value).exists() \
-                    and not Brand.objects.filter(name=value).exists():
-                raise ValidationError(_("'{attribute}' with value '{value}' does not exist.").format(attribute=attribute_type.name, value=value))
+        unknown: List[str] = AttributeValue.objects.unknown(attribute_type, values)
+        if unknown:
+            raise ValidationError([
+                _("'{attribute}' with value '{value}' does not exist.").format(attribute=attribute_type.name, value=value) for value in unknown
+            ])
         return serialized_values_for_attribute_type(values, attribute_type)
 
     def clean(self):
@@ -137,22 +151,32 @@ class ProductsFilterForm(forms.Form):
     price_low = forms.FloatField(label=_('Price: low'), required=False)
     price_high = forms.FloatField(label=_('Price: high'), required=False)
     brands = forms.ModelMultipleChoiceField(label=_('Brands'), queryset=Brand.objects.published(), required=False)
+    website = forms.ModelChoiceField(label=_('Website'), empty_label=_('Website'), queryset=Website.objects.published(), required=False)
+    score_low = forms.FloatField(label=_('Score: low'), required=False)
+    sort_by_score = forms.BooleanField(label=_('Sort by score'), required=False)
 
     def search(self, queryset: ProductQuerySet) -> ProductQuerySet:
+        """Filters products. Score filters expect a queryset annotated by ProductQuerySet.with_scores."""
         if self.cleaned_data.get('category'):
             queryset = queryset.filter(category=self.cleaned_data['category'])
         if self.cleaned_data.get('q'):
-            queryset = queryset.filter(Q(model__contains=self.cleaned_data['q']) |
-                                       Q(alternate_models__contains=[self.cleaned_data['q']]) |
-                                       Q(category__name__contains=self.cleaned_data['q']))
-        if self.cleaned_data.get('price_low'):
-            queryset = queryset.filter(websiteproductattributes__attribute_type__name='price',
-                                       websiteproductattributes__data__value__gte=self.cleaned_data['price_low'])
-        if self.cleaned_data.get('price_high'):
-            queryset = queryset.filter(websiteproductattributes__attribute_type__name='price',
-                                       websiteproductattributes__data__value__lte=self.cleaned_data['price_high'])
+            queryset = queryset.search(self.cleaned_data['q'])
+        if self.cleaned_data.get('price_low') or self.cleaned_data.get('price_high'):
+            # filtering by subquery rather than joining prices stops products with several prices being duplicated
+            prices: WebsiteProductAttributeQuerySet = WebsiteProductAttribute.objects.filter(attribute_type__name='price')
+            if self.cleaned_data.get('price_low'):
+                prices = prices.filter(data__value__gte=self.cleaned_data['price_low'])
+            if self.cleaned_data.get('price_high'):
+                prices = prices.filter(data__value__lte=self.cleaned_data['price_high'])
+            queryset = queryset.filter(pk__in=prices.values('product'))
         if self.cleaned_data.get('brands'):
             queryset = queryset.filter(brand__in=self.cleaned_data['brands'])
+        if self.cleaned_data.get('website'):
+            queryset = queryset.filter(pk__in=WebsiteProductAttribute.objects.filter(website=self.cleaned_data['website']).values('product'))
+        if self.cleaned_data.get('score_low') is not None:
+            queryset = queryset.filter(score__gte=self.cleaned_data['score_low'])
+        if self.cleaned_data.get('sort_by_score'):
+            queryset = queryset.order_by(F('score').desc(nulls_last=True))
         return queryset
 
     class Media:
@@ -182,6 +206,18 @@ class ProductPriceFilterForm(forms.Form):
         },
         format='%Y-%m-%d',
     ), label=_('Date range'))
+    chart_days = forms.TypedChoiceField(label=_('Chart range'), choices=PRICE_CHART_RANGES, coerce=int, required=False)
+
+    def chart_period(self) -> Tuple[datetime.date, datetime.date]:
+        """The first and last dates of the price chart: the date range if given, otherwise the chart range up to today."""
+        if self.is_bound:
+            # cleans each field, so a chart range can be used without a date range
+            self.is_valid()
+        cleaned_data: dict = getattr(self, 'cleaned_data', {})
+        if cleaned_data.get('date_range'):
+            return cleaned_data['date_range']
+        today: datetime.date = timezone.localdate()
+        return today - datetime.timedelta(days=cleaned_data.get('chart_days') or PRICE_CHART_DEFAULT_DAYS), today
 
     def search(self, queryset: WebsiteProductAttributeQuerySet) -> WebsiteProductAttributeQuerySet:
         if self.cleaned_data.get('website'):
@@ -198,20 +234,25 @@ class ProductPriceFilterForm(forms.Form):
 
 class CategoryGapAnalysisForm(forms.ModelForm):
     brand = forms.ModelChoiceField(label=_('Brands'), queryset=Brand.objects.published(), required=False, help_text=_("The brand you'd like to use as the target for this analysis."))
-    price_clusters = SimpleArrayField(base_field=forms.CharField())
+    price_clusters = SimpleArrayField(base_field=forms.CharField(), required=False)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['websites'].required = False
         self.fields['price_clusters'].widget = TagWidget()
-        self.fields['price_clusters'].help_text = _('The price clusters used to group products.')
+        self.fields['price_clusters'].help_text = _('The price clusters used to group products, when the cluster method is manual.')
 
     def clean_price_clusters(self):
         return [to_float(price) for price in self.cleaned_data['price_clusters']]
 
+    def clean(self):
+        if self.cleaned_data.get('cluster_method') == PRICE_CLUSTERS_MANUAL and not self.cleaned_data.get('price_clusters'):
+            raise ValidationError({'price_clusters': _('Price clusters are required when the cluster method is manual.')})
+        return self.cleaned_data
+
     class Meta:
         model = CategoryGapAnalysisReport
-        fields = 'name', 'category', 'brand', 'websites', 'price_clusters',
+        fields = 'name', 'category', 'brand', 'websites', 'cluster_method', 'number_of_clusters', 'price_clusters',
 
     class Media:
         js = 'js/select2.min.js', 'js/category_gap_analysis_filter.js',
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-19 17:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_auto_20210420_1928'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryGapAnalysisSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Percentage of price clusters analysed.', verbose_name='Progress')),
+                ('data', models.JSONField(default=list, help_text='The serialized gap analysis for each price cluster.', verbose_name='Data')),
+                ('computed_at', models.DateTimeField(blank=True, null=True, verbose_name='Computed at')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='dashboard.categorygapanalysisreport', verbose_name='Report')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
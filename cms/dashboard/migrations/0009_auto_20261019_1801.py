@@ -0,0 +1,23 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_categorygapanalysissnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorygapanalysisreport',
+            name='cluster_method',
+            field=models.CharField(choices=[('manual', 'Manual'), ('quantiles', 'Quantiles'), ('jenks', 'Natural breaks')], default='manual', help_text='How price clusters are chosen. Automatic methods derive them from the current prices in the category.', max_length=20, verbose_name='Cluster method'),
+        ),
+        migrations.AddField(
+            model_name='categorygapanalysisreport',
+            name='number_of_clusters',
+            field=models.PositiveSmallIntegerField(default=5, help_text='The number of price clusters to derive automatically.', verbose_name='Number of clusters'),
+        ),
+    ]
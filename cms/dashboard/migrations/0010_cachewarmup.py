@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:20
+
+from django.db import migrations, models
+import django_extensions.db.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_auto_20261019_1801'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheWarmup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('object_type', models.CharField(max_length=100, verbose_name='Object type')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Object id')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('duration', models.FloatField(help_text='Seconds taken to recompute the object.', verbose_name='Duration')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
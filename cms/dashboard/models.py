@@ -1,14 +1,24 @@
 import itertools
-from typing import List, Iterator, Any, Optional, Dict
+from datetime import timedelta
+from typing import List, Iterator, Any, Optional, Dict, Callable
 
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
+from pandas import DataFrame
 
-from cms.dashboard.constants import CategoryTableProduct, CategoryTableEmpty
-from cms.dashboard.reports import ProductCluster
+from cms.cache import namespaced_cache_key, get_or_compute, set_cached
+from cms.dashboard.constants import CategoryTableProduct, CategoryTableEmpty, SNAPSHOT_STATUSES, SNAPSHOT_PENDING, \
+    SNAPSHOT_RUNNING, SNAPSHOT_COMPLETE, SNAPSHOT_FAILED, PRICE_CLUSTER_METHODS, PRICE_CLUSTERS_MANUAL, \
+    PRICE_CLUSTERS_QUANTILES
+from cms.dashboard.reports import ProductCluster, quantile_breaks, jenks_breaks
 from cms.models import BaseModel, BaseQuerySet, Product, ProductQuerySet, ProductAttribute, AttributeType
 from cms.utils import is_value_numeric, products_grouper
 
@@ -91,6 +101,89 @@ class CategoryTable(BaseModel):
                 queryset.filter(pk__in=y_axis_attribute.productattributes.filter(data__value__in=y_axis_values))
         return queryset.distinct()
 
+    @cached_property
+    def table_spec_attribute_types(self) -> List[AttributeType]:
+        """The specs chosen for the table, in display order."""
+        return list(AttributeType.objects.filter(category_table_attributes__table=self).order_by('category_table_attributes__order'))
+
+    @cached_property
+    def spec_attribute_types(self) -> List[AttributeType]:
+        """
+        The specs shown for each product on the table, in display order.
+        Falls back to the category's attribute configs when the table has no specs of its own.
+        """
+        if self.table_spec_attribute_types:
+            return self.table_spec_attribute_types
+        return list(AttributeType.objects.filter(category_attribute_configs__category_id=self.category_id).order_by('category_attribute_configs__order'))
+
+    def spec_matrix(self, products: List[Product]) -> Dict[int, List[Optional[ProductAttribute]]]:
+        """
+        Builds a product pk by spec matrix of product attributes for the given products in a single query.
+        Specs a product doesn't have are None.
+        """
+        attribute_types: List[AttributeType] = self.spec_attribute_types
+        product_attributes: Dict[tuple, ProductAttribute] = {
+            (product_attribute.product_id, product_attribute.attribute_type_id): product_attribute
+            for product_attribute in ProductAttribute.objects
+            .filter(product__in=products, attribute_type__in=attribute_types)
+            .select_related('attribute_type__unit')
+            .order_by('-pk')
+        } if products and attribute_types else {}
+        return {
+            product.pk: [product_attributes.get((product.pk, attribute_type.pk)) for attribute_type in attribute_types]
+            for product in products
+        }
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Cache key for the table's computed grid.
+        Built from the table config and the category's data version, so changes to either invalidate it.
+        """
+        return namespaced_cache_key('category-table', {
+            'table': self.pk,
+            'modified': self.modified,
+            'websites': sorted(self.websites.values_list('pk', flat=True)),
+            'brands': sorted(self.brands.values_list('pk', flat=True)),
+            'products': sorted(self.products.values_list('pk', flat=True)),
+            'specs': list(self.category_table_attributes.order_by('order').values_list('attribute_id', flat=True)),
+        }, category_id=self.category_id)
+
+    def compute_table(self) -> Dict[str, Dict]:
+        """Computes the table's grid, along with the spec matrix for the products in it."""
+        table_data: Dict = self.build_table
+        products: List[Product] = [cell.product for row in table_data.values() for cell in row if isinstance(cell, CategoryTableProduct)]
+        return {'table_data': table_data, 'spec_matrix': self.spec_matrix(products)}
+
+    @cached_property
+    def cached_table(self) -> Dict[str, Dict]:
+        return get_or_compute(self.cache_key, self.compute_table, settings.CACHE_DURATION_REPORTS)
+
+    @property
+    def export_header(self) -> List[str]:
+        return [
+            str(self.y_axis_attribute or ''),
+            str(self.x_axis_attribute or ''),
+            _('Model'),
+            _('Brand'),
+            _('Price'),
+        ] + [attribute_type.name for attribute_type in self.spec_attribute_types]
+
+    def export_rows(self) -> Iterator[List]:
+        """Yields a row for each product on the table, with its groupers, price and specs in the order of export_header."""
+        spec_matrix: Dict[int, List[Optional[ProductAttribute]]] = self.cached_table['spec_matrix']
+        for cells in self.cached_table['table_data'].values():
+            for cell in cells:
+                if not isinstance(cell, CategoryTableProduct):
+                    continue
+                product: Product = cell.product
+                specs: List = [product_attribute.data['value'] if product_attribute else None for product_attribute in spec_matrix[product.pk]]
+                yield [cell.y_axis_grouper, cell.x_axis_grouper, product.model, str(product.brand or ''), product.current_average_price_int] + specs
+
+    def warm_cache(self) -> None:
+        """Recomputes and caches the table, e.g. after a crawl has changed its category's data."""
+        set_cached(self.cache_key, self.compute_table(), settings.CACHE_DURATION_REPORTS)
+
     @cached_property
     def build_table(self):
         """
@@ -180,6 +273,14 @@ class CategoryGapAnalysisReport(BaseModel):
     brand = models.ForeignKey("cms.Brand", help_text=_('The brand analysed in the gap analysis report.'), on_delete=models.SET_NULL, null=True)
     websites = models.ManyToManyField("cms.Website", verbose_name=_("Websites"), help_text=_('Limit gap analysis report to these websites.'))
     price_clusters = models.JSONField(verbose_name=_('Price clusters'), help_text=_('Price levels used to cluster products.'), default=list)
+    cluster_method = models.CharField(
+        verbose_name=_('Cluster method'),
+        help_text=_('How price clusters are chosen. Automatic methods derive them from the current prices in the category.'),
+        max_length=20,
+        choices=PRICE_CLUSTER_METHODS,
+        default=PRICE_CLUSTERS_MANUAL,
+    )
+    number_of_clusters = models.PositiveSmallIntegerField(verbose_name=_('Number of clusters'), help_text=_('The number of price clusters to derive automatically.'), default=5)
 
     objects = CategoryGapAnalysisQuerySet.as_manager()
 
@@ -201,16 +302,181 @@ class CategoryGapAnalysisReport(BaseModel):
         """Retrieves and sorts products relevant to report."""
         return sorted([product for product in self.products if product.current_average_price_int], key=lambda product: product.current_average_price_int)
 
+    @property
+    def price_breakpoints(self) -> List[float]:
+        """
+        The upper price of each price cluster, in ascending order.
+        Automatic breakpoints are derived from the category's current prices, and cached per category and data version.
+        """
+        if self.cluster_method == PRICE_CLUSTERS_MANUAL:
+            return sorted(self.price_clusters)
+        cache_key: str = namespaced_cache_key('price-breakpoints', {
+            'cluster_method': self.cluster_method,
+            'number_of_clusters': self.number_of_clusters,
+        }, category_id=self.category_id)
+        return get_or_compute(cache_key, self.automatic_price_breakpoints, settings.CACHE_DURATION_REPORTS)
+
+    def automatic_price_breakpoints(self) -> List[float]:
+        prices: np.ndarray = np.fromiter(Product.objects.filter(category=self.category).current_average_prices().values(), dtype=float)
+        prices = prices[prices > 0]
+        if self.cluster_method == PRICE_CLUSTERS_QUANTILES:
+            return quantile_breaks(prices, self.number_of_clusters)
+        return jenks_breaks(prices, self.number_of_clusters)
+
     def cluster_products(self) -> Iterator[tuple[Any, Iterator[Product]]]:
-        """Clusters products by pricepoint."""
+        """
+        Clusters products by pricepoint.
+        Each product belongs to the first breakpoint at or above its price, found with a binary search.
+        """
         products: List[Product] = self.get_products()
-
-        def product_price_grouper(product: Product):
-            for price in self.price_clusters:
-                if product.current_average_price_int <= price:
-                    return price
-        return itertools.groupby(products, key=lambda product: product_price_grouper(product))
+        breakpoints: List[float] = self.price_breakpoints
+        cluster_indexes: np.ndarray = np.searchsorted(breakpoints, [product.current_average_price_int for product in products])
+        product_clusters: Iterator[Optional[float]] = iter([breakpoints[index] if index < len(breakpoints) else None for index in cluster_indexes])
+        return itertools.groupby(products, key=lambda product: next(product_clusters))
 
     @property
+    def cache_key(self) -> str:
+        """
+        Cache key for the report's gap analysis.
+        Built from the report config and the category's data version, so changes to either invalidate it.
+        """
+        return namespaced_cache_key('gap-analysis-clusters', {
+            'report': self.pk,
+            'brand': self.brand_id,
+            'websites': sorted(self.websites.values_list('pk', flat=True)),
+            'price_breakpoints': self.price_breakpoints,
+        }, category_id=self.category_id)
+
+    def clear_cache(self) -> None:
+        cache.delete(self.cache_key)
+
+    def analyse_clusters(self, on_progress: Optional[Callable[[int], Any]] = None) -> List[ProductCluster]:
+        """
+        Runs the gap analysis for each price cluster.
+        on_progress is called with the percentage of clusters analysed so far.
+        """
+        total_number_products: int = self.products.count()
+        product_clusters: List[tuple] = [(price, list(products)) for price, products in self.cluster_products()]
+        clusters: List[ProductCluster] = []
+        for products in product_clusters:
+            clusters.append(ProductCluster(self.category, products, self.target_range, total_number_products).analyse())
+            if on_progress:
+                on_progress(int(len(clusters) / len(product_clusters) * 100))
+        return clusters
+
+    def warm_cache(self) -> None:
+        """
+        Computes a fresh gap analysis snapshot, which also caches the report's clusters.
+        Reports with a snapshot already in progress are left to the worker computing it.
+        """
+        if not self.snapshots.in_progress().exists():
+            self.snapshots.create().compute()
+
+    @cached_property
     def gap_analysis_clusters(self) -> List[ProductCluster]:
-        return [ProductCluster(self.category, products, self.target_range, self.products.count()) for products in self.cluster_products()]
+        return get_or_compute(self.cache_key, self.analyse_clusters, settings.CACHE_DURATION_REPORTS)
+
+    def brand_competitive_scores(self, clusters: Optional[List[ProductCluster]] = None) -> DataFrame:
+        """
+        Brand x price cluster matrix of competitive scores, scoring every brand in the report's products as the target range.
+        Clusters and dominant specs are computed once and shared by all brands, rather than analysed per brand.
+        """
+        clusters = self.gap_analysis_clusters if clusters is None else clusters
+        brand_ids: List[int] = sorted({int(brand) for cluster in clusters for brand in cluster.product_data['brand'].dropna()})
+        scores: DataFrame = pd.DataFrame(index=brand_ids, columns=range(len(clusters)), dtype=object)
+        for index, cluster in enumerate(clusters):
+            scores[index] = cluster.brand_competitive_scores(brand_ids)
+        scores.columns = [cluster.cluster_price for cluster in clusters]
+        return scores
+
+    @cached_property
+    def latest_snapshot(self) -> Optional['CategoryGapAnalysisSnapshot']:
+        """The most recently computed snapshot of the report's gap analysis."""
+        return self.snapshots.complete().order_by('-computed_at').first()
+
+
+class CategoryGapAnalysisSnapshotQuerySet(BaseQuerySet):
+
+    def complete(self):
+        return self.filter(status=SNAPSHOT_COMPLETE)
+
+    def in_progress(self):
+        """
+        Returns pending and running snapshots.
+        Snapshots that haven't been updated within the snapshot timeout are assumed to be abandoned.
+        """
+        return self.filter(
+            status__in=[SNAPSHOT_PENDING, SNAPSHOT_RUNNING],
+            modified__gte=timezone.now() - timedelta(seconds=settings.SNAPSHOT_TIMEOUT),
+        )
+
+
+class CategoryGapAnalysisSnapshot(BaseModel):
+    """
+    A precomputed, serialized gap analysis for a report.
+    Snapshots are computed in the background so reports can be rendered without running the analysis.
+    """
+    report = models.ForeignKey(CategoryGapAnalysisReport, verbose_name=_('Report'), on_delete=models.CASCADE, related_name='snapshots')
+    status = models.CharField(verbose_name=_('Status'), max_length=20, choices=SNAPSHOT_STATUSES, default=SNAPSHOT_PENDING)
+    progress = models.PositiveSmallIntegerField(verbose_name=_('Progress'), help_text=_('Percentage of price clusters analysed.'), default=0)
+    data = models.JSONField(verbose_name=_('Data'), help_text=_('The serialized gap analysis for each price cluster.'), default=list)
+    computed_at = models.DateTimeField(verbose_name=_('Computed at'), null=True, blank=True)
+
+    objects = CategoryGapAnalysisSnapshotQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.report} ({self.get_status_display()})"
+
+    def update_progress(self, progress: int) -> None:
+        self.progress = progress
+        self.save(update_fields=['progress', 'modified'])
+
+    def claim(self) -> bool:
+        """
+        Marks the snapshot as running if it's still pending, with a conditional update so only one worker can claim it.
+        Returns whether it was claimed.
+        """
+        claimed: bool = bool(CategoryGapAnalysisSnapshot.objects.filter(pk=self.pk, status=SNAPSHOT_PENDING).update(
+            status=SNAPSHOT_RUNNING, progress=0, modified=timezone.now(),
+        ))
+        if claimed:
+            self.status = SNAPSHOT_RUNNING
+            self.progress = 0
+        return claimed
+
+    def compute(self) -> 'CategoryGapAnalysisSnapshot':
+        """
+        Computes the report's gap analysis and replaces any previously completed snapshots.
+        Snapshots another worker has already claimed are left to it.
+        """
+        if not self.claim():
+            return self
+        try:
+            clusters: List[ProductCluster] = self.report.analyse_clusters(on_progress=self.update_progress)
+            set_cached(self.report.cache_key, clusters, settings.CACHE_DURATION_REPORTS)
+            brand_scores: DataFrame = self.report.brand_competitive_scores(clusters)
+            self.data = [
+                dict(cluster.serialize(), brand_competitive_scores={str(brand_id): score for brand_id, score in brand_scores.iloc[:, index].items()})
+                for index, cluster in enumerate(clusters)
+            ]
+        except Exception:
+            self.status = SNAPSHOT_FAILED
+            self.save()
+            raise
+        self.status = SNAPSHOT_COMPLETE
+        self.progress = 100
+        self.computed_at = timezone.now()
+        self.save()
+        self.report.snapshots.complete().exclude(pk=self.pk).delete()
+        return self
+
+
+class CacheWarmup(BaseModel):
+    """Records how long an object took to recompute when the cache was warmed, so expensive reports can be spotted."""
+    object_type = models.CharField(verbose_name=_('Object type'), max_length=100)
+    object_id = models.PositiveIntegerField(verbose_name=_('Object id'))
+    name = models.CharField(verbose_name=_('Name'), max_length=100)
+    duration = models.FloatField(verbose_name=_('Duration'), help_text=_('Seconds taken to recompute the object.'))
+
+    def __str__(self):
+        return f"{self.object_type} {self.name} ({self.duration:.2f}s)"
@@ -1,22 +1,79 @@
-from itertools import groupby
-from operator import itemgetter
 from statistics import mean
-from typing import List, Dict, Union, Optional, Iterator, Tuple
+from typing import List, Dict, Union, Optional, Iterator, Tuple, Set, Any
 
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.utils.functional import cached_property
+from pandas import DataFrame, Series
 
-from cms.dashboard.constants import COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD, COMPETITIVE_SCORE_ATTENTION
-from cms.models import Product, ProductQuerySet, Category, CategoryAttributeConfig, ProductAttribute, \
-    ProductAttributeQuerySet, Brand
+from cms.cache import get_or_compute, set_cached
+from cms.constants import SCORING_BOOL_TRUE, SCORING_BOOL_FALSE
+from cms.dashboard.constants import COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD, COMPETITIVE_SCORE_ATTENTION, JENKS_MAX_PRICES
+from cms.models import Product, ProductQuerySet, Category, CategoryAttributeConfig, Brand, ChangeEvent
 
 DominantSpecs = Dict[CategoryAttributeConfig, Dict[str, Union[int, float, str]]]
 ProductSpecValues = List[Dict[CategoryAttributeConfig, Union[str, float, int, bool]]]
 Price = Union[float, int]
 
 
+def dominant_value(values: Series) -> Optional[Tuple[Union[str, float, int, bool], int]]:
+    """
+    Returns the most common value in the series and its number of occurrences.
+    Ties are broken by the lowest value.
+    """
+    if values.empty:
+        return None
+    counts: Series = values.value_counts(sort=False)
+    number_of_occurrences: int = int(counts.max())
+    return min(counts[counts == number_of_occurrences].index), number_of_occurrences
+
+
+def quantile_breaks(prices: np.ndarray, number_of_clusters: int) -> List[float]:
+    """Price breakpoints splitting prices into clusters with roughly equal numbers of products."""
+    if not len(prices):
+        return []
+    return np.unique(np.quantile(prices, np.linspace(0, 1, number_of_clusters + 1)[1:])).tolist()
+
+
+def jenks_breaks(prices: np.ndarray, number_of_clusters: int) -> List[float]:
+    """
+    Price breakpoints from Jenks natural breaks, minimising the squared deviation of prices from their cluster mean.
+    Uses the Fisher-Jenks dynamic program over a matrix of the squared deviation of every run of sorted prices.
+    """
+    prices = np.sort(np.asarray(prices, dtype=float))
+    if len(prices) > JENKS_MAX_PRICES:
+        prices = prices[np.linspace(0, len(prices) - 1, JENKS_MAX_PRICES).round().astype(int)]
+    number_of_prices: int = len(prices)
+    number_of_clusters = min(number_of_clusters, len(np.unique(prices)))
+    if number_of_clusters < 1:
+        return []
+    sums: np.ndarray = np.concatenate([[0], np.cumsum(prices)])
+    squared_sums: np.ndarray = np.concatenate([[0], np.cumsum(prices ** 2)])
+    # deviation[i, j] is the squared deviation of prices[i:j]
+    starts, ends = np.meshgrid(np.arange(number_of_prices + 1), np.arange(number_of_prices + 1), indexing='ij')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation: np.ndarray = squared_sums[ends] - squared_sums[starts] - (sums[ends] - sums[starts]) ** 2 / (ends - starts)
+    deviation[ends <= starts] = np.inf
+    cost: np.ndarray = deviation[0]
+    cluster_starts: List[np.ndarray] = []
+    for _ in range(1, number_of_clusters):
+        total: np.ndarray = cost[:, None] + deviation
+        cluster_starts.append(total.argmin(axis=0))
+        cost = total.min(axis=0)
+    breaks: List[float] = [prices[-1]]
+    end: int = number_of_prices
+    for starts_for_cluster in reversed(cluster_starts):
+        end = starts_for_cluster[end]
+        breaks.insert(0, prices[end - 1])
+    return np.unique(breaks).tolist()
+
+
 class ProductCluster:
     """
-    Given a list of products, returns gap analysis
+    Given a list of products, returns gap analysis.
+    Brands, target range membership and spec values for the cluster are loaded once into a product x spec matrix,
+    so the number of queries doesn't grow with the size of the cluster.
     """
 
     def __init__(self, category: Category, products_grouper: Tuple[Price, Iterator], target_range: ProductQuerySet, total_number_products: int):
@@ -27,55 +84,96 @@ class ProductCluster:
         self.cluster_size = "{size}%".format(size=int((len(products) / total_number_products)*100))
         self.cluster_price = products_grouper[0]
 
+    def analyse(self) -> 'ProductCluster':
+        """
+        Runs the full gap analysis for the cluster, so it can be cached and rendered without further queries.
+        """
+        self.average_price
+        self.dominant_brand
+        self.target_range_spec_gap
+        self.competitive_score
+        return self
+
+    @cached_property
+    def category_attribute_configs(self) -> List[CategoryAttributeConfig]:
+        return list(self.category.category_attribute_configs.order_by('order').select_related('attribute_type'))
+
+    @cached_property
+    def product_data(self) -> DataFrame:
+        """The model and brand of each product in the cluster, and whether it's in the target range. Indexed by product pk."""
+        target_range_pks: Set[int] = set(self.target_range.values_list('pk', flat=True))
+        df: DataFrame = pd.DataFrame(list(self.products.values_list('pk', 'model', 'brand_id')), columns=['product', 'model', 'brand'])
+        df['target_range'] = df['product'].isin(target_range_pks)
+        return df.set_index('product')
+
+    @cached_property
+    def spec_matrix(self) -> DataFrame:
+        """Product x spec matrix of the cluster's spec values, with a column per category attribute config pk."""
+        attribute_values: DataFrame = self.products.spec_values([config.attribute_type_id for config in self.category_attribute_configs])
+        matrix: DataFrame = attribute_values.reindex(
+            index=self.product_data.index,
+            columns=[config.attribute_type_id for config in self.category_attribute_configs],
+        )
+        matrix.columns = [config.pk for config in self.category_attribute_configs]
+        return matrix
+
     def get_product_spec_values(self) -> ProductSpecValues:
         """Returns a list of dicts of the spec values for each product."""
+        configs: Dict[int, CategoryAttributeConfig] = {config.pk: config for config in self.category_attribute_configs}
         spec_values: ProductSpecValues = []
-        for product in self.products:
-            product_specs = {}
-            for attribute_config in product.category.category_attribute_configs.order_by('order').iterator():
-                attribute_config: 'CategoryAttributeConfig'
-                product_attr: ProductAttribute = attribute_config.attribute_type.productattributes.filter(product__pk=product.pk).first()
-                if product_attr:
-                    product_specs[attribute_config] = product_attr.data['value']
-            if product_specs:
-                spec_values.append(product_specs)
+        for _, product_specs in self.spec_matrix.iterrows():
+            product_specs: Series = product_specs.dropna()
+            if not product_specs.empty:
+                spec_values.append({configs[config_pk]: value for config_pk, value in product_specs.items()})
         return spec_values
 
     def dominant_specs(self) -> DominantSpecs:
         """Gets the most common spec combinations for this pricepoint"""
         dominant_specs: DominantSpecs = {}
-        products_with_specs: ProductSpecValues = self.get_product_spec_values()
-        if not products_with_specs:
-            return dominant_specs
-        for category_spec_config in products_with_specs[0].keys():
-            sorted_products = sorted([product for product in products_with_specs if product.get(category_spec_config)], key=lambda product: product[category_spec_config])
-            ranked_spec_values = list((spec_value, sum(1 for _ in products)) for spec_value, products in
-                                      groupby(sorted_products, key=lambda product: product[category_spec_config]))
-            if ranked_spec_values:
-                dominant_spec = max(ranked_spec_values, key=itemgetter(1))
+        for category_spec_config in self.category_attribute_configs:
+            spec_values: Series = self.spec_matrix[category_spec_config.pk].dropna()
+            dominant_spec = dominant_value(spec_values[spec_values.astype(bool)])
+            if dominant_spec:
                 dominant_specs[category_spec_config] = {'value': dominant_spec[0], 'number_of_products': dominant_spec[1]}
         return dominant_specs
 
+    def spec_matches(self, dominant_specs: DominantSpecs) -> DataFrame:
+        """
+        Boolean product x spec matrix, flagging the products whose spec value is as good as the dominant value,
+        according to each spec's scoring.
+        """
+        matches: DataFrame = pd.DataFrame(index=self.spec_matrix.index)
+        for category_spec_config, spec_data in dominant_specs.items():
+            matches[category_spec_config.pk] = category_spec_config.score_values(self.spec_matrix[category_spec_config.pk], spec_data['value'])
+        return matches.astype(bool)
+
+    @cached_property
+    def dominant_spec_matches(self) -> DataFrame:
+        """spec_matches for the dominant specs, for every product in the cluster."""
+        return self.spec_matches(self.dominant_specs())
+
+    @cached_property
+    def target_range_spec_matches(self) -> DataFrame:
+        """spec_matches for the dominant specs, limited to products in the target range."""
+        return self.dominant_spec_matches[self.product_data['target_range'].astype(bool)]
+
     @cached_property
     def dominant_brand(self) -> Optional[Dict[str, Union[str, int]]]:
         """Gets the most common brands for this pricepoint"""
-        sorted_products = sorted([product for product in self.products if product.brand], key=lambda product: product.brand.pk)
-        ranked_brands = tuple((brand, sum(1 for _ in products)) for brand, products in groupby(sorted_products, key=lambda product: product.brand.pk))
-        if ranked_brands:
-            dominant_brand_id, num_products = max(ranked_brands, key=itemgetter(1))
-            dominant_brand: Brand = Brand.objects.get(pk=dominant_brand_id)
-            display_share = '{:.0%}'.format(num_products / self.products.count()) if self.products.exists() else None
-            target_range_display_share = '{:.0%}'.format(self.target_range.count() / self.products.count()) if self.products.exists() else None
+        dominant_brand = dominant_value(self.product_data['brand'].dropna())
+        if dominant_brand:
+            dominant_brand_id, num_products = dominant_brand
+            number_of_products: int = len(self.product_data)
             return {
-                'value': dominant_brand,
+                'value': Brand.objects.get(pk=int(dominant_brand_id)),
                 'number_of_products': num_products,
-                'display_share': display_share,
-                'target_range_display_share': target_range_display_share,
+                'display_share': '{:.0%}'.format(num_products / number_of_products),
+                'target_range_display_share': '{:.0%}'.format(self.product_data['target_range'].sum() / number_of_products),
             }
 
     @cached_property
     def average_price(self) -> Optional[int]:
-        prices: List[Optional[int]] = [product.current_average_price_int for product in self.products if product.current_average_price_int]
+        prices: List[int] = [price for price in self.products.current_average_prices().values() if price]
         return int(mean(prices)) if prices else None
 
     @cached_property
@@ -86,29 +184,220 @@ class ProductCluster:
         """
         dominant_specs: DominantSpecs = self.dominant_specs()
         for category_spec_config, spec_data in dominant_specs.items():
-            product_specs: ProductAttributeQuerySet = ProductAttribute.objects.filter(product__in=self.target_range, attribute_type=category_spec_config.attribute_type)
-            filter_kwargs: Dict = category_spec_config.product_attribute_data_filter_kwargs(spec_data['value'])
-            product_specs: ProductAttributeQuerySet = getattr(product_specs, category_spec_config.product_attribute_data_filter_or_exclude)(**filter_kwargs)
-            dominant_specs[category_spec_config]['target_range_products'] = product_specs.products()
+            matched: Series = self.target_range_spec_matches[category_spec_config.pk]
+            dominant_specs[category_spec_config]['target_range_products'] = Product.objects.filter(pk__in=matched.index[matched].tolist())
         return dominant_specs
 
     @cached_property
     def competitive_score(self) -> Optional[str]:
         """An overall competitive score for the target range within the cluster."""
-        dominant_specs_number = 0
-        matched_target_range = 0
-        for spec in self.target_range_spec_gap.keys():
-            spec: CategoryAttributeConfig
-            dominant_specs_number += 1
-            if self.target_range_spec_gap[spec]['target_range_products'].exists():
-                matched_target_range += 1
-        if not dominant_specs_number:
+        if self.target_range_spec_matches.columns.empty:
             return
-        competitive_on_specs: bool = (matched_target_range / dominant_specs_number) == 1
-        dominant_brand_in_target_range: bool = self.dominant_brand['value'] in list(self.target_range.brands()) if self.dominant_brand else False
+        competitive_on_specs: bool = bool(self.target_range_spec_matches.any().all())
+        dominant_brand_in_target_range: bool = False
+        if self.dominant_brand and self.dominant_brand['value'].publish:
+            target_range_brands: Series = self.product_data.loc[self.product_data['target_range'], 'brand']
+            dominant_brand_in_target_range = bool((target_range_brands == self.dominant_brand['value'].pk).any())
         if competitive_on_specs and dominant_brand_in_target_range:
             return COMPETITIVE_SCORE_GOOD
         elif not competitive_on_specs and not dominant_brand_in_target_range:
             return COMPETITIVE_SCORE_BAD
         else:
             return COMPETITIVE_SCORE_ATTENTION
+
+    def brand_competitive_scores(self, brand_ids: List[int]) -> Series:
+        """
+        The competitive score each brand would get if its products were the target range, indexed by brand pk.
+        Dominant specs and brand are shared by every brand, so all brands are scored in one pass over the spec matches.
+        Brands with no products in the cluster score as having no competitive range.
+        """
+        if self.dominant_spec_matches.columns.empty:
+            return pd.Series([None] * len(brand_ids), index=brand_ids, dtype=object)
+        brands: Series = self.product_data['brand']
+        competitive_on_specs: Series = self.dominant_spec_matches[brands.notna()].groupby(brands.dropna().astype(int)).any().all(axis=1)
+        competitive_on_specs = competitive_on_specs.reindex(brand_ids, fill_value=False).astype(bool)
+        dominant_brand_id: Optional[int] = None
+        if self.dominant_brand and self.dominant_brand['value'].publish:
+            dominant_brand_id = self.dominant_brand['value'].pk
+        dominant_brand_in_range: Series = pd.Series(competitive_on_specs.index == dominant_brand_id, index=competitive_on_specs.index)
+        scores: np.ndarray = np.select(
+            [competitive_on_specs & dominant_brand_in_range, ~competitive_on_specs & ~dominant_brand_in_range],
+            [COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD],
+            COMPETITIVE_SCORE_ATTENTION,
+        )
+        return pd.Series(scores, index=competitive_on_specs.index, dtype=object)
+
+    def serialize(self) -> Dict[str, Any]:
+        """
+        The cluster's gap analysis as json serializable data, for storing in report snapshots.
+        Target range products are listed by model.
+        """
+        dominant_brand: Optional[Dict[str, Any]] = None
+        if self.dominant_brand:
+            dominant_brand = {
+                'pk': self.dominant_brand['value'].pk,
+                'name': self.dominant_brand['value'].name,
+                'number_of_products': int(self.dominant_brand['number_of_products']),
+                'display_share': self.dominant_brand['display_share'],
+                'target_range_display_share': self.dominant_brand['target_range_display_share'],
+            }
+        target_range_spec_gap: List[Dict[str, Any]] = []
+        for category_spec_config, spec_data in self.dominant_specs().items():
+            matched: Series = self.target_range_spec_matches[category_spec_config.pk]
+            target_range_spec_gap.append({
+                'spec': str(category_spec_config.attribute_type),
+                'value': spec_data['value'],
+                'number_of_products': int(spec_data['number_of_products']),
+                'target_range_products': self.product_data.loc[matched.index[matched], 'model'].tolist(),
+            })
+        return {
+            'cluster_price': self.cluster_price,
+            'cluster_size': self.cluster_size,
+            'average_price': self.average_price,
+            'competitive_score': self.competitive_score,
+            'dominant_brand': dominant_brand,
+            'target_range_spec_gap': target_range_spec_gap,
+        }
+
+
+class ProductSpecIndex:
+    """
+    Dense spec and price vectors for every product in a category, for finding comparable products.
+    Each scored category attribute config, plus the current average price, is a dimension scaled between 0 and 1.
+    Missing values are left as NaN and ignored when comparing products.
+    The index is kept up to date from the category's change events, reloading only the products they name.
+    """
+    price_column = 'price'
+
+    def __init__(self, category: Category):
+        self.category: Category = category
+        self.build()
+
+    def build(self) -> None:
+        """Loads every product in the category."""
+        self.configs: List[CategoryAttributeConfig] = self.load_configs()
+        # read before the products, so events recorded while they load are applied again by the next refresh
+        self.version: int = ChangeEvent.objects.latest_version(self.category.pk)
+        self.values: DataFrame = self.load_values(Product.objects.filter(category=self.category))
+        self.index_values()
+
+    def load_configs(self) -> List[CategoryAttributeConfig]:
+        return list(self.category.category_attribute_configs.for_company(None).exclude(scoring=None).select_related('attribute_type').order_by('order'))
+
+    def load_values(self, products: ProductQuerySet) -> DataFrame:
+        """The products' spec values and current average price, indexed by product pk with a column per attribute type pk."""
+        product_pks: List[int] = list(products.values_list('pk', flat=True))
+        attribute_type_ids: List[int] = [config.attribute_type_id for config in self.configs]
+        values: DataFrame = products.spec_values(attribute_type_ids).reindex(index=product_pks, columns=attribute_type_ids)
+        values[self.price_column] = pd.Series(products.current_average_prices(), dtype=float).reindex(product_pks)
+        return values
+
+    def index_values(self) -> None:
+        """Scales the loaded values into the vectors products are compared by."""
+        self.product_pks: List[int] = [int(pk) for pk in self.values.index]
+        self.positions: Dict[int, int] = {pk: position for position, pk in enumerate(self.product_pks)}
+        self.vectors: np.ndarray = np.column_stack(
+            [self.scale(self.values[config.attribute_type_id], config) for config in self.configs] + [self.scale(self.values[self.price_column])]
+        ) if self.product_pks else np.empty((0, len(self.configs) + 1))
+
+    def refresh(self) -> bool:
+        """
+        Applies the category's change events since the index was loaded, reloading the products they name
+        and dropping products no longer in the category. Changed scoring configs, and events not about a single product
+        such as merged attribute types, reload the whole index. Returns whether the index changed.
+        """
+        configs: List[CategoryAttributeConfig] = self.load_configs()
+        if [(config.attribute_type_id, config.scoring) for config in configs] != [(config.attribute_type_id, config.scoring) for config in self.configs]:
+            self.build()
+            return True
+        self.configs = configs
+        events: List[Tuple[int, Optional[int]]] = list(ChangeEvent.objects.since(self.category.pk, self.version).values_list('version', 'product_id'))
+        if not events:
+            return False
+        if any(product_id is None for _version, product_id in events):
+            self.build()
+            return True
+        self.version = events[-1][0]
+        category_pks: Set[int] = set(Product.objects.filter(category=self.category).values_list('pk', flat=True))
+        indexed_pks: Set[int] = set(self.product_pks)
+        reload_pks: Set[int] = ({product_id for _version, product_id in events} & category_pks) | (category_pks - indexed_pks)
+        self.values = self.values.drop(index=list((indexed_pks - category_pks) | (reload_pks & indexed_pks)))
+        if reload_pks:
+            self.values = pd.concat([self.values, self.load_values(Product.objects.filter(category=self.category, pk__in=reload_pks))])
+        self.index_values()
+        return True
+
+    @staticmethod
+    def scale(values: Series, config: Optional[CategoryAttributeConfig] = None) -> np.ndarray:
+        if config and config.scoring in [SCORING_BOOL_TRUE, SCORING_BOOL_FALSE]:
+            return values.map({True: 1.0, False: 0.0}).astype(float).to_numpy()
+        numbers: Series = pd.to_numeric(values, errors='coerce').astype(float)
+        value_range: float = numbers.max() - numbers.min()
+        return ((numbers - numbers.min()) / value_range if value_range else numbers * 0).to_numpy()
+
+    @classmethod
+    def for_category(cls, category: Category) -> 'ProductSpecIndex':
+        """Returns the category's cached index, refreshed with the category's change events since it was cached."""
+        key: str = f"product-spec-index:category:{category.pk}"
+        index: ProductSpecIndex = get_or_compute(key, lambda: cls(category), settings.CACHE_DURATION_REPORTS)
+        if index.refresh():
+            set_cached(key, index, settings.CACHE_DURATION_REPORTS)
+        return index
+
+    def distances(self, product_pk: int) -> np.ndarray:
+        """
+        Root mean squared distance from the product to every product in the category, over the dimensions both have values for.
+        Products with no dimensions in common, and the product itself, are infinitely far away.
+        """
+        position: int = self.positions[product_pk]
+        present: np.ndarray = ~np.isnan(self.vectors) & ~np.isnan(self.vectors[position])
+        differences: np.ndarray = np.where(present, self.vectors - np.nan_to_num(self.vectors[position]), 0)
+        shared_dimensions: np.ndarray = present.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances: np.ndarray = np.sqrt((differences ** 2).sum(axis=1) / shared_dimensions)
+        distances[shared_dimensions == 0] = np.inf
+        distances[position] = np.inf
+        return distances
+
+    def nearest(self, product: Product, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Returns the k products most similar to product, closest first, with how each of their specs differs from product.
+        """
+        if product.pk not in self.positions:
+            return []
+        distances: np.ndarray = self.distances(product.pk)
+        k = min(k, int(np.isfinite(distances).sum()))
+        if not k:
+            return []
+        nearest: np.ndarray = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        products: Dict[int, Product] = Product.objects.select_related('brand').in_bulk([self.product_pks[position] for position in nearest])
+        names: Dict[Any, str] = {config.attribute_type_id: config.attribute_type.name for config in self.configs}
+        names[self.price_column] = self.price_column
+        target_values: Series = self.values.loc[product.pk]
+        comparisons: List[Dict[str, Any]] = []
+        for position in nearest:
+            product_pk: int = self.product_pks[position]
+            if product_pk not in products:
+                # deleted since the index was last refreshed
+                continue
+            comparisons.append({
+                'product': products[product_pk],
+                'distance': float(distances[position]),
+                'specs': [self.spec_delta(names[column], value, target_values[column]) for column, value in self.values.loc[product_pk].items()],
+            })
+        return comparisons
+
+    @staticmethod
+    def spec_delta(name: str, value: Any, target_value: Any) -> Dict[str, Any]:
+        """A comparable product's spec value, and its difference from the target product's value when both are numeric."""
+        def is_number(spec_value: Any) -> bool:
+            return isinstance(spec_value, (int, float, np.number)) and not isinstance(spec_value, bool) and not np.isnan(spec_value)
+
+        if isinstance(value, float) and np.isnan(value):
+            value = None
+        return {
+            'name': name,
+            'value': value,
+            'delta': float(value - target_value) if is_number(value) and is_number(target_value) else None,
+        }
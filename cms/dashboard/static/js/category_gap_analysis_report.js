@@ -0,0 +1,20 @@
+$(document).ready(function() {
+   var snapshotProgress = $('#snapshot-progress');
+   if (!snapshotProgress.length) {
+      return;
+   }
+   var progressBar = snapshotProgress.find('.progress-bar');
+   var pollProgress = function() {
+      $.getJSON(snapshotProgress.data('url'), function(snapshot) {
+         progressBar.css('width', snapshot.progress + '%').attr('aria-valuenow', snapshot.progress).text(snapshot.progress + '%');
+         if (snapshot.status === 'complete') {
+            window.location.reload();
+         } else if (snapshot.status === 'failed') {
+            progressBar.addClass('bg-danger').text(gettext('Failed'));
+         } else {
+            setTimeout(pollProgress, 2000);
+         }
+      });
+   };
+   pollProgress();
+});
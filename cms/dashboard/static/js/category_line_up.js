@@ -6,8 +6,30 @@ $(document).ready(function() {
    $('document').on('click', '#category_line_up_submit', function (){
       $('#category_line_up_form').submit();
    });
-   $('select[multiple]').select2({
+   $('select[multiple]').not('[data-autocomplete-url]').select2({
       allowClear: true,
       closeOnSelect: false,
    });
+   // choices of large fields are loaded a page at a time, scoped to the selected category
+   $('select[data-autocomplete-url]').each(function () {
+      var select = $(this);
+      select.select2({
+         allowClear: true,
+         closeOnSelect: !select.prop('multiple'),
+         placeholder: '',
+         minimumInputLength: 0,
+         ajax: {
+            url: select.data('autocomplete-url'),
+            dataType: 'json',
+            delay: 250,
+            data: function (params) {
+               return {
+                  term: params.term || '',
+                  page: params.page || 1,
+                  category: $('#id_category').val() || '',
+               };
+            },
+         },
+      });
+   });
 });
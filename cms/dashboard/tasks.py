@@ -0,0 +1,97 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Union, Callable, Any
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction, connection
+
+from cms.dashboard.constants import COMPARABLE_PRODUCTS_LIMIT, CACHE_WARMUP_CONSUMER
+from cms.dashboard.models import CategoryGapAnalysisReport, CategoryGapAnalysisSnapshot, CategoryTable, CacheWarmup
+from cms.dashboard.reports import ProductSpecIndex
+from cms.models import Product, ChangeEventConsumer
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compute_gap_analysis_snapshot(snapshot_pk: int):
+    CategoryGapAnalysisSnapshot.objects.select_related('report__category', 'report__brand').get(pk=snapshot_pk).compute()
+
+
+def queue_gap_analysis_snapshot(report: CategoryGapAnalysisReport) -> CategoryGapAnalysisSnapshot:
+    """
+    Queues a new snapshot of the report's gap analysis to be computed once the current transaction commits.
+    If a snapshot is already in progress, it's returned instead of queueing another.
+    """
+    snapshot: CategoryGapAnalysisSnapshot = report.snapshots.in_progress().first()
+    if not snapshot:
+        snapshot = report.snapshots.create()
+        transaction.on_commit(lambda: compute_gap_analysis_snapshot.delay(snapshot.pk))
+    return snapshot
+
+
+def warm_product(product: Product) -> None:
+    """Computes the spec index behind the product page's comparable products."""
+    if product.category:
+        ProductSpecIndex.for_category(product.category).nearest(product, k=COMPARABLE_PRODUCTS_LIMIT)
+
+
+def warm_object(obj: Union[CategoryTable, CategoryGapAnalysisReport, Product], warm: Callable[[Any], Any]) -> Optional[CacheWarmup]:
+    """
+    Recomputes the object's cached data and records how long it took.
+    Errors are logged rather than raised, so one failing object doesn't leave the rest of the warm-up cold.
+    """
+    try:
+        start: float = time.perf_counter()
+        warm(obj)
+        return CacheWarmup.objects.create(
+            object_type=obj._meta.verbose_name,
+            object_id=obj.pk,
+            name=str(obj)[:100],
+            duration=time.perf_counter() - start,
+        )
+    except Exception:
+        logger.exception("Failed to warm the cache of %s %s", obj._meta.verbose_name, obj.pk)
+    finally:
+        if settings.CACHE_WARMUP_CONCURRENCY > 1:
+            # each worker thread has its own database connection
+            connection.close()
+
+
+@shared_task
+def warm_caches(category_ids: Optional[List[int]] = None):
+    """
+    Recomputes published category tables and gap analysis reports, and the most viewed products' pages, e.g. after a crawl.
+    Objects are warmed CACHE_WARMUP_CONCURRENCY at a time, optionally only those in the given categories.
+    """
+    tables = CategoryTable.objects.published().select_related('category', 'x_axis_attribute', 'y_axis_attribute')
+    reports = CategoryGapAnalysisReport.objects.published().select_related('category', 'brand')
+    products = Product.objects.published().select_related('category').filter(view_count__gt=0).order_by('-view_count')
+    if category_ids is not None:
+        tables = tables.filter(category_id__in=category_ids)
+        reports = reports.filter(category_id__in=category_ids)
+        products = products.filter(category_id__in=category_ids)
+    objects: List[tuple] = [(table, CategoryTable.warm_cache) for table in tables]
+    objects += [(report, CategoryGapAnalysisReport.warm_cache) for report in reports]
+    objects += [(product, warm_product) for product in products[:settings.CACHE_WARMUP_PRODUCTS]]
+    if settings.CACHE_WARMUP_CONCURRENCY > 1:
+        with ThreadPoolExecutor(max_workers=settings.CACHE_WARMUP_CONCURRENCY) as executor:
+            list(executor.map(lambda item: warm_object(*item), objects))
+    else:
+        for obj, warm in objects:
+            warm_object(obj, warm)
+
+
+@shared_task
+def warm_changed_caches():
+    """Recomputes the cached dashboards of the categories with change events since the last time, e.g. after a crawl."""
+    category_ids: List[int] = ChangeEventConsumer.objects.changed_categories(CACHE_WARMUP_CONSUMER)
+    if category_ids:
+        warm_caches(category_ids)
+
+
+def queue_cache_warmup(category_ids: Optional[List[int]] = None) -> None:
+    """Queues cached dashboards to be re-warmed in the background once the current transaction commits."""
+    transaction.on_commit(lambda: warm_caches.delay(category_ids))
@@ -1,4 +1,4 @@
-from typing import Optional, Union
+from typing import Optional, Union, Dict, List
 
 from django import template
 from django.utils.html import format_html
@@ -16,8 +16,14 @@ def product_specs(context: dict, product: Product):
     specs_limit: int = 5
     html = ""
     table: Optional[CategoryTable] = context.get('table')
+    spec_matrix: Optional[Dict[int, List[Optional[ProductAttribute]]]] = context.get('spec_matrix')
     table_product_attributes = product.top_attributes
-    if table and table.category_table_attributes.exists():
+    if spec_matrix is not None and product.pk in spec_matrix:
+        table_product_attributes = spec_matrix[product.pk]
+        # the category's top specs a table without its own falls back to are limited as before
+        if table and table.table_spec_attribute_types:
+            specs_limit = len(table_product_attributes)
+    elif table and table.category_table_attributes.exists():
         table_product_attributes = []
         specs_limit = table.category_table_attributes.count()
         for category_table_attribute in table.category_table_attributes.order_by('order').iterator():
@@ -45,21 +51,21 @@ def product_attribute(context: dict, product_attribute: ProductAttribute):
 
 @register.filter
 def cluster_score_icon(score: str) -> Optional[str]:
-    if score is COMPETITIVE_SCORE_GOOD:
+    if score == COMPETITIVE_SCORE_GOOD:
         return 'fa fa-check'
-    elif score is COMPETITIVE_SCORE_ATTENTION:
+    elif score == COMPETITIVE_SCORE_ATTENTION:
         return 'fa fa-exclamation'
-    elif score is COMPETITIVE_SCORE_BAD:
+    elif score == COMPETITIVE_SCORE_BAD:
         return 'fa fa-times'
 
 
 @register.filter
 def cluster_score_class(score: str) -> Optional[str]:
-    if score is COMPETITIVE_SCORE_GOOD:
+    if score == COMPETITIVE_SCORE_GOOD:
         return 'success'
-    elif score is COMPETITIVE_SCORE_ATTENTION:
+    elif score == COMPETITIVE_SCORE_ATTENTION:
         return 'warning'
-    elif score is COMPETITIVE_SCORE_BAD:
+    elif score == COMPETITIVE_SCORE_BAD:
         return 'danger'
 
 
@@ -1,7 +1,8 @@
 from django.test import TestCase
 from model_mommy import mommy
 
-from cms.dashboard.forms import CategoryTableForm, CategoryTableFilterForm, ProductsFilterForm
+from cms.dashboard.constants import PRICE_CLUSTERS_MANUAL, PRICE_CLUSTERS_JENKS
+from cms.dashboard.forms import CategoryTableForm, CategoryTableFilterForm, ProductsFilterForm, CategoryGapAnalysisForm
 from cms.dashboard.models import CategoryTable
 from cms.models import Product, AttributeType, Category, ProductAttribute, WebsiteProductAttribute, Brand
 
@@ -127,6 +128,20 @@ class TestForms(TestCase):
             self.assertIn(cat_1, tables)
             self.assertIn(cat_2, tables)
 
+    def test_category_gap_analysis_form__clean(self):
+        data: dict = {'name': 'report', 'category': self.category.pk, 'number_of_clusters': 4}
+        with self.subTest("manual clusters required"):
+            form: CategoryGapAnalysisForm = CategoryGapAnalysisForm(data=dict(data, cluster_method=PRICE_CLUSTERS_MANUAL))
+            self.assertFalse(form.is_valid())
+            self.assertIn('price_clusters', form.errors)
+        with self.subTest("manual clusters"):
+            form: CategoryGapAnalysisForm = CategoryGapAnalysisForm(data=dict(data, cluster_method=PRICE_CLUSTERS_MANUAL, price_clusters='199.99,299'))
+            self.assertTrue(form.is_valid(), form.errors)
+            self.assertEqual(form.cleaned_data['price_clusters'], [199.99, 299])
+        with self.subTest("automatic clusters"):
+            form: CategoryGapAnalysisForm = CategoryGapAnalysisForm(data=dict(data, cluster_method=PRICE_CLUSTERS_JENKS))
+            self.assertTrue(form.is_valid(), form.errors)
+
     def test_products_filter_form(self):
         whirlpool: Brand = Brand.objects.create(name="whirlpool")
         with self.subTest("brands"):
@@ -178,6 +193,12 @@ class TestForms(TestCase):
             self.assertNotIn(prod_1, tables)
             self.assertIn(prod_2, tables)
 
+        with self.subTest("products with several prices aren't duplicated"):
+            mommy.make(WebsiteProductAttribute, product=prod_1, attribute_type=price_attr, data={'value': 110})
+            form: ProductsFilterForm = ProductsFilterForm({'price_low': 75, 'price_high': 200})
+            form.is_valid()
+            self.assertEqual(list(form.search(Product.objects.all())), [prod_1])
+
         with self.subTest("brands"):
             form: ProductsFilterForm = ProductsFilterForm({'brands': [whirlpool]})
             form.is_valid()
@@ -1,14 +1,21 @@
+from datetime import timedelta
 from typing import List
 from unittest import skip
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from model_mommy import mommy
 
 from cms.accounts.models import Company
-from cms.dashboard.models import CategoryTable, CategoryGapAnalysisReport
+from cms.cache import bump_data_version
+from cms.dashboard.constants import SNAPSHOT_COMPLETE, SNAPSHOT_RUNNING, PRICE_CLUSTERS_QUANTILES, PRICE_CLUSTERS_JENKS
+from cms.dashboard.models import CategoryTable, CategoryTableAttribute, CategoryGapAnalysisReport, CategoryGapAnalysisSnapshot
 from cms.dashboard.reports import ProductCluster
-from cms.models import Product, WebsiteProductAttribute, AttributeType, Category, Website, Brand
+from cms.dashboard.templatetags.dashboard_extras import product_specs
+from cms.models import Product, WebsiteProductAttribute, AttributeType, Category, Website, Brand, ProductAttribute, \
+    CategoryAttributeConfig
 from cms.scripts.load_cms import run as load_cms
 
 
@@ -103,6 +110,88 @@ class TestModels(TestCase):
         self.assertEqual(len(table_dict['indesit']), len(table_dict['beko']))
         self.assertEqual(len(table_dict['candy']), len(table_dict['beko']))
 
+    def test_category_table_spec_matrix(self):
+        category: Category = mommy.make(Category)
+        load_size: AttributeType = mommy.make(AttributeType, name="load size")
+        spin_speed: AttributeType = mommy.make(AttributeType, name="spin speed")
+        table: CategoryTable = mommy.make(CategoryTable, category=category)
+        mommy.make(CategoryTableAttribute, table=table, attribute=spin_speed, order=1)
+        mommy.make(CategoryTableAttribute, table=table, attribute=load_size, order=2)
+        products: List[Product] = mommy.make(Product, category=category, _quantity=3)
+        for product in products[:2]:
+            mommy.make(ProductAttribute, product=product, attribute_type=load_size, data={'value': 7})
+        spin_speed_attribute: ProductAttribute = mommy.make(ProductAttribute, product=products[0], attribute_type=spin_speed, data={'value': 1400})
+
+        with self.subTest("single query for all products"):
+            with self.assertNumQueries(2):
+                spec_matrix = table.spec_matrix(products)
+                self.assertEqual(spec_matrix[products[0].pk][0], spin_speed_attribute)
+                self.assertEqual([attribute.data['value'] for attribute in spec_matrix[products[0].pk]], [1400, 7])
+                self.assertIsNone(spec_matrix[products[1].pk][0])
+                self.assertEqual(spec_matrix[products[2].pk], [None, None])
+
+        with self.subTest("falls back to category configs"):
+            table.category_table_attributes.all().delete()
+            mommy.make(CategoryAttributeConfig, category=category, attribute_type=load_size)
+            del table.table_spec_attribute_types
+            del table.spec_attribute_types
+            spec_matrix = table.spec_matrix(products)
+            self.assertEqual([[attribute and attribute.data['value'] for attribute in specs] for specs in spec_matrix.values()], [[7], [7], [None]])
+
+    def test_category_table_product_specs(self):
+        category: Category = mommy.make(Category)
+        product: Product = mommy.make(Product, category=category)
+        attribute_types: List[AttributeType] = mommy.make(AttributeType, _quantity=8)
+        for order, attribute_type in enumerate(attribute_types):
+            mommy.make(CategoryAttributeConfig, category=category, attribute_type=attribute_type, order=order)
+            mommy.make(ProductAttribute, product=product, attribute_type=attribute_type, data={'value': order})
+        table: CategoryTable = mommy.make(CategoryTable, category=category)
+
+        with self.subTest("category's top specs limited"):
+            html: str = product_specs({'table': table, 'spec_matrix': table.spec_matrix([product])}, product)
+            self.assertEqual(html.count('<div'), 6)
+
+        with self.subTest("table specs all shown"):
+            for order, attribute_type in enumerate(attribute_types):
+                mommy.make(CategoryTableAttribute, table=table, attribute=attribute_type, order=order)
+            table = CategoryTable.objects.get(pk=table.pk)
+            html: str = product_specs({'table': table, 'spec_matrix': table.spec_matrix([product])}, product)
+            self.assertEqual(html.count('<div'), len(attribute_types))
+
+    def test_category_table_cache(self):
+        cache.clear()
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        table: CategoryTable = mommy.make(CategoryTable, category=mommy.make(Category))
+        for price in [100, 200]:
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=table.category, data={'value': price})
+        self.assertEqual(len(table.cached_table['table_data'][None]), 2)
+
+        with self.subTest("shared cache"):
+            table = CategoryTable.objects.get(pk=table.pk)
+            with self.assertNumQueries(4):
+                cached_table: dict = table.cached_table
+                self.assertEqual([cell.product.current_average_price_int for cell in cached_table['table_data'][None]], [100, 200])
+
+        with self.subTest("data version bumped"):
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=table.category, data={'value': 300})
+            table = CategoryTable.objects.get(pk=table.pk)
+            self.assertEqual(len(table.cached_table['table_data'][None]), 2)
+            bump_data_version(table.category_id)
+            table = CategoryTable.objects.get(pk=table.pk)
+            self.assertEqual(len(table.cached_table['table_data'][None]), 3)
+
+        with self.subTest("table config changed"):
+            table.price_low = 150
+            table.save()
+            table = CategoryTable.objects.get(pk=table.pk)
+            self.assertEqual(len(table.cached_table['table_data'][None]), 2)
+
+        with self.subTest("warm cache"):
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=table.category, data={'value': 400})
+            CategoryTable.objects.get(pk=table.pk).warm_cache()
+            table = CategoryTable.objects.get(pk=table.pk)
+            self.assertEqual(len(table.cached_table['table_data'][None]), 3)
+
     def test_category_table_for_user(self):
         company: Company = mommy.make(Company, name="test company")
         user: User = mommy.make(User)
@@ -160,6 +249,139 @@ class TestModels(TestCase):
             analyzed_clusters: List[ProductCluster] = report.gap_analysis_clusters
             self.assertIsInstance(analyzed_clusters[0], ProductCluster)
 
+    def test_gap_analysis_price_breakpoints(self):
+        cache.clear()
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, category__name="washers", price_clusters=[200, 100], number_of_clusters=2)
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        for price in [90, 100, 110, 290, 300, 310]:
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, data={'value': price})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, data={'value': 5000})
+
+        with self.subTest("manual"):
+            self.assertEqual(report.price_breakpoints, [100, 200])
+            self.assertEqual([(price, len(list(products))) for price, products in report.cluster_products()], [(100, 2), (200, 1), (None, 3)])
+
+        with self.subTest("quantiles"):
+            report.cluster_method = PRICE_CLUSTERS_QUANTILES
+            self.assertEqual(report.price_breakpoints, [200, 310])
+            self.assertEqual([(price, len(list(products))) for price, products in report.cluster_products()], [(200, 3), (310, 3)])
+
+        with self.subTest("jenks"):
+            report.cluster_method = PRICE_CLUSTERS_JENKS
+            self.assertEqual(report.price_breakpoints, [110, 310])
+
+        with self.subTest("cached per data version"):
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, data={'value': 1000})
+            with self.assertNumQueries(0):
+                self.assertEqual(report.price_breakpoints, [110, 310])
+            bump_data_version(report.category_id)
+            self.assertEqual(report.price_breakpoints, [310, 1000])
+
+    def test_gap_analysis_clusters_cache(self):
+        cache.clear()
+        website: Website = mommy.make(Website)
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, category__name="washers", websites=[website], price_clusters=[99.99, 149.99])
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, website=website, data={'value': 99})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, website=website, data={'value': 149})
+        clusters: List[ProductCluster] = report.gap_analysis_clusters
+        self.assertEqual(len(clusters), 2)
+
+        with self.subTest("memoised per report"):
+            with self.assertNumQueries(0):
+                self.assertIs(report.gap_analysis_clusters, clusters)
+
+        with self.subTest("shared cache"):
+            report = CategoryGapAnalysisReport.objects.get(pk=report.pk)
+            with self.assertNumQueries(1):
+                cached_clusters: List[ProductCluster] = report.gap_analysis_clusters
+                self.assertEqual([cluster.cluster_price for cluster in cached_clusters], [99.99, 149.99])
+                self.assertEqual([cluster.average_price for cluster in cached_clusters], [99, 149])
+                for cluster in cached_clusters:
+                    cluster.competitive_score
+                    cluster.dominant_brand
+                    cluster.target_range_spec_gap
+
+        with self.subTest("data version bumped"):
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, website=website, data={'value': 50})
+            bump_data_version(report.category_id)
+            report = CategoryGapAnalysisReport.objects.get(pk=report.pk)
+            self.assertEqual(report.gap_analysis_clusters[0].cluster_size, "66%")
+
+        with self.subTest("report config changed"):
+            report.price_clusters = [149.99]
+            report.save()
+            report = CategoryGapAnalysisReport.objects.get(pk=report.pk)
+            self.assertEqual([cluster.cluster_price for cluster in report.gap_analysis_clusters], [149.99])
+
+        with self.subTest("clear cache"):
+            report.gap_analysis_clusters
+            report.clear_cache()
+            report = CategoryGapAnalysisReport.objects.get(pk=report.pk)
+            with self.assertNumQueries(2):
+                report.cache_key
+                self.assertIsNone(cache.get(report.cache_key))
+
+    def test_gap_analysis_snapshot_compute(self):
+        website: Website = mommy.make(Website)
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, category__name="washers", websites=[website], price_clusters=[99.99, 149.99])
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, website=website, data={'value': 99})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, website=website, data={'value': 149})
+        old_snapshot: CategoryGapAnalysisSnapshot = mommy.make(CategoryGapAnalysisSnapshot, report=report, status=SNAPSHOT_COMPLETE)
+        snapshot: CategoryGapAnalysisSnapshot = mommy.make(CategoryGapAnalysisSnapshot, report=report)
+        progress: List[int] = []
+        snapshot.update_progress = progress.append
+        snapshot.compute()
+
+        with self.subTest("snapshot data"):
+            snapshot = CategoryGapAnalysisSnapshot.objects.get(pk=snapshot.pk)
+            self.assertEqual(snapshot.status, SNAPSHOT_COMPLETE)
+            self.assertEqual(snapshot.progress, 100)
+            self.assertIsNotNone(snapshot.computed_at)
+            self.assertEqual([cluster['cluster_price'] for cluster in snapshot.data], [99.99, 149.99])
+            self.assertEqual([cluster['average_price'] for cluster in snapshot.data], [99, 149])
+
+        with self.subTest("progress"):
+            self.assertEqual(progress, [50, 100])
+
+        with self.subTest("claimed by another worker"):
+            claimed: CategoryGapAnalysisSnapshot = mommy.make(CategoryGapAnalysisSnapshot, report=report)
+            self.assertTrue(CategoryGapAnalysisSnapshot.objects.get(pk=claimed.pk).claim())
+            claimed.compute()
+            self.assertEqual(CategoryGapAnalysisSnapshot.objects.get(pk=claimed.pk).progress, 0)
+            claimed.delete()
+
+        with self.subTest("brand competitive scores"):
+            brand_ids = {str(brand_id) for brand_id in Product.objects.values_list('brand_id', flat=True) if brand_id}
+            for cluster in snapshot.data:
+                self.assertEqual(set(cluster['brand_competitive_scores']), brand_ids)
+
+        with self.subTest("older snapshots removed"):
+            self.assertFalse(CategoryGapAnalysisSnapshot.objects.filter(pk=old_snapshot.pk).exists())
+            self.assertEqual(report.latest_snapshot, snapshot)
+
+        with self.subTest("in progress"):
+            running: CategoryGapAnalysisSnapshot = mommy.make(CategoryGapAnalysisSnapshot, report=report, status=SNAPSHOT_RUNNING)
+            self.assertEqual(list(report.snapshots.in_progress()), [running])
+            CategoryGapAnalysisSnapshot.objects.filter(pk=running.pk).update(modified=running.modified - timedelta(seconds=settings.SNAPSHOT_TIMEOUT + 1))
+            self.assertFalse(report.snapshots.in_progress().exists())
+
+    def test_gap_analysis_brand_competitive_scores(self):
+        category: Category = mommy.make(Category, name="washers")
+        whirlpool: Brand = Brand.objects.create(name="whirlpool")
+        bosch: Brand = Brand.objects.create(name="bosch")
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, category=category, brand=whirlpool, price_clusters=[99.99, 149.99])
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=category, product__brand=whirlpool, data={'value': 99})
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=category, product__brand=bosch, data={'value': 149})
+        scores = report.brand_competitive_scores()
+        self.assertEqual(list(scores.index), sorted([whirlpool.pk, bosch.pk]))
+        self.assertEqual(list(scores.columns), [99.99, 149.99])
+        for cluster in report.gap_analysis_clusters:
+            with self.subTest("matches report competitive score", cluster=cluster.cluster_price):
+                self.assertEqual(scores.loc[whirlpool.pk, cluster.cluster_price], cluster.competitive_score)
+
     def test_gap_analysis_products(self):
         whirlpool: Brand = Brand.objects.create(name="whirlpool")
         bosch: Brand = Brand.objects.create(name="bosch")
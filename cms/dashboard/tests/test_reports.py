@@ -1,13 +1,16 @@
+import json
 from typing import Optional
 
+import numpy as np
 from django.test import TestCase
 from model_mommy import mommy
 
-from cms.constants import SCORING_NUMERICAL_HIGHER, SCORING_NUMERICAL_LOWER
+from cms.constants import SCORING_NUMERICAL_HIGHER, SCORING_NUMERICAL_LOWER, CHANGE_ATTRIBUTE_ADDED, CHANGE_PRODUCT_CREATED, \
+    CHANGE_ATTRIBUTE_TYPES_MERGED
 from cms.dashboard.constants import COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD, COMPETITIVE_SCORE_ATTENTION
-from cms.dashboard.reports import ProductCluster
+from cms.dashboard.reports import ProductCluster, quantile_breaks, jenks_breaks, ProductSpecIndex
 from cms.models import Product, ProductAttribute, Category, CategoryAttributeConfig, AttributeType, \
-    WebsiteProductAttribute, ProductQuerySet, Brand
+    WebsiteProductAttribute, ProductQuerySet, Brand, ChangeEvent
 
 
 class TestReports(TestCase):
@@ -118,6 +121,23 @@ class TestReports(TestCase):
         self.assertIn(self.p1, spec_gap_analysis[self.cat_cfg_2]['target_range_products'])
         self.assertIn(self.p1, spec_gap_analysis[self.cat_cfg_3]['target_range_products'])
 
+    def test_product_cluster_query_count(self):
+        total_number_products: int = Product.objects.count()
+
+        def analyse(products) -> ProductCluster:
+            cluster: ProductCluster = ProductCluster(self.category, (1, products), Product.objects.filter(brand=self.whirlpool), total_number_products)
+            cluster.dominant_specs()
+            cluster.target_range_spec_gap
+            cluster.competitive_score
+            cluster.average_price
+            return cluster
+
+        products = list(Product.objects.all())
+        with self.assertNumQueries(6):
+            analyse(products[:2])
+        with self.assertNumQueries(6):
+            analyse(products)
+
     def test_competitive_score(self):
         with self.subTest("bad"):
             cluster: ProductCluster = ProductCluster(
@@ -145,3 +165,119 @@ class TestReports(TestCase):
                 Product.objects.count()
             )
             self.assertEqual(cluster.competitive_score, COMPETITIVE_SCORE_GOOD)
+
+    def test_product_cluster_serialize(self):
+        serialized: dict = self.cluster.serialize()
+        self.assertEqual(json.loads(json.dumps(serialized)), serialized)
+        self.assertEqual(serialized['average_price'], 361)
+        self.assertEqual(serialized['cluster_size'], "100%")
+        self.assertEqual(serialized['dominant_brand']['pk'], self.whirlpool.pk)
+        self.assertEqual(serialized['dominant_brand']['name'], "whirlpool")
+        self.assertEqual(serialized['target_range_spec_gap'][0], {
+            'spec': "load size",
+            'value': 8,
+            'number_of_products': 2,
+            'target_range_products': [],
+        })
+        self.assertEqual(serialized['target_range_spec_gap'][1]['target_range_products'], [self.p1.model])
+
+        with self.subTest("empty queryset"):
+            cluster: ProductCluster = ProductCluster(self.category, (1, Product.objects.none()), Product.objects.none(), Product.objects.count())
+            serialized: dict = cluster.serialize()
+            self.assertIsNone(serialized['dominant_brand'])
+            self.assertEqual(serialized['target_range_spec_gap'], [])
+
+    def test_product_cluster_brand_competitive_scores(self):
+        products = list(Product.objects.all())
+        brand_ids = [self.whirlpool.pk, self.hotpoint.pk, self.indesit.pk, Brand.objects.create(name="beko").pk]
+        cluster: ProductCluster = ProductCluster(self.category, (1, products), Product.objects.none(), len(products))
+        scores = cluster.brand_competitive_scores(brand_ids)
+        self.assertEqual(list(scores.index), brand_ids)
+        for brand_id in brand_ids:
+            with self.subTest("matches single brand analysis", brand=brand_id):
+                brand_cluster: ProductCluster = ProductCluster(self.category, (1, products), Product.objects.filter(brand_id=brand_id), len(products))
+                self.assertEqual(scores[brand_id], brand_cluster.competitive_score)
+
+        with self.subTest("no specs"):
+            cluster: ProductCluster = ProductCluster(mommy.make(Category), (1, products), Product.objects.none(), len(products))
+            self.assertEqual(cluster.brand_competitive_scores(brand_ids).tolist(), [None] * len(brand_ids))
+
+    def test_quantile_breaks(self):
+        prices = np.array([100, 110, 120, 300, 310, 320, 900, 950])
+        self.assertEqual(quantile_breaks(prices, 2), [305, 950])
+        self.assertEqual(quantile_breaks(prices, 1), [950])
+        self.assertEqual(quantile_breaks(np.array([]), 3), [])
+
+    def test_jenks_breaks(self):
+        prices = np.array([950, 100, 110, 300, 120, 310, 320, 900])
+        self.assertEqual(jenks_breaks(prices, 3), [120, 320, 950])
+        with self.subTest("fewer distinct prices than clusters"):
+            self.assertEqual(jenks_breaks(np.array([100, 100, 200]), 3), [100, 200])
+        with self.subTest("no prices"):
+            self.assertEqual(jenks_breaks(np.array([]), 3), [])
+        with self.subTest("large number of prices"):
+            prices = np.concatenate([np.full(1000, 100), np.full(1000, 500), np.full(1000, 1000)])
+            self.assertEqual(jenks_breaks(prices, 3), [100, 500, 1000])
+
+    def test_product_spec_index_nearest(self):
+        index: ProductSpecIndex = ProductSpecIndex(self.category)
+        comparable = index.nearest(self.p3, k=2)
+        self.assertEqual([comparison['product'] for comparison in comparable], [self.p2, self.p1])
+        self.assertAlmostEqual(comparable[0]['distance'], 0.75 ** 0.5 / 2)
+        self.assertEqual(comparable[0]['specs'], [
+            {'name': 'load size', 'value': 8, 'delta': 0},
+            {'name': 'spin', 'value': 1400, 'delta': -200},
+            {'name': 'energy usage', 'value': 75, 'delta': -25},
+            {'name': 'price', 'value': 399, 'delta': 50},
+        ])
+
+        with self.subTest("k larger than category"):
+            self.assertEqual(len(index.nearest(self.p3, k=10)), 3)
+
+        with self.subTest("missing specs ignored"):
+            ProductAttribute.objects.filter(product=self.p2).delete()
+            WebsiteProductAttribute.objects.filter(product=self.p2).delete()
+            index: ProductSpecIndex = ProductSpecIndex(self.category)
+            self.assertEqual([comparison['product'] for comparison in index.nearest(self.p3, k=3)], [self.p1, self.p4])
+            self.assertEqual(index.nearest(self.p2), [])
+
+        with self.subTest("product outside category"):
+            self.assertEqual(index.nearest(mommy.make(Product)), [])
+
+    def test_product_spec_index_refresh(self):
+        index: ProductSpecIndex = ProductSpecIndex.for_category(self.category)
+        load_size_id: int = self.cat_cfg_1.attribute_type_id
+
+        with self.subTest("nothing changed"):
+            self.assertFalse(index.refresh())
+
+        with self.subTest("products in events reloaded"):
+            ProductAttribute.objects.filter(product__in=[self.p1, self.p2], attribute_type_id=load_size_id).update(data={'value': 9})
+            ChangeEvent.objects.record(self.category.pk, CHANGE_ATTRIBUTE_ADDED, product=self.p1)
+            index = ProductSpecIndex.for_category(self.category)
+            self.assertEqual(index.values.loc[self.p1.pk, load_size_id], 9)
+            self.assertEqual(index.values.loc[self.p2.pk, load_size_id], 8)
+            self.assertFalse(index.refresh())
+
+        with self.subTest("products added and moved"):
+            product: Product = mommy.make(Product, category=self.category)
+            ChangeEvent.objects.record(self.category.pk, CHANGE_PRODUCT_CREATED, product=product)
+            Product.objects.filter(pk=self.p4.pk).update(category=mommy.make(Category))
+            self.assertTrue(index.refresh())
+            self.assertCountEqual(index.product_pks, [self.p1.pk, self.p2.pk, self.p3.pk, product.pk])
+            self.assertEqual(index.vectors.shape, (4, 4))
+
+        with self.subTest("events about no product reload everything"):
+            ProductAttribute.objects.filter(product=self.p2, attribute_type_id=load_size_id).update(data={'value': 7})
+            ChangeEvent.objects.record(self.category.pk, CHANGE_ATTRIBUTE_TYPES_MERGED)
+            self.assertTrue(index.refresh())
+            self.assertEqual(index.values.loc[self.p2.pk, load_size_id], 7)
+            self.assertEqual(index.version, ChangeEvent.objects.latest_version(self.category.pk))
+
+        with self.subTest("attribute types named alike"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, attribute_type__name="price", order=4, category=self.category, scoring=SCORING_NUMERICAL_HIGHER)
+            mommy.make(ProductAttribute, product=self.p1, attribute_type=config.attribute_type, data={'value': 1})
+            self.assertTrue(index.refresh())
+            self.assertEqual(index.values.loc[self.p1.pk, config.attribute_type_id], 1)
+            self.assertEqual(index.values.loc[self.p1.pk, 'price'], 299)
+            self.assertEqual([spec['name'] for spec in index.nearest(self.p3)[0]['specs']], ['load size', 'spin', 'energy usage', 'price', 'price'])
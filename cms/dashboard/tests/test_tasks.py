@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from model_mommy import mommy
+
+from cms.dashboard.constants import SNAPSHOT_COMPLETE, SNAPSHOT_PENDING
+from cms.dashboard.models import CategoryTable, CategoryGapAnalysisReport, CacheWarmup, CategoryGapAnalysisSnapshot
+from cms.dashboard.tasks import warm_caches, warm_changed_caches
+from cms.constants import CHANGE_PRODUCT_CREATED
+from cms.models import Product, Category, AttributeType, WebsiteProductAttribute, ChangeEvent
+
+
+@override_settings(CACHE_WARMUP_CONCURRENCY=1, CACHE_WARMUP_PRODUCTS=1)
+class TestTasks(TestCase):
+
+    def test_warm_caches(self):
+        cache.clear()
+        category: Category = mommy.make(Category)
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        for price in [100, 200]:
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=category, data={'value': price})
+        table: CategoryTable = mommy.make(CategoryTable, category=category, name="table")
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, category=category, name="report", price_clusters=[150, 250])
+        other_table: CategoryTable = mommy.make(CategoryTable, category=mommy.make(Category), name="other table")
+        most_viewed: Product = mommy.make(Product, category=category, view_count=10)
+        mommy.make(Product, category=category, view_count=5)
+        mommy.make(Product, category=category, view_count=0)
+
+        with self.subTest("category"):
+            warm_caches([category.pk])
+            self.assertEqual(
+                sorted(CacheWarmup.objects.values_list('object_type', 'object_id')),
+                sorted([('category table', table.pk), ('category gap analysis report', report.pk), ('product', most_viewed.pk)]),
+            )
+            self.assertEqual(report.snapshots.get().status, SNAPSHOT_COMPLETE)
+            table = CategoryTable.objects.get(pk=table.pk)
+            with self.assertNumQueries(4):
+                self.assertEqual(len(table.cached_table['table_data'][None]), 2)
+
+        with self.subTest("all categories"):
+            CacheWarmup.objects.all().delete()
+            warm_caches()
+            self.assertTrue(CacheWarmup.objects.filter(object_id=other_table.pk, object_type='category table').exists())
+            self.assertTrue(all(duration >= 0 for duration in CacheWarmup.objects.values_list('duration', flat=True)))
+
+        with self.subTest("failing objects don't stop the rest"), mock.patch.object(CategoryTable, 'warm_cache', side_effect=ValueError):
+            CacheWarmup.objects.all().delete()
+            with self.assertLogs('cms.dashboard.tasks', level='ERROR'):
+                warm_caches([category.pk])
+            self.assertCountEqual(CacheWarmup.objects.values_list('object_type', flat=True), ['category gap analysis report', 'product'])
+
+        with self.subTest("reports with a snapshot in progress are left to it"):
+            pending: CategoryGapAnalysisSnapshot = report.snapshots.create()
+            report.warm_cache()
+            self.assertEqual(report.snapshots.get(pk=pending.pk).status, SNAPSHOT_PENDING)
+            self.assertEqual(report.snapshots.count(), 2)
+
+    def test_warm_changed_caches(self):
+        changed: Category = mommy.make(Category)
+        unchanged: Category = mommy.make(Category)
+        changed_table: CategoryTable = mommy.make(CategoryTable, category=changed, name="changed")
+        mommy.make(CategoryTable, category=unchanged, name="unchanged")
+        ChangeEvent.objects.record(changed.pk, CHANGE_PRODUCT_CREATED)
+        warm_changed_caches()
+        self.assertEqual(list(CacheWarmup.objects.values_list('object_id', flat=True)), [changed_table.pk])
+        with self.subTest("only changes since the last warm-up"):
+            warm_changed_caches()
+            self.assertEqual(CacheWarmup.objects.count(), 1)
@@ -1,10 +1,12 @@
 from typing import List
 
+import numpy as np
+import pandas as pd
 from django.test import TestCase
 from model_mommy import mommy
 
 from cms.dashboard.models import CategoryGapAnalysisReport
-from cms.dashboard.utils import average_price_gap
+from cms.dashboard.utils import average_price_gap, lttb_indices, downsample, line_chart
 from cms.models import Product, WebsiteProductAttribute, AttributeType
 
 
@@ -19,3 +21,30 @@ class TestModels(TestCase):
         mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product__category=report.category, data={'value': 50})
         products: List[Product] = report.get_products()
         self.assertEqual(average_price_gap(products), 50)
+
+    def test_lttb_indices(self):
+        x: np.ndarray = np.arange(100, dtype=float)
+        y: np.ndarray = np.zeros(100)
+        y[37] = 10
+        y[71] = -5
+        with self.subTest("short series kept"):
+            self.assertEqual(list(lttb_indices(x[:5], y[:5], 10)), list(range(5)))
+        with self.subTest("peaks kept"):
+            indices: np.ndarray = lttb_indices(x, y, 10)
+            self.assertEqual(len(indices), 10)
+            self.assertEqual((indices[0], indices[-1]), (0, 99))
+            self.assertIn(37, indices)
+            self.assertIn(71, indices)
+            self.assertTrue((np.diff(indices) > 0).all())
+
+    def test_line_chart(self):
+        df: pd.DataFrame = pd.DataFrame({
+            'created': pd.date_range('2021-01-01', periods=1000, freq='H', tz='UTC'),
+            'price': np.sin(np.arange(1000) / 50) * 100 + 300,
+        })
+        self.assertEqual(len(downsample(df, 'created', 'price', 200)), 200)
+        self.assertEqual(len(downsample(df, 'created', 'price', 2000)), 1000)
+        chart: dict = line_chart(df, title="prices", x='created', x_label='date', y='price', y_label='price', max_points=200)
+        self.assertIn('<div', chart['div'])
+        self.assertIn('<script', chart['script'])
+        self.assertIsNone(line_chart(pd.DataFrame(), title="prices", x='created', x_label='date', y='price', y_label='price'))
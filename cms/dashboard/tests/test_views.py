@@ -1,12 +1,26 @@
+import datetime
+from io import BytesIO
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from django.template.response import TemplateResponse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from model_mommy import mommy
+from openpyxl import load_workbook
 
+from cms.accounts.models import Company
 from cms.dashboard.forms import CategoryTableForm
-from cms.dashboard.models import CategoryTable
-from cms.models import AttributeType, Category
+from cms.constants import SCORING_NUMERICAL_HIGHER
+from cms.dashboard.constants import SNAPSHOT_COMPLETE, SNAPSHOT_RUNNING, COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD
+from cms.dashboard.models import CategoryTable, CategoryTableAttribute, CategoryGapAnalysisReport, CategoryGapAnalysisSnapshot
+from cms.models import AttributeType, Category, Brand, Product, ProductAttribute, CategoryAttributeConfig, WebsiteProductAttribute, \
+    Website
 
 
 class TestViews(TestCase):
@@ -97,3 +111,260 @@ class TestViews(TestCase):
             self.assertContains(response, 'Successfully deleted &quot;modified table name&quot;')
             table: CategoryTable = CategoryTable.objects.get(pk=table.pk)
             self.assertFalse(table.publish)
+
+    def test_category_table_detail(self):
+        cache.clear()
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        load_size: AttributeType = mommy.make(AttributeType, name="load size")
+        table: CategoryTable = mommy.make(CategoryTable, category=mommy.make(Category), user=self.user)
+        mommy.make(CategoryTableAttribute, table=table, attribute=load_size)
+        for model, price in [("model a", 100), ("model b", 200)]:
+            product: Product = mommy.make(Product, model=model, category=table.category)
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product=product, data={'value': price})
+            mommy.make(ProductAttribute, attribute_type=load_size, product=product, data={'value': f"{price // 10}kg"})
+        url: str = reverse('dashboard:category-table', kwargs={'pk': table.pk})
+
+        def page_queries() -> int:
+            with CaptureQueriesContext(connection) as queries:
+                response: TemplateResponse = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "model a")
+                self.assertContains(response, "20kg")
+            return len(queries)
+
+        cold_queries: int = page_queries()
+        self.assertLess(page_queries(), cold_queries)
+
+    def test_category_table_export(self):
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        load_size: AttributeType = mommy.make(AttributeType, name="load size")
+        table: CategoryTable = mommy.make(CategoryTable, category=mommy.make(Category), user=self.user, name="washers table")
+        mommy.make(CategoryTableAttribute, table=table, attribute=load_size)
+        product: Product = mommy.make(Product, model="model a", category=table.category, brand__name="brand")
+        mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product=product, data={'value': 100})
+        mommy.make(ProductAttribute, attribute_type=load_size, product=product, data={'value': 7})
+
+        with self.subTest("csv"):
+            response: StreamingHttpResponse = self.client.get(reverse('dashboard:category-table-export', kwargs={'pk': table.pk, 'export_format': 'csv'}))
+            self.assertEqual(response['Content-Disposition'], 'attachment; filename="washers-table.csv"')
+            self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [',,Model,Brand,Price,load size', ',,model a,brand,100,7'])
+
+        with self.subTest("xlsx"):
+            response: StreamingHttpResponse = self.client.get(reverse('dashboard:category-table-export', kwargs={'pk': table.pk, 'export_format': 'xlsx'}))
+            worksheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+            self.assertEqual([list(row) for row in worksheet.values], [[None, None, 'Model', 'Brand', 'Price', 'load size'], [None, None, 'model a', 'brand', 100, 7]])
+
+        with self.subTest("another company's table"):
+            other_user: User = mommy.make(User)
+            other_user.profile.company = mommy.make(Company)
+            other_user.save()
+            table.user = other_user
+            table.save()
+            for export_format in ['csv', 'xlsx']:
+                response = self.client.get(reverse('dashboard:category-table-export', kwargs={'pk': table.pk, 'export_format': export_format}))
+                self.assertEqual(response.status_code, 404)
+
+    def test_products_export(self):
+        mommy.make(Product, model="model a", category__name="washers", brand__name="brand")
+        mommy.make(Product, model="model b")
+        response: StreamingHttpResponse = self.client.get(reverse('dashboard:products-export', kwargs={'export_format': 'csv'}), {'q': 'model a'})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), ['Model,Category,Brand,AVG Price,Score', 'model a,washers,brand,,'])
+
+    def test_product_price_history_export(self):
+        product: Product = mommy.make(Product, category=mommy.make(Category))
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        website: Website = mommy.make(Website, name="shop")
+        for price in [100, 110]:
+            mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product=product, website=website, data={'value': price})
+        response: StreamingHttpResponse = self.client.get(reverse('dashboard:product-prices-export', kwargs={'pk': product.pk, 'export_format': 'xlsx'}))
+        worksheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(worksheet.values)
+        self.assertEqual(rows[0], ('Date', 'Website', 'Price'))
+        self.assertEqual([row[1:] for row in rows[1:]], [('shop', 110), ('shop', 100)])
+
+    def test_category_gap_analysis_report(self):
+        brand: Brand = Brand.objects.create(name="whirlpool")
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, name="test report", user=self.user, brand=brand)
+        url: str = reverse('dashboard:category-gap-report', kwargs={'pk': report.pk})
+        progress_url: str = reverse('dashboard:category-gap-report-progress', kwargs={'pk': report.pk})
+
+        with self.subTest("not computed"):
+            response: TemplateResponse = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "hasn't been computed yet")
+            self.assertEqual(self.client.get(progress_url).json(), {'status': None, 'progress': 0, 'computed_at': None})
+
+        with self.subTest("recompute"):
+            self.assertEqual(self.client.get(reverse('dashboard:category-gap-report-recompute', kwargs={'pk': report.pk})).status_code, 405)
+            self.assertFalse(report.snapshots.exists())
+            response: TemplateResponse = self.client.post(reverse('dashboard:category-gap-report-recompute', kwargs={'pk': report.pk}), follow=True)
+            self.assertRedirects(response, url)
+            self.assertContains(response, 'Recomputing &quot;test report&quot;')
+            self.assertContains(response, 'Computing gap analysis')
+            self.assertEqual(report.snapshots.in_progress().count(), 1)
+            self.client.post(reverse('dashboard:category-gap-report-recompute', kwargs={'pk': report.pk}))
+            self.assertEqual(report.snapshots.in_progress().count(), 1)
+
+        with self.subTest("progress"):
+            report.snapshots.update(status=SNAPSHOT_RUNNING, progress=40)
+            self.assertEqual(self.client.get(progress_url).json(), {'status': SNAPSHOT_RUNNING, 'progress': 40, 'computed_at': None})
+
+        with self.subTest("snapshot"):
+            mommy.make(CategoryGapAnalysisSnapshot, report=report, status=SNAPSHOT_COMPLETE, computed_at=timezone.now(), data=[{
+                'cluster_price': 299.99,
+                'cluster_size': '50%',
+                'average_price': 250,
+                'competitive_score': None,
+                'dominant_brand': {'pk': brand.pk + 1, 'name': 'hotpoint', 'number_of_products': 2, 'display_share': '50%', 'target_range_display_share': '25%'},
+                'target_range_spec_gap': [{'spec': 'load size', 'value': 8, 'number_of_products': 2, 'target_range_products': ['WM123']}],
+            }])
+            response: TemplateResponse = self.client.get(url)
+            self.assertContains(response, "hotpoint has 50% display share compared to your range of 25%")
+            self.assertContains(response, "<td>load size</td>", html=True)
+            self.assertContains(response, "<td>WM123</td>", html=True)
+
+    def test_category_gap_analysis_report_brands(self):
+        whirlpool: Brand = Brand.objects.create(name="whirlpool")
+        hotpoint: Brand = Brand.objects.create(name="hotpoint")
+        report: CategoryGapAnalysisReport = mommy.make(CategoryGapAnalysisReport, name="test report", user=self.user, brand=whirlpool)
+        url: str = reverse('dashboard:category-gap-report-brands', kwargs={'pk': report.pk})
+
+        with self.subTest("not computed"):
+            response: TemplateResponse = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "hasn't been computed yet")
+
+        with self.subTest("snapshot"):
+            mommy.make(CategoryGapAnalysisSnapshot, report=report, status=SNAPSHOT_COMPLETE, computed_at=timezone.now(), data=[
+                {'cluster_price': 299.99, 'brand_competitive_scores': {str(whirlpool.pk): COMPETITIVE_SCORE_GOOD, str(hotpoint.pk): COMPETITIVE_SCORE_BAD}},
+                {'cluster_price': 399.99, 'brand_competitive_scores': {str(whirlpool.pk): COMPETITIVE_SCORE_BAD}},
+            ])
+            response: TemplateResponse = self.client.get(url)
+            self.assertEqual(response.context_data['brand_scores'], [
+                (hotpoint, [COMPETITIVE_SCORE_BAD, None]),
+                (whirlpool, [COMPETITIVE_SCORE_GOOD, COMPETITIVE_SCORE_BAD]),
+            ])
+            self.assertContains(response, "399.99")
+            self.assertContains(response, '<i class="fa fa-check text-success"></i>', html=True)
+
+    def test_product_detail_comparable_products(self):
+        category: Category = mommy.make(Category)
+        config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, category=category, attribute_type__name="load size", scoring=SCORING_NUMERICAL_HIGHER)
+        products = [mommy.make(Product, category=category, model=f"model {load_size}") for load_size in [6, 7, 10]]
+        for product, load_size in zip(products, [6, 7, 10]):
+            mommy.make(ProductAttribute, product=product, attribute_type=config.attribute_type, data={'value': load_size})
+        response: TemplateResponse = self.client.get(reverse('dashboard:product', kwargs={'pk': products[0].pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([comparison['product'] for comparison in response.context_data['comparable_products']], products[1:])
+        self.assertContains(response, "Comparable Products")
+        self.assertContains(response, "(+4)")
+
+    def test_product_detail_view_count(self):
+        product: Product = mommy.make(Product, category=mommy.make(Category))
+        for _ in range(2):
+            self.client.get(reverse('dashboard:product', kwargs={'pk': product.pk}))
+        self.assertEqual(Product.objects.get(pk=product.pk).view_count, 2)
+
+    def test_product_detail_price_chart(self):
+        cache.clear()
+        product: Product = mommy.make(Product, category=mommy.make(Category))
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        for days_ago in [1, 20]:
+            price: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, attribute_type=price_attr, product=product, data={'value': 100 + days_ago})
+            WebsiteProductAttribute.objects.filter(pk=price.pk).update(created=timezone.now() - datetime.timedelta(days=days_ago))
+        url: str = reverse('dashboard:product', kwargs={'pk': product.pk})
+
+        with self.subTest("cached"), mock.patch('cms.dashboard.views.products.line_chart', return_value={'script': '', 'div': ''}) as line_chart:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(line_chart.call_count, 1)
+            self.assertEqual(list(line_chart.call_args[0][0]['price']), [101])
+
+        with self.subTest("chart range"), mock.patch('cms.dashboard.views.products.line_chart', return_value={'script': '', 'div': ''}) as line_chart:
+            self.client.get(url, {'chart_days': 30})
+            self.assertEqual(list(line_chart.call_args[0][0]['price']), [120, 101])
+
+        with self.subTest("date range"), mock.patch('cms.dashboard.views.products.line_chart', return_value={'script': '', 'div': ''}) as line_chart:
+            start: datetime.date = timezone.localdate() - datetime.timedelta(days=25)
+            self.client.get(url, {'date_range': f"{start} - {start + datetime.timedelta(days=10)}"})
+            self.assertEqual(list(line_chart.call_args[0][0]['price']), [120])
+
+        with self.subTest("rendered"):
+            response: TemplateResponse = self.client.get(url, {'chart_days': 90})
+            self.assertIn('<script', response.context_data['price_chart']['script'])
+
+    def test_products_facets(self):
+        samsung: Brand = mommy.make(Brand, name="samsung")
+        washer: Product = mommy.make(Product, model="WW80T554DAW", brand=samsung, category=mommy.make(Category, name="washers"))
+        mommy.make(Product, model="WAN28281GB", brand=mommy.make(Brand, name="bosch"), category=washer.category)
+        response: TemplateResponse = self.client.get(reverse('dashboard:products'), {'q': 'ww80'})
+        self.assertEqual(list(response.context_data['object_list']), [washer])
+        brand_label, brand_facets = response.context_data['facets'][0]
+        self.assertEqual([(facet.label, facet.count) for facet, url in brand_facets], [("samsung", 1)])
+        self.assertEqual(brand_facets[0][1], f"{reverse('dashboard:products')}?q=ww80&brands={samsung.pk}")
+        self.assertContains(response, "samsung</a> <span class=\"text-gray-500\">(1)</span>", html=False)
+
+    def test_products_query_count(self):
+        def page_queries() -> int:
+            with CaptureQueriesContext(connection) as queries:
+                response: TemplateResponse = self.client.get(reverse('dashboard:products'))
+                self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        mommy.make(Product, brand=mommy.make(Brand), category=mommy.make(Category))
+        queries: int = page_queries()
+        mommy.make(Product, brand=mommy.make(Brand), category=mommy.make(Category), _quantity=9)
+        self.assertEqual(page_queries(), queries)
+
+    def test_autocomplete(self):
+        cache.clear()
+        washers: Category = mommy.make(Category, name="washers")
+        dryers: Category = mommy.make(Category, name="dryers")
+        samsung: Brand = mommy.make(Brand, name="samsung")
+        washer: Product = mommy.make(Product, model="WW80T554DAW", brand=samsung, category=washers)
+        mommy.make(Product, model="WW90T554DAW", brand=mommy.make(Brand, name="sharp"), category=dryers)
+        mommy.make(AttributeType, name="capacity", category=washers)
+        colour: AttributeType = mommy.make(AttributeType, name="colour", category=None)
+        mommy.make(AttributeType, name="cycles", category=dryers)
+
+        with self.subTest("products"):
+            response = self.client.get(reverse('dashboard:autocomplete-products'), {'term': 'ww', 'category': washers.pk})
+            self.assertEqual(response.json(), {'results': [{'id': washer.pk, 'text': "WW80T554DAW"}], 'pagination': {'more': False}})
+        with self.subTest("attribute types"):
+            response = self.client.get(reverse('dashboard:autocomplete-attribute-types'), {'term': 'C', 'category': washers.pk})
+            self.assertEqual([result['text'] for result in response.json()['results']], ["capacity", "colour"])
+        with self.subTest("brands"):
+            response = self.client.get(reverse('dashboard:autocomplete-brands'), {'term': 's', 'category': washers.pk})
+            self.assertEqual(response.json()['results'], [{'id': samsung.pk, 'text': "samsung"}])
+        with self.subTest("websites"):
+            website: Website = mommy.make(Website, name="harvey norman")
+            mommy.make(Website, name="harvey's")
+            mommy.make('cms.Url', website=website, category=washers)
+            response = self.client.get(reverse('dashboard:autocomplete-websites'), {'term': 'harvey', 'category': washers.pk})
+            self.assertEqual(response.json()['results'], [{'id': website.pk, 'text': "harvey norman"}])
+        with self.subTest("attribute values"):
+            mommy.make(ProductAttribute, attribute_type=colour, data={"value": "white"}, _quantity=2)
+            mommy.make(ProductAttribute, attribute_type=colour, data={"value": "black"})
+            response = self.client.get(reverse('dashboard:autocomplete-attribute-values'), {'term': 'WH', 'attribute_type': colour.pk})
+            self.assertEqual(response.json(), {'suggestions': [{'tag': "white (2)", 'value': "white"}]})
+            response = self.client.get(reverse('dashboard:autocomplete-attribute-values'), {'term': 'wh'})
+            self.assertEqual(response.json(), {'suggestions': []})
+        with self.subTest("pages"), mock.patch('cms.dashboard.views.autocomplete.BaseAutocomplete.page_size', 1):
+            response = self.client.get(reverse('dashboard:autocomplete-attribute-types'), {'page': 2})
+            self.assertEqual(response.json(), {'results': [{'id': colour.pk, 'text': "colour"}], 'pagination': {'more': True}})
+        with self.subTest("cached per term"):
+            with self.assertNumQueries(2):
+                # the session and user, but not the choices
+                self.client.get(reverse('dashboard:autocomplete-products'), {'term': 'ww', 'category': washers.pk})
+        with self.subTest("login required"):
+            self.client.logout()
+            self.assertEqual(self.client.get(reverse('dashboard:autocomplete-products')).status_code, 302)
+
+    def test_category_table_form_renders_selected_choices(self):
+        selected: Product = mommy.make(Product, model="WW80T554DAW")
+        mommy.make(Product, model="WW90T554DAW")
+        table: CategoryTable = mommy.make(CategoryTable, name="test table", products=[selected])
+        response: TemplateResponse = self.client.get(reverse('dashboard:category-table-update', kwargs={'pk': table.pk}))
+        self.assertContains(response, "WW80T554DAW")
+        self.assertNotContains(response, "WW90T554DAW")
+        self.assertContains(response, f'data-autocomplete-url="{reverse("dashboard:autocomplete-products")}"')
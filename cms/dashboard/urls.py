@@ -1,26 +1,41 @@
 from django.conf.urls import url
 
+from cms.dashboard.views.autocomplete import ProductAutocomplete, AttributeTypeAutocomplete, BrandAutocomplete, \
+    WebsiteAutocomplete, AttributeValueAutocomplete
 from cms.dashboard.views.base import DashboardHome, ProcessFeedback
 from cms.dashboard.views.category_gap_analysis import CategoryGapAnalysisReports, CategoryGapAnalysisReportUpdate, \
-    CategoryGapAnalysisReportCreate, CategoryGapAnalysisReportDetail
+    CategoryGapAnalysisReportCreate, CategoryGapAnalysisReportDetail, CategoryGapAnalysisReportRecompute, \
+    CategoryGapAnalysisReportProgress, CategoryGapAnalysisReportBrands
 from cms.dashboard.views.category_tables import CategoryTables, CategoryTableCreate, CategoryTableDetail, \
-    CategoryTableUpdate, CategoryTableAttributeUpdate
-from cms.dashboard.views.products import Products, ProductDetail
+    CategoryTableUpdate, CategoryTableAttributeUpdate, CategoryTableExport
+from cms.dashboard.views.products import Products, ProductDetail, ProductsExport, ProductPriceHistoryExport
 
 app_name = 'dashboard'
 
 urlpatterns = [
     url(r'^$', DashboardHome.as_view(), name='home'),
+    # anchored, as the unanchored patterns below would match the end of these paths
+    url(r'^autocomplete/products/$', ProductAutocomplete.as_view(), name='autocomplete-products'),
+    url(r'^autocomplete/attribute-types/$', AttributeTypeAutocomplete.as_view(), name='autocomplete-attribute-types'),
+    url(r'^autocomplete/brands/$', BrandAutocomplete.as_view(), name='autocomplete-brands'),
+    url(r'^autocomplete/websites/$', WebsiteAutocomplete.as_view(), name='autocomplete-websites'),
+    url(r'^autocomplete/attribute-values/$', AttributeValueAutocomplete.as_view(), name='autocomplete-attribute-values'),
     url(r'category-tables/$', CategoryTables.as_view(), name='category-tables'),
     url(r'category-tables/add/$', CategoryTableCreate.as_view(), name='category-table-create'),
     url(r'category-tables/(?P<pk>\d+)/$', CategoryTableDetail.as_view(), name='category-table'),
     url(r'category-tables/(?P<pk>\d+)/update$', CategoryTableUpdate.as_view(), name='category-table-update'),
     url(r'category-tables/(?P<pk>\d+)/specs$', CategoryTableAttributeUpdate.as_view(), name='category-table-specs'),
+    url(r'category-tables/(?P<pk>\d+)/export\.(?P<export_format>csv|xlsx)$', CategoryTableExport.as_view(), name='category-table-export'),
     url(r'products/$', Products.as_view(), name='products'),
+    url(r'products/export\.(?P<export_format>csv|xlsx)$', ProductsExport.as_view(), name='products-export'),
     url(r'products/(?P<pk>\d+)/$', ProductDetail.as_view(), name='product'),
+    url(r'products/(?P<pk>\d+)/prices\.(?P<export_format>csv|xlsx)$', ProductPriceHistoryExport.as_view(), name='product-prices-export'),
     url(r'feedback/$', ProcessFeedback.as_view(), name='feedback'),
     url(r'category-gap-reports/$', CategoryGapAnalysisReports.as_view(), name='category-gap-reports'),
     url(r'category-gap-reports/add/$', CategoryGapAnalysisReportCreate.as_view(), name='category-gap-report-create'),
     url(r'category-gap-reports/(?P<pk>\d+)$', CategoryGapAnalysisReportDetail.as_view(), name='category-gap-report'),
     url(r'category-gap-reports/(?P<pk>\d+)/update$', CategoryGapAnalysisReportUpdate.as_view(), name='category-gap-report-update'),
+    url(r'category-gap-reports/(?P<pk>\d+)/brands$', CategoryGapAnalysisReportBrands.as_view(), name='category-gap-report-brands'),
+    url(r'category-gap-reports/(?P<pk>\d+)/recompute$', CategoryGapAnalysisReportRecompute.as_view(), name='category-gap-report-recompute'),
+    url(r'category-gap-reports/(?P<pk>\d+)/progress$', CategoryGapAnalysisReportProgress.as_view(), name='category-gap-report-progress'),
 ]
@@ -3,15 +3,57 @@ from typing import List, Optional, Dict, TYPE_CHECKING
 if TYPE_CHECKING:
     from cms.models import Product
 
+import numpy as np
 from bokeh.embed import components
 from bokeh.plotting import figure, ColumnDataSource
+from django.utils import timezone
 from pandas import DataFrame
+from pandas.api.types import is_datetime64_any_dtype, is_datetime64tz_dtype
 
+from cms.dashboard.constants import CHART_MAX_POINTS
 
-def line_chart(df: DataFrame, title: str, x: str, x_label: str, y: str, y_label: str) -> Optional[Dict]:
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Picks the indices of threshold points that preserve the visual shape of a series, using largest triangle three buckets.
+    The first and last points are always kept, and one point is kept from each bucket in between:
+    the one forming the largest triangle with the previously kept point and the average of the next bucket.
+    """
+    length: int = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    edges: np.ndarray = np.linspace(1, length - 1, threshold - 1).astype(int)
+    indices: List[int] = [0]
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[end:edges[bucket + 2]].mean(), y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        previous: int = indices[-1]
+        areas: np.ndarray = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        indices.append(start + int(areas.argmax()))
+    indices.append(length - 1)
+    return np.array(indices)
+
+
+def downsample(df: DataFrame, x: str, y: str, max_points: int = CHART_MAX_POINTS) -> DataFrame:
+    """Reduces a series sorted by x to at most max_points rows, so long ranges don't send every point to the browser."""
+    if len(df) <= max_points:
+        return df
+    x_values: np.ndarray = df[x].astype('int64').to_numpy(dtype=float) if is_datetime64_any_dtype(df[x]) else df[x].to_numpy(dtype=float)
+    return df.iloc[lttb_indices(x_values, df[y].to_numpy(dtype=float), max_points)]
+
+
+def line_chart(df: DataFrame, title: str, x: str, x_label: str, y: str, y_label: str, max_points: int = CHART_MAX_POINTS) -> Optional[Dict]:
     if df.empty:
         return None
-    plot = figure(title=title, x_axis_label=x_label, y_axis_label=y_label, sizing_mode="stretch_both")
+    df = downsample(df, x, y, max_points)
+    if is_datetime64tz_dtype(df[x]):
+        # bokeh plots datetimes as given, so show them in local time
+        df = df.assign(**{x: df[x].dt.tz_convert(timezone.get_current_timezone_name()).dt.tz_localize(None)})
+    plot = figure(title=title, x_axis_label=x_label, y_axis_label=y_label, sizing_mode="stretch_both",
+                  x_axis_type='datetime' if is_datetime64_any_dtype(df[x]) else 'linear')
     plot.line(x=x, y=y, line_width=2, source=ColumnDataSource(df))
     script, div = components(plot)
     return {'script': script, 'div': div}
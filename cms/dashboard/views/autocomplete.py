@@ -0,0 +1,148 @@
+from typing import Optional, List, Dict, Any
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import QuerySet, Q
+from django.http import JsonResponse
+from django.views import View
+
+from cms.cache import namespaced_cache_key, get_or_compute
+from cms.constants import ATTRIBUTE_VALUE_SUGGESTIONS
+from cms.dashboard.constants import AUTOCOMPLETE_PAGE_SIZE
+from cms.models import Product, AttributeType, Brand, Website, ProductQuerySet, AttributeValue
+from cms.search import search_query
+
+
+class BaseAutocomplete(LoginRequiredMixin, View):
+    """
+    Choices for select2 widgets loading them with ajax, as json in select2's format, a page at a time.
+    Choices match the term query parameter by prefix, and are scoped to the category query parameter where given.
+    Pages are cached per category, term and page, so repeated keystrokes don't query the database again.
+    """
+    namespace: str = None
+    queryset: QuerySet = None
+    page_size = AUTOCOMPLETE_PAGE_SIZE
+
+    @property
+    def term(self) -> str:
+        return self.request.GET.get('term', '').strip().lower()
+
+    @property
+    def page(self) -> int:
+        page: str = self.request.GET.get('page', '')
+        return int(page) if page.isdigit() and int(page) > 0 else 1
+
+    @property
+    def category_id(self) -> Optional[int]:
+        category_id: str = self.request.GET.get('category', '')
+        return int(category_id) if category_id.isdigit() else None
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.all()
+
+    def label(self, obj) -> str:
+        return str(obj)
+
+    def get_results(self) -> Dict[str, Any]:
+        start: int = (self.page - 1) * self.page_size
+        # one more than a page is fetched to tell whether there's another page
+        objects: List = list(self.get_queryset()[start:start + self.page_size + 1])
+        return {
+            'results': [{'id': obj.pk, 'text': self.label(obj)} for obj in objects[:self.page_size]],
+            'pagination': {'more': len(objects) > self.page_size},
+        }
+
+    def get_cache_data(self) -> Dict[str, Any]:
+        return {'term': self.term, 'page': self.page}
+
+    def get(self, request, *args, **kwargs):
+        key: str = namespaced_cache_key(f"autocomplete-{self.namespace}", self.get_cache_data(), category_id=self.category_id)
+        return JsonResponse(get_or_compute(key, self.get_results))
+
+
+class ProductAutocomplete(BaseAutocomplete):
+    """Matches products by words of their models, brand and category, using the indexed search vector."""
+    namespace = 'products'
+    queryset = Product.objects.published().order_by('model')
+
+    def get_queryset(self) -> ProductQuerySet:
+        queryset: ProductQuerySet = super().get_queryset()
+        if self.category_id:
+            queryset = queryset.filter(category_id=self.category_id)
+        if self.term:
+            queryset = queryset.filter(search_vector=search_query(self.term))
+        return queryset.only('pk', 'model')
+
+    def label(self, obj: Product) -> str:
+        return obj.model
+
+
+class AttributeTypeAutocomplete(BaseAutocomplete):
+    """Matches attribute types of the category, or of no category, by name."""
+    namespace = 'attribute-types'
+    queryset = AttributeType.objects.published().order_by('name')
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        if self.category_id:
+            queryset = queryset.filter(Q(category_id=self.category_id) | Q(category__isnull=True))
+        if self.term:
+            queryset = queryset.filter(name__istartswith=self.term)
+        return queryset
+
+
+class BrandAutocomplete(BaseAutocomplete):
+    """Matches brands with products in the category by name."""
+    namespace = 'brands'
+    queryset = Brand.objects.published().order_by('name')
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        if self.category_id:
+            queryset = queryset.filter(pk__in=Product.objects.published().filter(category_id=self.category_id).values('brand'))
+        if self.term:
+            queryset = queryset.filter(name__istartswith=self.term)
+        return queryset
+
+
+class WebsiteAutocomplete(BaseAutocomplete):
+    """Matches websites scraped for the category by name."""
+    namespace = 'websites'
+    queryset = Website.objects.published().order_by('name')
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        if self.category_id:
+            queryset = queryset.filter(pk__in=Website.objects.filter(urls__category_id=self.category_id).values('pk'))
+        if self.term:
+            queryset = queryset.filter(name__istartswith=self.term)
+        return queryset
+
+
+class AttributeValueAutocomplete(BaseAutocomplete):
+    """
+    Suggests values of the attribute_type query parameter starting with the term, with the number of products with each,
+    in the format of the tag inputs axis values are entered with.
+    """
+    namespace = 'attribute-values'
+    queryset = AttributeValue.objects.all()
+    page_size = ATTRIBUTE_VALUE_SUGGESTIONS
+
+    @property
+    def attribute_type_id(self) -> Optional[int]:
+        attribute_type_id: str = self.request.GET.get('attribute_type', '')
+        return int(attribute_type_id) if attribute_type_id.isdigit() else None
+
+    def get_cache_data(self) -> Dict[str, Any]:
+        return dict(super().get_cache_data(), attribute_type=self.attribute_type_id)
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        return queryset.suggest(self.attribute_type_id, self.term) if self.attribute_type_id else queryset.none()
+
+    def get_results(self) -> Dict[str, Any]:
+        return {
+            'suggestions': [
+                {'tag': f"{attribute_value.value} ({attribute_value.product_count})", 'value': attribute_value.value}
+                for attribute_value in self.get_queryset()[:self.page_size]
+            ],
+        }
@@ -1,17 +1,20 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.db import transaction
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils.translation import gettext as _
+from django.views import View
 from django.views.generic import CreateView, ListView, UpdateView, DetailView
 
 from cms.dashboard.forms import CategoryGapAnalysisForm, CategoryGapAnalysisFilterForm
-from cms.dashboard.models import CategoryGapAnalysisQuerySet, CategoryGapAnalysisReport
-from cms.dashboard.toolbar import LinkButton, DropdownMenu, DropdownItem
+from cms.dashboard.models import CategoryGapAnalysisQuerySet, CategoryGapAnalysisReport, CategoryGapAnalysisSnapshot
+from cms.dashboard.tasks import queue_gap_analysis_snapshot
+from cms.models import Brand
+from cms.dashboard.toolbar import LinkButton, DropdownMenu, DropdownItem, DataItem
 from cms.dashboard.views.base import BaseDashboardMixin, Breadcrumb
 
 
@@ -74,9 +77,12 @@ class CategoryGapAnalysisReportCreate(CategoryGapAnalysisReportMixin, SuccessMes
             Breadcrumb(name="Create", url=reverse('dashboard:category-gap-report-create'), active=True),
         ]
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.user = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        queue_gap_analysis_snapshot(self.report)
+        return response
 
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
@@ -98,6 +104,12 @@ class CategoryGapAnalysisReportUpdate(CategoryGapAnalysisReportMixin, SuccessMes
         data.update(header=f"Edit {self.report.name}")
         return data
 
+    def form_valid(self, form):
+        self.report.clear_cache()
+        response = super().form_valid(form)
+        queue_gap_analysis_snapshot(self.object)
+        return response
+
     @property
     def deleting(self):
         return self.request.POST.get('delete')
@@ -134,6 +146,8 @@ class CategoryGapAnalysisReportDetail(CategoryGapAnalysisReportMixin, DetailView
         return super().get_context_data(
             report=self.report,
             reports=self.get_queryset(),
+            snapshot=self.report.latest_snapshot,
+            snapshot_in_progress=self.report.snapshots.in_progress().first(),
             action_button=DropdownMenu(
                 dropdown_icon='fas fa-cog fa-sm fa-fw text-gray-400',
                 dropdown_id='tableEditDropdown',
@@ -150,6 +164,17 @@ class CategoryGapAnalysisReportDetail(CategoryGapAnalysisReportMixin, DetailView
                         icon='fas fa-plus fa-sm fa-fw text-gray-400',
                         label=_('Create'),
                     ),
+                    DropdownItem(
+                        url=reverse('dashboard:category-gap-report-brands', kwargs={'pk': self.report.pk}),
+                        icon='fas fa-th fa-sm fa-fw text-gray-400',
+                        label=_('Compare Brands'),
+                    ),
+                    DropdownItem(
+                        url='#',
+                        icon='fas fa-sync fa-sm fa-fw text-gray-400',
+                        label=_('Recompute'),
+                        data=[DataItem('submit', 'recompute-form')],
+                    ),
                 ]
             ),
             **kwargs
@@ -160,3 +185,71 @@ class CategoryGapAnalysisReportDetail(CategoryGapAnalysisReportMixin, DetailView
             Breadcrumb(name="Category Gap Analysis", url=reverse('dashboard:category-gap-reports'), active=False),
             Breadcrumb(name=self.report.name, url=reverse('dashboard:category-gap-report', kwargs={'pk': self.report.pk}), active=True),
         ]
+
+
+class CategoryGapAnalysisReportBrands(CategoryGapAnalysisReportMixin, DetailView):
+    """Brand x price cluster matrix of competitive scores, from the report's latest snapshot."""
+    template_name = 'views/category_gap_analysis_report_brands.html'
+
+    @property
+    def report(self) -> CategoryGapAnalysisReport:
+        return get_object_or_404(self.queryset, pk=self.request.resolver_match.kwargs.get('pk'))
+
+    def get_brand_scores(self, snapshot: Optional[CategoryGapAnalysisSnapshot]) -> List[tuple]:
+        """Returns a row of competitive scores, one per price cluster, for each brand in the snapshot."""
+        if not snapshot:
+            return []
+        brand_ids: set = {int(brand_id) for cluster in snapshot.data for brand_id in cluster.get('brand_competitive_scores', {})}
+        brands: Dict[int, Brand] = Brand.objects.in_bulk(brand_ids)
+        return [
+            (brand, [cluster.get('brand_competitive_scores', {}).get(str(brand.pk)) for cluster in snapshot.data])
+            for brand in sorted(brands.values(), key=lambda brand: brand.name)
+        ]
+
+    def get_context_data(self, **kwargs):
+        snapshot: Optional[CategoryGapAnalysisSnapshot] = self.report.latest_snapshot
+        return super().get_context_data(
+            report=self.report,
+            snapshot=snapshot,
+            brand_scores=self.get_brand_scores(snapshot),
+            **kwargs
+        )
+
+    def get_breadcrumbs(self) -> Optional[List[Breadcrumb]]:
+        return [
+            Breadcrumb(name="Category Gap Analysis", url=reverse('dashboard:category-gap-reports'), active=False),
+            Breadcrumb(name=self.report.name, url=reverse('dashboard:category-gap-report', kwargs={'pk': self.report.pk}), active=False),
+            Breadcrumb(name="Compare Brands", url=reverse('dashboard:category-gap-report-brands', kwargs={'pk': self.report.pk}), active=True),
+        ]
+
+
+class CategoryGapAnalysisReportRecompute(CategoryGapAnalysisReportMixin, View):
+    """Queues a fresh snapshot of the report's gap analysis. Only accepts posts, as it changes state."""
+
+    @property
+    def report(self) -> CategoryGapAnalysisReport:
+        return get_object_or_404(self.get_queryset(), pk=self.request.resolver_match.kwargs.get('pk'))
+
+    def post(self, request, *args, **kwargs):
+        report: CategoryGapAnalysisReport = self.report
+        queue_gap_analysis_snapshot(report)
+        messages.success(request, _('Recomputing "{report}"').format(report=report))
+        return HttpResponseRedirect(reverse('dashboard:category-gap-report', kwargs={'pk': report.pk}))
+
+
+class CategoryGapAnalysisReportProgress(CategoryGapAnalysisReportMixin, View):
+    """Reports the status and progress of the report's most recent snapshot as json."""
+
+    @property
+    def report(self) -> CategoryGapAnalysisReport:
+        return get_object_or_404(self.get_queryset(), pk=self.request.resolver_match.kwargs.get('pk'))
+
+    def get(self, request, *args, **kwargs):
+        snapshot: Optional[CategoryGapAnalysisSnapshot] = self.report.snapshots.order_by('-created').first()
+        if not snapshot:
+            return JsonResponse({'status': None, 'progress': 0, 'computed_at': None})
+        return JsonResponse({
+            'status': snapshot.status,
+            'progress': snapshot.progress,
+            'computed_at': snapshot.computed_at,
+        })
@@ -6,9 +6,13 @@ from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.text import slugify
 from django.utils.translation import gettext as _
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 
+from cms.dashboard.constants import EXPORT_FORMATS
+from cms.dashboard.exports import export_response
 from cms.dashboard.forms import CategoryTableFilterForm, CategoryTableForm, get_category_table_attribute_formset
 from cms.dashboard.models import CategoryTableQuerySet, CategoryTable, CategoryTableAttribute
 from cms.models import Product
@@ -90,7 +94,7 @@ class CategoryTableUpdate(CategoryTableMixin, SuccessMessageMixin, UpdateView):
     form_class = CategoryTableForm
     success_message = _('Successfully updated "%(name)s"')
 
-    @property
+    @cached_property
     def table(self) -> CategoryTable:
         return get_object_or_404(self.queryset, pk=self.request.resolver_match.kwargs.get('pk'))
 
@@ -130,17 +134,19 @@ class CategoryTableDetail(BaseDashboardMixin, DetailView):
     def get_queryset(self) -> CategoryTableQuerySet:
         return self.queryset.for_user(self.request.user)
 
-    @property
+    @cached_property
     def table(self) -> CategoryTable:
         return get_object_or_404(self.queryset, pk=self.request.resolver_match.kwargs.get('pk'))
 
     def get_context_data(self, **kwargs):
+        table: CategoryTable = self.table
         return super().get_context_data(
             **kwargs,
-            table=self.table,
+            table=table,
             tables=self.get_queryset(),
-            table_data=self.table.build_table,
-            x_axis_values=self.table.x_axis_values,
+            table_data=table.cached_table['table_data'],
+            spec_matrix=table.cached_table['spec_matrix'],
+            x_axis_values=table.x_axis_values,
             action_button=DropdownMenu(
                 dropdown_icon='fas fa-cog fa-sm fa-fw text-gray-400',
                 dropdown_id='tableEditDropdown',
@@ -169,6 +175,13 @@ class CategoryTableDetail(BaseDashboardMixin, DetailView):
                         icon='fas fa-plus fa-sm fa-fw text-gray-400',
                         label=_('Create'),
                     ),
+                ] + [
+                    DropdownItem(
+                        url=reverse('dashboard:category-table-export', kwargs={'pk': self.table.pk, 'export_format': export_format}),
+                        icon='fas fa-download fa-sm fa-fw text-gray-400',
+                        label=_('Export {format}').format(format=label),
+                    )
+                    for export_format, label in EXPORT_FORMATS
                 ]
             )
         )
@@ -180,12 +193,19 @@ class CategoryTableDetail(BaseDashboardMixin, DetailView):
         ]
 
 
+class CategoryTableExport(CategoryTableDetail):
+
+    def get(self, request, *args, **kwargs):
+        table: CategoryTable = self.get_object()
+        return export_response(kwargs['export_format'], slugify(table.name), table.export_header, table.export_rows())
+
+
 class CategoryTableAttributeUpdate(CategoryTableMixin, SuccessMessageMixin, UpdateView):
     template_name = 'views/category_table_specs_modify.html'
     success_message = _('Category table specs updated successfully')
     object = None
 
-    @property
+    @cached_property
     def table(self) -> CategoryTable:
         return get_object_or_404(self.queryset, pk=self.request.resolver_match.kwargs.get('pk'))
 
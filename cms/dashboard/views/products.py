@@ -1,15 +1,25 @@
 import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.text import slugify
 from django.views.generic import ListView
+from django.http import QueryDict
 from django.utils.translation import gettext as _
 
+from cms.cache import namespaced_cache_key, get_or_compute
 from cms.dashboard.toolbar import LinkButton
+from cms.constants import FACETS, FACET_PRICE, FACET_BRAND, FACET_PRICE_BUCKET_SIZE, Facet
+from cms.dashboard.constants import COMPARABLE_PRODUCTS_LIMIT, EXPORT_CHUNK_SIZE, FACET_LIMIT
+from cms.dashboard.exports import export_response, export_menu
 from cms.models import Product, ProductQuerySet, WebsiteProductAttributeQuerySet, WebsiteProductAttribute
 from cms.dashboard.forms import ProductsFilterForm, ProductPriceFilterForm
 from cms.dashboard.views.base import Breadcrumb, BaseDashboardMixin
+from cms.dashboard.reports import ProductSpecIndex
 from cms.dashboard.utils import line_chart
 
 
@@ -27,18 +37,54 @@ class Products(BaseDashboardMixin, ListView):
         return ProductsFilterForm(self.request.GET or None)
 
     def get_queryset(self) -> ProductQuerySet:
-        queryset: ProductQuerySet = super().get_queryset()
+        queryset: ProductQuerySet = super().get_queryset().for_listing().with_scores(self.request.user.profile.company)
         form: ProductsFilterForm = self.get_form()
         if self.request.GET and form.is_valid():
             queryset: ProductQuerySet = form.search(queryset)
         return queryset
 
+    def get_facet_url(self, facet: Facet) -> str:
+        """The products page filtered by a facet value, on top of the current filters."""
+        params: QueryDict = self.request.GET.copy()
+        params.pop('page', None)
+        if facet.name == FACET_PRICE:
+            params['price_low'] = facet.value
+            params['price_high'] = facet.value + FACET_PRICE_BUCKET_SIZE
+        else:
+            params[{FACET_BRAND: 'brands'}.get(facet.name, facet.name)] = facet.value
+        return f"{reverse('dashboard:products')}?{params.urlencode()}"
+
+    def get_facets(self) -> List[Tuple[str, List[Tuple[Facet, str]]]]:
+        """The most common values of each facet of the filtered products, with their counts and links to filter by them."""
+        facets: Dict[str, List[Facet]] = self.object_list.facet_counts()
+        return [
+            (label, [(facet, self.get_facet_url(facet)) for facet in facets[name][:FACET_LIMIT]])
+            for name, label in FACETS
+        ]
+
     def get_context_data(self, **kwargs):
         data: dict = super().get_context_data(**kwargs)
-        data.update(filter_form=self.get_form(), header=_('Products'))
+        data.update(
+            filter_form=self.get_form(),
+            facets=self.get_facets(),
+            header=_('Products'),
+            action_item=export_menu('dashboard:products-export', 'productsExportDropdown', self.request.GET.urlencode()),
+        )
         return data
 
 
+class ProductsExport(Products):
+
+    def get(self, request, *args, **kwargs):
+        products = self.get_queryset().values_list('model', 'category__name', 'brand__name', 'current_average_price_int', 'score')
+        return export_response(
+            kwargs['export_format'],
+            'products',
+            [_('Model'), _('Category'), _('Brand'), _('AVG Price'), _('Score')],
+            products.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        )
+
+
 class ProductDetail(BaseDashboardMixin, ListView):
     paginate_by = 25
     template_name = 'views/product.html'
@@ -51,10 +97,14 @@ class ProductDetail(BaseDashboardMixin, ListView):
             qs = form.search(qs)
         return qs
 
+    def get(self, request, *args, **kwargs):
+        Product.objects.filter(pk=self.product.pk).update(view_count=F('view_count') + 1)
+        return super().get(request, *args, **kwargs)
+
     def get_form(self):
         return ProductPriceFilterForm(self.request.GET or None)
 
-    @property
+    @cached_property
     def product(self) -> Product:
         return get_object_or_404(Product.objects.published(), pk=self.request.resolver_match.kwargs.get('pk'))
 
@@ -64,19 +114,43 @@ class ProductDetail(BaseDashboardMixin, ListView):
             Breadcrumb(name=self.product.model, url=reverse('dashboard:product', kwargs={'pk': self.product.pk}), active=True),
         ]
 
-    def get_price_chart(self) -> Dict:
-        return line_chart(
-            self.product.price_history(datetime.datetime.now() - datetime.timedelta(days=7)),
-            title="7 Day price history",
-            x_label='day',
-            x='created',
-            y_label='price',
-            y='price',
-        )
+    def get_price_chart(self) -> Optional[Dict]:
+        """
+        The bokeh components of the price chart for the selected period.
+        They're cached per product, period and data version, so they're only rebuilt after a crawl brings new prices.
+        """
+        start, end = self.get_form().chart_period()
+
+        def compute() -> Optional[Dict]:
+            return line_chart(
+                self.product.price_series(
+                    timezone.make_aware(datetime.datetime.combine(start, datetime.time.min)),
+                    timezone.make_aware(datetime.datetime.combine(end, datetime.time.max)),
+                ),
+                title=_("Price history"),
+                x_label=_('date'),
+                x='created',
+                y_label=_('price'),
+                y='price',
+            )
+
+        cache_key: str = namespaced_cache_key('price-chart', {'product': self.product.pk, 'start': start, 'end': end}, category_id=self.product.category_id)
+        return get_or_compute(cache_key, compute)
+
+    def get_comparable_products(self) -> List[Dict]:
+        if not self.product.category:
+            return []
+        return ProductSpecIndex.for_category(self.product.category).nearest(self.product, k=COMPARABLE_PRODUCTS_LIMIT)
 
     def get_context_data(self, **kwargs):
         data: dict = super().get_context_data(**kwargs)
-        data.update(product=self.product, filter_form=self.get_form(), price_chart=self.get_price_chart())
+        data.update(
+            product=self.product,
+            filter_form=self.get_form(),
+            price_chart=self.get_price_chart(),
+            comparable_products=self.get_comparable_products(),
+            price_export_button=export_menu('dashboard:product-prices-export', 'pricesExportDropdown', self.request.GET.urlencode(), pk=self.product.pk),
+        )
         if self.request.user.is_superuser:
             data.update(
                 edit_spec_button=LinkButton(
@@ -85,3 +159,16 @@ class ProductDetail(BaseDashboardMixin, ListView):
                 )
             )
         return data
+
+
+class ProductPriceHistoryExport(ProductDetail):
+
+    def get(self, request, *args, **kwargs):
+        prices = self.get_queryset().values_list('created', 'website__name', 'data__value').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return export_response(
+            kwargs['export_format'],
+            f"{slugify(self.product.model)}-prices",
+            [_('Date'), _('Website'), _('Price')],
+            # excel doesn't support timezones
+            ((timezone.localtime(created).replace(tzinfo=None), website, price) for created, website, price in prices),
+        )
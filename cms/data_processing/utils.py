@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Optional
 
 from django.db.models import Q
 
@@ -7,8 +7,9 @@ from cms.data_processing.units import UnitManager
 from cms.models import AttributeType, ProductAttribute
 
 
-def create_product_attribute(product, attribute_label: str, attribute_value: Union[str, int, float]) -> None:
-    attribute_type: AttributeType = AttributeType.objects.custom_get_or_create(attribute_label, category=product.category)
+def create_product_attribute(product, attribute_label: str, attribute_value: Union[str, int, float], attribute_type: Optional[AttributeType] = None) -> None:
+    """Creates a product attribute from a scraped label and value. The label's attribute type can be given if it's already been resolved."""
+    attribute_type = attribute_type or AttributeType.objects.custom_get_or_create(attribute_label, category=product.category)
     product_attribute_exists: bool = ProductAttribute.objects.filter(attribute_type=attribute_type, product=product).exists()
     if product_attribute_exists:
         return
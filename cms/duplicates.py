@@ -0,0 +1,237 @@
+import re
+from typing import List, Dict, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+
+from cms.cache import bump_data_version
+from cms.constants import CHANGE_PRODUCTS_MERGED, MAIN, THUMBNAIL, DUPLICATE_SCORE_THRESHOLD, DUPLICATE_SPEC_WEIGHT, \
+    DUPLICATE_MERGE_BATCH_SIZE, DUPLICATE_PENDING, DUPLICATE_MERGED, DUPLICATE_REJECTED, DUPLICATE_APPROVED
+from cms.models import Product, Category, ChangeEvent, DuplicateCandidate, ProductAttribute, ProductImage, \
+    WebsiteProductAttribute
+
+
+def normalise_model(model: str) -> str:
+    """Reduces a model number to lowercase letters and digits, so differences in punctuation and spacing are ignored."""
+    return re.sub(r'[^0-9a-z]', '', model.lower())
+
+
+def bigram_matrix(strings: List[str]) -> np.ndarray:
+    """A binary matrix of the character bigrams in each string, with a row per string and a column per bigram."""
+    bigrams: List[Set[str]] = [{string[index:index + 2] for index in range(len(string) - 1)} or {string} for string in strings]
+    vocabulary: Dict[str, int] = {bigram: index for index, bigram in enumerate(set().union(*bigrams))}
+    matrix: np.ndarray = np.zeros((len(strings), len(vocabulary)), dtype=np.float32)
+    for row, string_bigrams in enumerate(bigrams):
+        matrix[row, [vocabulary[bigram] for bigram in string_bigrams]] = 1
+    return matrix
+
+
+def model_similarity(models: List[str]) -> np.ndarray:
+    """
+    Pairwise dice similarity of the bigrams of normalised models, from 0 to 1.
+    A prefix or suffix added by a retailer only lowers the similarity in proportion to its length.
+    """
+    matrix: np.ndarray = bigram_matrix([normalise_model(model) for model in models])
+    counts: np.ndarray = matrix.sum(axis=1)
+    return 2 * (matrix @ matrix.T) / np.maximum(counts[:, None] + counts[None, :], 1)
+
+
+def spec_agreement(spec_values: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairwise counts of the specs products agree on, and of the specs both products have,
+    from a product x attribute type matrix of values such as ProductQuerySet.spec_values returns.
+    """
+    size: int = len(spec_values)
+    agreed: np.ndarray = np.zeros((size, size))
+    compared: np.ndarray = np.zeros((size, size))
+    for column in spec_values.columns:
+        values: pd.Series = spec_values[column]
+        # values are compared as strings, as some are lists or ranges which can't be hashed
+        codes, uniques = pd.factorize(values.astype(str).where(values.notna()))
+        both: np.ndarray = (codes[:, None] >= 0) & (codes[None, :] >= 0)
+        compared += both
+        agreed += both & (codes[:, None] == codes[None, :])
+    return agreed, compared
+
+
+def score_products(models: List[str], spec_values: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pairwise duplicate scores of products, along with their model similarity and spec agreement.
+    Pairs without specs in common are scored by model similarity alone, and their spec agreement is nan.
+    """
+    similarity: np.ndarray = model_similarity(models)
+    agreed, compared = spec_agreement(spec_values)
+    agreement: np.ndarray = np.divide(agreed, compared, out=np.full_like(similarity, np.nan, dtype=float), where=compared > 0)
+    score: np.ndarray = np.where(compared > 0, (1 - DUPLICATE_SPEC_WEIGHT) * similarity + DUPLICATE_SPEC_WEIGHT * np.nan_to_num(agreement), similarity)
+    return score, similarity, agreement
+
+
+def find_duplicate_candidates(category: Category) -> int:
+    """
+    Scores every pair of products with the same brand in the category, and queues pairs likely to be duplicates for review.
+    Pending candidates are replaced, while pairs already approved, rejected or merged are left as they are.
+    Returns the number of candidates queued.
+    """
+    products: pd.DataFrame = pd.DataFrame(
+        list(Product.objects.published().filter(category=category).order_by('pk').values_list('pk', 'model', 'brand_id')),
+        columns=['pk', 'model', 'brand'],
+    )
+    spec_values: pd.DataFrame = Product.objects.filter(category=category).spec_values(list(category.attribute_types.values_list('pk', flat=True)))
+    decided: Set[Tuple[int, int]] = set(DuplicateCandidate.objects.filter(category=category).exclude(status=DUPLICATE_PENDING).values_list('product', 'duplicate'))
+    candidates: List[DuplicateCandidate] = []
+    for brand, block in products.groupby(products['brand'].fillna(0)):
+        if len(block) < 2:
+            continue
+        pks: List[int] = list(block['pk'])
+        models: List[str] = list(block['model'])
+        score, similarity, agreement = score_products(models, spec_values.reindex(pks))
+        for first, second in zip(*np.nonzero(np.triu(score >= DUPLICATE_SCORE_THRESHOLD, k=1))):
+            # products are in order of pk, so the older product is kept
+            if (pks[first], pks[second]) in decided:
+                continue
+            candidates.append(DuplicateCandidate(
+                product_id=pks[first],
+                duplicate_id=pks[second],
+                product_model=models[first],
+                duplicate_model=models[second],
+                category=category,
+                score=float(score[first, second]),
+                model_similarity=float(similarity[first, second]),
+                spec_agreement=None if np.isnan(agreement[first, second]) else float(agreement[first, second]),
+            ))
+    with transaction.atomic():
+        DuplicateCandidate.objects.filter(category=category).pending().delete()
+        DuplicateCandidate.objects.bulk_create(candidates)
+    return len(candidates)
+
+
+@transaction.atomic
+def merge_products(duplicates: Dict[int, int]) -> List[Product]:
+    """
+    Merges products into others, given as a map of duplicate pks to the pks of the products they're merged into.
+    Relations are moved with a handful of set based updates however many products are merged:
+    attributes and main images the product is missing, and all website attributes.
+    Chains of merges are followed, so a product merged into one that is itself a duplicate ends up in the last product.
+    Returns the products merged into.
+    """
+    targets: Dict[int, int] = {}
+    for duplicate_id in duplicates:
+        target_id: int = duplicates[duplicate_id]
+        seen: Set[int] = {duplicate_id}
+        while target_id in duplicates and target_id not in seen:
+            seen.add(target_id)
+            target_id = duplicates[target_id]
+        if target_id != duplicate_id:
+            targets[duplicate_id] = target_id
+    if not targets:
+        return []
+    mapping_sql: str = ', '.join(['(%s, %s)'] * len(targets))
+    mapping_params: List[int] = [pk for pair in targets.items() for pk in pair]
+    with connection.cursor() as cursor:
+        # where several duplicates have an attribute of the same type, the one with the lowest pk is kept
+        cursor.execute(f"""
+            WITH mapping (duplicate_id, product_id) AS (VALUES {mapping_sql})
+            UPDATE {ProductAttribute._meta.db_table} attribute SET product_id = mapping.product_id
+            FROM mapping
+            WHERE attribute.product_id = mapping.duplicate_id
+            AND NOT EXISTS (
+                SELECT 1 FROM {ProductAttribute._meta.db_table} existing
+                WHERE existing.product_id = mapping.product_id AND existing.attribute_type_id = attribute.attribute_type_id
+            )
+            AND (attribute.attribute_type_id IS NULL OR attribute.id = (
+                SELECT MIN(other.id) FROM {ProductAttribute._meta.db_table} other
+                JOIN mapping other_mapping ON other.product_id = other_mapping.duplicate_id
+                WHERE other_mapping.product_id = mapping.product_id AND other.attribute_type_id = attribute.attribute_type_id
+            ))
+        """, mapping_params)
+        cursor.execute(f"""
+            WITH mapping (duplicate_id, product_id) AS (VALUES {mapping_sql})
+            UPDATE {ProductImage._meta.db_table} image SET product_id = mapping.product_id
+            FROM mapping
+            WHERE image.product_id = mapping.duplicate_id AND image.image_type IN (%s, %s)
+            AND NOT EXISTS (
+                SELECT 1 FROM {ProductImage._meta.db_table} existing
+                WHERE existing.product_id = mapping.product_id AND existing.image_type = image.image_type
+            )
+            AND image.id = (
+                SELECT MIN(other.id) FROM {ProductImage._meta.db_table} other
+                JOIN mapping other_mapping ON other.product_id = other_mapping.duplicate_id
+                WHERE other_mapping.product_id = mapping.product_id AND other.image_type = image.image_type
+            )
+        """, mapping_params + [MAIN, THUMBNAIL])
+        cursor.execute(f"""
+            WITH mapping (duplicate_id, product_id) AS (VALUES {mapping_sql})
+            UPDATE {WebsiteProductAttribute._meta.db_table} attribute SET product_id = mapping.product_id
+            FROM mapping
+            WHERE attribute.product_id = mapping.duplicate_id
+        """, mapping_params)
+        # approved candidates of the duplicates are moved to the products they're merged into rather than losing their products,
+        # unless that would repeat another candidate
+        for field, other_field in [('product_id', 'duplicate_id'), ('duplicate_id', 'product_id')]:
+            cursor.execute(f"""
+                WITH mapping (duplicate_id, product_id) AS (VALUES {mapping_sql})
+                UPDATE {DuplicateCandidate._meta.db_table} candidate SET {field} = mapping.product_id
+                FROM mapping
+                WHERE candidate.{field} = mapping.duplicate_id AND candidate.status = %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM {DuplicateCandidate._meta.db_table} existing
+                    WHERE existing.{field} = mapping.product_id AND existing.{other_field} = candidate.{other_field}
+                )
+                AND candidate.id = (
+                    SELECT MIN(other.id) FROM {DuplicateCandidate._meta.db_table} other
+                    JOIN mapping other_mapping ON other.{field} = other_mapping.duplicate_id
+                    WHERE other_mapping.product_id = mapping.product_id AND other.{other_field} = candidate.{other_field} AND other.status = %s
+                )
+            """, mapping_params + [DUPLICATE_APPROVED, DUPLICATE_APPROVED])
+    products: Dict[int, Product] = Product.objects.in_bulk(set(targets) | set(targets.values()))
+    for duplicate_id, target_id in targets.items():
+        product: Product = products[target_id]
+        duplicate: Product = products[duplicate_id]
+        product.alternate_models = list(dict.fromkeys((product.alternate_models or []) + [duplicate.model] + (duplicate.alternate_models or [])))
+    merged: List[Product] = [products[target_id] for target_id in set(targets.values())]
+    Product.objects.bulk_update(merged, ['alternate_models'])
+    Product.objects.filter(pk__in=targets).delete()
+    for product in merged:
+        product.sync_aliases()
+    Product.objects.filter(pk__in=[product.pk for product in merged]).update_search_vectors()
+    for duplicate_id, target_id in targets.items():
+        ChangeEvent.objects.record(products[target_id].category_id, CHANGE_PRODUCTS_MERGED, product=products[target_id], duplicate=products[duplicate_id].model)
+    from cms.tasks import queue_product_scores_update
+    for category_id in {product.category_id for product in merged}:
+        bump_data_version(category_id)
+        if category_id:
+            queue_product_scores_update(category_id)
+    return merged
+
+
+def merge_approved_candidates(batch_size: int = DUPLICATE_MERGE_BATCH_SIZE) -> int:
+    """
+    Merges approved candidates in batches of batch_size, a transaction per batch, highest scores first.
+    Where a duplicate was approved for several products, only the highest scoring candidate is merged in the batch.
+    The rest stay approved, and as merging moves them to the product the duplicate was merged into, they're merged in a later batch.
+    Candidates whose products were deleted some other way are rejected.
+    Returns the number of candidates merged.
+    """
+    merged_count: int = 0
+    while True:
+        with transaction.atomic():
+            batch: List[DuplicateCandidate] = list(DuplicateCandidate.objects.approved().select_for_update().order_by('-score', 'pk')[:batch_size])
+            if not batch:
+                return merged_count
+            duplicates: Dict[int, int] = {}
+            merged_ids: List[int] = []
+            rejected_ids: List[int] = []
+            for candidate in batch:
+                if not candidate.product_id or not candidate.duplicate_id:
+                    rejected_ids.append(candidate.pk)
+                elif candidate.product_id == candidate.duplicate_id:
+                    # both products were already merged into the same product
+                    merged_ids.append(candidate.pk)
+                elif candidate.duplicate_id not in duplicates:
+                    duplicates[candidate.duplicate_id] = candidate.product_id
+                    merged_ids.append(candidate.pk)
+            merge_products(duplicates)
+            DuplicateCandidate.objects.filter(pk__in=merged_ids).update(status=DUPLICATE_MERGED)
+            DuplicateCandidate.objects.filter(pk__in=rejected_ids).update(status=DUPLICATE_REJECTED)
+            merged_count += len(merged_ids)
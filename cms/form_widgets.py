@@ -19,3 +19,35 @@ class TagWidget(forms.widgets.TextInput):
         css = {
             'all': ('css/amsify.suggestags.css',)
         }
+
+
+class AutocompleteMixin:
+    """
+    A select for a model choice field with too many choices to render, which select2 loads from url as the user types.
+    Only the selected choices are rendered, so the field's queryset is only used to validate the selection.
+    """
+
+    def __init__(self, url: str, attrs=None, **kwargs):
+        super().__init__(attrs=attrs, **kwargs)
+        self.url = url
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs=extra_attrs)
+        attrs['data-autocomplete-url'] = str(self.url)
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if pk not in ('', None)]
+        field = self.choices.field
+        options = [] if self.allow_multiple_selected else [self.create_option(name, '', field.empty_label or '', not selected, 0, attrs=attrs)]
+        for obj in field.queryset.filter(pk__in=selected) if selected else []:
+            options.append(self.create_option(name, field.prepare_value(obj), field.label_from_instance(obj), True, len(options), attrs=attrs))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
@@ -1,13 +1,19 @@
+from typing import List, Set
+
 from django import forms
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.forms import modelformset_factory
+from django.forms import modelformset_factory, BaseModelFormSet
 from django.utils.translation import gettext as _
 from pint import Quantity
 
 from cms import constants
+from cms.cache import bump_data_version
 from cms.data_processing.units import UnitManager
-from cms.models import Product, Category, ProductQuerySet, BaseModel, AttributeType, ProductAttribute, Unit
+from cms.duplicates import merge_products
+from cms.models import Product, Category, ProductQuerySet, BaseModel, AttributeType, ProductAttribute, Unit, ChangeEvent, \
+    Brand, AttributeValue
+from cms.tasks import queue_product_scores_update
 
 
 class BaseMergeForm(forms.Form):
@@ -41,24 +47,12 @@ class ProductMergeForm(BaseMergeForm):
     target = forms.ModelChoiceField(queryset=Product.objects.published(), label=_('Product'))
     duplicates = forms.ModelMultipleChoiceField(queryset=Product.objects.published(), label=_('Duplicates'), help_text=_('All relational data from duplicates will be merged into product.'))
 
-    def merge(self, product: Product, duplicate: Product) -> Product:
-        """
-        Merges all attributes of duplicate into product, then deletes duplicate.
-        :param product: the source product.
-        :param duplicate: the product to be merged into source.
-        :return: the merged product instance.
-        """
-        missing_attributes = duplicate.productattributes.exclude(attribute_type__in=product.productattributes.values_list('attribute_type'))
-        missing_attributes.update(product=product)
-        product.alternate_models.append(duplicate.model)
-        product.save()
-        if product.image_main_required:
-            duplicate.images.filter(image_type=constants.MAIN).update(product=product)
-        if product.image_thumb_required:
-            duplicate.images.filter(image_type=constants.THUMBNAIL).update(product=product)
-        duplicate.websiteproductattributes.update(product=product)
-        duplicate.delete()
-        return product
+    def save(self) -> Product:
+        """Merges all duplicates into the target product at once, see merge_products."""
+        target: Product = self.cleaned_data['target']
+        merge_products({duplicate.pk: target.pk for duplicate in self.cleaned_data['duplicates']})
+        target.refresh_from_db()
+        return target
 
 
 class AttributeTypeMergeForm(BaseMergeForm):
@@ -84,7 +78,13 @@ class AttributeTypeMergeForm(BaseMergeForm):
         attribute_type.alternate_names += duplicate.alternate_names
         attribute_type.save()
         duplicate.delete()
+        attribute_type.sync_aliases()
         attribute_type.productattributes.serialize()
+        AttributeValue.objects.rebuild([attribute_type.pk])
+        ChangeEvent.objects.record(attribute_type.category_id, constants.CHANGE_ATTRIBUTE_TYPES_MERGED, attribute_type=attribute_type, duplicate=duplicate.name)
+        bump_data_version(attribute_type.category_id)
+        for category_id in set(attribute_type.productattributes.exclude(product__category=None).values_list('product__category_id', flat=True)):
+            queue_product_scores_update(category_id)
         return attribute_type
 
 
@@ -116,7 +116,7 @@ class ProductAttributeForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if self.fields.get('product'):
             self.fields['product'].disabled = True
-        if self.instance.attribute_type:
+        if self.instance.attribute_type or self.initial.get('attribute_type'):
             self.fields['attribute_type'].disabled = True
         if self.initial.get('attribute_type'):
             if self.attribute_type.unit:
@@ -147,8 +147,46 @@ class ProductAttributeForm(forms.ModelForm):
             return AttributeType.objects.get(pk=self.initial['attribute_type'])
 
 
-def get_product_attribute_formset(extra: int):
-    return modelformset_factory(ProductAttribute, form=ProductAttributeForm, extra=extra)
+class MissingProductAttributeForm(ProductAttributeForm):
+    """
+    A product attribute of the missing product attribute worklist.
+    The product and attribute type shown are posted back with the data, as the worklist may have changed by the time it's saved.
+    """
+    product_pk = forms.IntegerField(widget=forms.HiddenInput)
+    attribute_type_pk = forms.IntegerField(widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.initial.get('product'):
+            self.initial['product_pk'] = getattr(self.initial['product'], 'pk', self.initial['product'])
+        if self.initial.get('attribute_type'):
+            self.initial['attribute_type_pk'] = getattr(self.initial['attribute_type'], 'pk', self.initial['attribute_type'])
+
+    def has_changed(self) -> bool:
+        # rows left empty are skipped, whatever was posted for them
+        return any(name not in ['product_pk', 'attribute_type_pk'] for name in self.changed_data)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        product: Product = cleaned_data.get('product')
+        attribute_type: AttributeType = cleaned_data.get('attribute_type')
+        if (getattr(product, 'pk', None), getattr(attribute_type, 'pk', None)) != (cleaned_data.get('product_pk'), cleaned_data.get('attribute_type_pk')):
+            raise ValidationError(_("The missing product attributes have changed since this page was loaded, please enter this value again."))
+        return cleaned_data
+
+
+class BaseProductAttributeFormSet(BaseModelFormSet):
+
+    def save(self, commit: bool = True) -> List[ProductAttribute]:
+        """Creates the product attributes filled in with a single insert, rather than an insert per form."""
+        product_attributes: List[ProductAttribute] = super().save(commit=False)
+        if commit:
+            return ProductAttribute.objects.bulk_add(product_attributes)
+        return product_attributes
+
+
+def get_product_attribute_formset(extra: int, form=ProductAttributeForm):
+    return modelformset_factory(ProductAttribute, form=form, formset=BaseProductAttributeFormSet, extra=extra)
 
 
 class AttributeTypeForm(forms.ModelForm):
@@ -201,5 +239,30 @@ class ProductBrandMapForm(forms.ModelForm):
         fields = 'model', 'alternate_models', 'brand',
 
 
+class BaseBulkUpdateFormSet(BaseModelFormSet):
+
+    def save(self, commit: bool = True) -> List[BaseModel]:
+        """Saves the changes to the formset's objects with a single bulk update, rather than an update per form."""
+        changed_forms: List[forms.ModelForm] = [form for form in self.initial_forms if form.has_changed()]
+        objects: List[BaseModel] = [form.save(commit=False) for form in changed_forms]
+        fields: Set[str] = {field for form in changed_forms for field in form.changed_data}
+        if commit and objects:
+            self.model.objects.bulk_update(objects, fields)
+        return objects
+
+
 def get_product_brand_formset():
-    return modelformset_factory(Product, form=ProductBrandMapForm, extra=0)
+    return modelformset_factory(Product, form=ProductBrandMapForm, formset=BaseBulkUpdateFormSet, extra=0)
+
+
+class ProductBrandPrefixForm(forms.Form):
+    prefix = forms.CharField(label=_('Model prefix'), help_text=_('Sets the brand of every product listed with a model starting with this prefix.'))
+    brand = forms.ModelChoiceField(queryset=Brand.objects.all(), label=_('Brand'))
+
+    def __init__(self, *args, queryset: ProductQuerySet, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queryset = queryset
+
+    def save(self) -> int:
+        """Sets the brand of all matching products with a single update. Returns the number of products updated."""
+        return self.queryset.filter(model__istartswith=self.cleaned_data['prefix']).set_brand(self.cleaned_data['brand'])
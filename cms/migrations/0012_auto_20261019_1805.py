@@ -0,0 +1,44 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('cms', '0011_auto_20210501_1052'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('score', models.FloatField(default=0, help_text='Weighted spec score, from 0 to 100.', verbose_name='Score')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_scores', to='cms.category', verbose_name='Category')),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='product_scores', to='accounts.company', verbose_name='Company')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='cms.product', verbose_name='Product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productscore',
+            index=models.Index(fields=['category', 'company', 'score'], name='cms_product_categor_eef871_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productscore',
+            constraint=models.UniqueConstraint(fields=('product', 'company'), name='unique_product_company_score'),
+        ),
+        migrations.AddConstraint(
+            model_name='productscore',
+            constraint=models.UniqueConstraint(condition=models.Q(company__isnull=True), fields=('product',), name='unique_product_default_score'),
+        ),
+    ]
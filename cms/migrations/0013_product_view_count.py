@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0012_auto_20261019_1805'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, help_text="Number of times the product's dashboard page has been viewed.", verbose_name='Views'),
+        ),
+    ]
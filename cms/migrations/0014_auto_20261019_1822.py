@@ -0,0 +1,51 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:22
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0013_product_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(verbose_name='Version')),
+                ('event_type', models.CharField(choices=[('product_created', 'Product created'), ('attribute_added', 'Attribute added'), ('price_changed', 'Price changed'), ('brand_set', 'Brand set'), ('products_merged', 'Products merged'), ('attribute_types_merged', 'Attribute types merged')], max_length=30, verbose_name='Type')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Data')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('attribute_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='change_events', to='cms.attributetype', verbose_name='Attribute')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_events', to='cms.category', verbose_name='Category')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='change_events', to='cms.product', verbose_name='Product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeEventConsumer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_event_consumers', to='cms.category', verbose_name='Category')),
+            ],
+            options={
+                'unique_together': {('name', 'category')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='changeevent',
+            constraint=models.UniqueConstraint(fields=('category', 'version'), name='unique_category_change_version'),
+        ),
+    ]
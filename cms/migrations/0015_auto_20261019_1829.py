@@ -0,0 +1,21 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0014_auto_20261019_1822'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['modified', 'id'], name='cms_product_modifie_eaecea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='websiteproductattribute',
+            index=models.Index(fields=['modified', 'id'], name='cms_website_modifie_ca6bb7_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# pg_trgm is a contrib extension, so fuzzy matching is only set up where the database server provides it
+CREATE_TRIGRAM_INDEX = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS cms_product_model_trgm ON cms_product USING gin (model gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+# the search document of cms.search.product_search_vector as of this migration
+UPDATE_SEARCH_VECTORS = """
+UPDATE cms_product SET search_vector =
+    setweight(to_tsvector('simple'::regconfig, COALESCE(model, '') || ' ' || COALESCE(array_to_string(alternate_models, ' ')::text, '')), 'A')
+    || setweight(to_tsvector('simple'::regconfig, COALESCE((SELECT name FROM cms_brand WHERE cms_brand.id = cms_product.brand_id), '')), 'B')
+    || setweight(to_tsvector('simple'::regconfig, COALESCE((SELECT name FROM cms_category WHERE cms_category.id = cms_product.category_id), '')), 'C');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0015_auto_20261019_1829'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text="The product's search document, updated whenever it, its brand or its category is saved.", null=True, verbose_name='Search vector'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='cms_product_search__6c8b50_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGRAM_INDEX, 'DROP INDEX IF EXISTS cms_product_model_trgm;'),
+        migrations.RunSQL(UPDATE_SEARCH_VECTORS, migrations.RunSQL.noop),
+    ]
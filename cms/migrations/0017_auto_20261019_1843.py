@@ -0,0 +1,88 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import re
+import uuid
+
+
+def normalise_alias(name):
+    """A frozen copy of cms.utils.normalise_alias as it was when the aliases were created."""
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+
+def create_aliases(apps, schema_editor):
+    for model_name, alias_model_name, target_field, name_fields in [
+        ('Product', 'ProductAlias', 'product_id', ('model', 'alternate_models')),
+        ('AttributeType', 'AttributeTypeAlias', 'attribute_type_id', ('name', 'alternate_names')),
+    ]:
+        alias_model = apps.get_model('cms', alias_model_name)
+        aliases = []
+        for pk, category_id, name, alternate_names in apps.get_model('cms', model_name).objects.values_list('pk', 'category_id', *name_fields).iterator():
+            for alias in {normalise_alias(alias_name) for alias_name in [name] + (alternate_names or []) if alias_name and alias_name.strip()}:
+                aliases.append(alias_model(category_id=category_id, alias=alias, **{target_field: pk}))
+        alias_model.objects.bulk_create(aliases, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0016_auto_20261019_1839'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('alias', models.CharField(help_text='A normalised name the object is known by, matched against scraped names.', max_length=100, verbose_name='Alias')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cms.category', verbose_name='Category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='cms.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product aliases',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AttributeTypeAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('alias', models.CharField(help_text='A normalised name the object is known by, matched against scraped names.', max_length=100, verbose_name='Alias')),
+                ('attribute_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='cms.attributetype', verbose_name='Attribute type')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cms.category', verbose_name='Category')),
+            ],
+            options={
+                'verbose_name_plural': 'Attribute type aliases',
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productalias',
+            constraint=models.UniqueConstraint(fields=('category', 'alias'), name='cms_productalias_unique_category_alias'),
+        ),
+        migrations.AddConstraint(
+            model_name='productalias',
+            constraint=models.UniqueConstraint(condition=models.Q(category__isnull=True), fields=('alias',), name='cms_productalias_unique_alias'),
+        ),
+        migrations.AddConstraint(
+            model_name='attributetypealias',
+            constraint=models.UniqueConstraint(fields=('category', 'alias'), name='cms_attributetypealias_unique_category_alias'),
+        ),
+        migrations.AddConstraint(
+            model_name='attributetypealias',
+            constraint=models.UniqueConstraint(condition=models.Q(category__isnull=True), fields=('alias',), name='cms_attributetypealias_unique_alias'),
+        ),
+        migrations.RunPython(create_aliases, migrations.RunPython.noop),
+    ]
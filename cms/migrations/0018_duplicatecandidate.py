@@ -0,0 +1,40 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_extensions.db.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0017_auto_20261019_1843'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveIntegerField(default=1, verbose_name='order')),
+                ('publish', models.BooleanField(default=True, verbose_name='publish')),
+                ('uid', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Autogenerated unique id for this item in database', verbose_name='unique id')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modification time')),
+                ('product_model', models.CharField(max_length=100, verbose_name='Product model')),
+                ('duplicate_model', models.CharField(max_length=100, verbose_name='Duplicate model')),
+                ('score', models.FloatField(help_text='Likelihood the products are the same, from 0 to 1.', verbose_name='Score')),
+                ('model_similarity', models.FloatField(verbose_name='Model similarity')),
+                ('spec_agreement', models.FloatField(blank=True, help_text='Share of the specs both products have that agree.', null=True, verbose_name='Spec agreement')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('merged', 'Merged')], default='pending', max_length=100, verbose_name='Status')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_candidates', to='cms.category', verbose_name='Category')),
+                ('duplicate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cms.product', verbose_name='Duplicate')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicate_candidates', to='cms.product', verbose_name='Product')),
+            ],
+            options={
+                'ordering': ('-score',),
+                'unique_together': {('product', 'duplicate')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.5 on 2026-10-19 18:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0018_duplicatecandidate'),
+    ]
+
+    # indexes for the case insensitive prefix matches of autocompletes, name__istartswith compiles to UPPER(name::text) LIKE
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX cms_attributetype_name_upper_like ON cms_attributetype (UPPER(name::text) text_pattern_ops);",
+            "DROP INDEX cms_attributetype_name_upper_like;",
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX cms_brand_name_upper_like ON cms_brand (UPPER(name::text) text_pattern_ops);",
+            "DROP INDEX cms_brand_name_upper_like;",
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.5 on 2026-10-19 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# indexes the text values of existing product and website product attributes, as AttributeValueQuerySet.rebuild does
+INDEX_ATTRIBUTE_VALUES = """
+WITH seen AS (
+    SELECT attribute_type_id, data->>'value' AS value, product_id, created FROM cms_productattribute
+    WHERE attribute_type_id IS NOT NULL AND jsonb_typeof(data->'value') = 'string'
+    UNION ALL
+    SELECT attribute_type_id, data->>'value' AS value, product_id, created FROM cms_websiteproductattribute
+    WHERE attribute_type_id IS NOT NULL AND jsonb_typeof(data->'value') = 'string'
+)
+INSERT INTO cms_attributevalue (attribute_type_id, value, product_count, last_seen)
+SELECT attribute_type_id, value, COUNT(DISTINCT product_id), MAX(created) FROM seen
+WHERE value <> '' AND LENGTH(value) <= 255
+GROUP BY attribute_type_id, value;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cms', '0019_auto_20261019_1859'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=255, verbose_name='Value')),
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Products')),
+                ('last_seen', models.DateTimeField(verbose_name='Last seen')),
+                ('attribute_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='values', to='cms.attributetype', verbose_name='Attribute type')),
+            ],
+            options={
+                'unique_together': {('attribute_type', 'value')},
+            },
+        ),
+        migrations.RunSQL(INDEX_ATTRIBUTE_VALUES, migrations.RunSQL.noop),
+    ]
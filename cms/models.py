@@ -1,28 +1,46 @@
 import datetime
 import uuid
+from collections import defaultdict
 from statistics import mean
-from typing import Optional, Dict, Union, Type, Iterator, Any, Tuple
+from typing import Optional, Dict, Union, Type, Iterator, Any, Tuple, List, Callable, Iterable, Set, TYPE_CHECKING
+import numpy as np
 import pandas as pd
 from pandas import DataFrame, Series
 
 from django import forms
 from django.contrib.humanize.templatetags import humanize
 from django.contrib.postgres.fields import ArrayField
-from django.db import models, transaction
-from django.db.models import PROTECT, CASCADE, SET_NULL, QuerySet, Q
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField, SearchRank, TrigramSimilarity, SearchQuery
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction, connection
+from django.db.models import PROTECT, CASCADE, SET_NULL, QuerySet, Q, F, OuterRef, Subquery, Avg, FloatField, IntegerField, \
+    Exists, Min, Max, Count
+from django.db.models.functions import Coalesce, Cast, Floor
 from django.db.models.fields.json import KeyTextTransform
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext as _
 from django_extensions.db.fields import ModificationDateTimeField, CreationDateTimeField
 from pint import Quantity
 
+from cms.cache import bump_data_version
 from cms.constants import MAX_LENGTH, URL_TYPES, SELECTOR_TYPES, TRACKING_FREQUENCIES, ONCE, IMAGE_TYPES, MAIN, \
     THUMBNAIL, WIDGET_CHOICES, WIDGETS, DAILY, PRICE_TIME_PERIODS_LIST, WEEKLY, OPERATORS, OPERATOR_MEAN, \
     SCORING_CHOICES, SCORING_NUMERICAL_HIGHER, SCORING_NUMERICAL_LOWER, SCORING_BOOL_TRUE, SCORING_BOOL_FALSE, \
-    EPREL_API_ROOT_URL, ENERGY_LABEL_IMAGE, WEBSITE_TYPES, WEBSITE_TYPE_RETAILER
+    EPREL_API_ROOT_URL, ENERGY_LABEL_IMAGE, WEBSITE_TYPES, WEBSITE_TYPE_RETAILER, CHANGE_EVENT_TYPES, CHANGE_PRODUCT_CREATED, \
+    CHANGE_ATTRIBUTE_ADDED, CHANGE_PRICE_CHANGED, CHANGE_BRAND_SET, FACETS, FACET_BRAND, FACET_CATEGORY, FACET_PRICE, \
+    FACET_WEBSITE, Facet, FACET_PRICE_BUCKET_SIZE, DUPLICATE_STATUSES, DUPLICATE_PENDING, DUPLICATE_APPROVED, \
+    ATTRIBUTE_VALUE_MAX_LENGTH
+from cms.search import search_query, trigram_available, product_search_vector
 from cms.serializers import serializers, CustomValueSerializer
-from cms.utils import get_eprel_api_url_and_category
+from cms.utils import get_eprel_api_url_and_category, normalise_alias
+
+if TYPE_CHECKING:
+    from cms.accounts.models import Company
 
 
 def json_data_default() -> Dict[str, None]:
@@ -105,6 +123,12 @@ class Website(BaseModel):
         """
         if attribute_type.unit:
             value = attribute_type.unit.serializer.serializer(value)
+        if attribute_type.name == 'price':
+            previous_price = WebsiteProductAttribute.objects.filter(website=self, product=product, attribute_type=attribute_type)\
+                .order_by('-created').values_list('data__value', flat=True).first()
+            if previous_price != value:
+                ChangeEvent.objects.record(product.category_id, CHANGE_PRICE_CHANGED, product=product, attribute_type=attribute_type,
+                                           website=self.pk, previous_value=previous_price, value=value)
         return WebsiteProductAttribute.objects.create(website=self, product=product, attribute_type=attribute_type, data={'value': value})
 
 
@@ -150,17 +174,177 @@ class Selector(BaseModel):
 class ProductQuerySet(BaseQuerySet):
 
     def custom_get_or_create(self, model: str, category: Category) -> 'Product':
-        product_check = self.filter(category=category).filter(
-            Q(model=model) |
-            Q(alternate_models__contains=[model]),
-        )
-        if product_check.exists():
-            return product_check.first()
-        return Product.objects.create(model=model, category=category)
+        product_id: Optional[int] = ProductAlias.objects.resolve([model], category).get(model)
+        product: Optional[Product] = self.filter(pk=product_id).first() if product_id else None
+        if product:
+            return product
+        product = Product.objects.create(model=model, category=category)
+        ChangeEvent.objects.record(product.category_id, CHANGE_PRODUCT_CREATED, product=product)
+        return product
 
     def brands(self) -> 'QuerySet':
         return Brand.objects.published().filter(products__in=self).distinct()
 
+    def current_average_prices(self) -> Dict[int, int]:
+        """
+        Maps product pks to their avg price from the most recent prices, loaded in a single query.
+        Equivalent to calling Product.current_average_price_int for every product in the queryset.
+        """
+        prices = WebsiteProductAttribute.objects.published()\
+            .filter(product__in=self, attribute_type__name="price")\
+            .for_day(datetime.datetime.now().date())\
+            .values_list('product_id', 'data__value')
+        df: DataFrame = pd.DataFrame(list(prices), columns=['product', 'price'])
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        df = df.dropna()
+        if df.empty:
+            return {}
+        return df.groupby('product')['price'].agg(lambda product_prices: int(mean(product_prices))).to_dict()
+
+    def spec_values(self, attribute_type_ids: List[int]) -> DataFrame:
+        """
+        Loads the product attribute values of the given attribute types in a single query.
+        Returns a product x attribute type matrix, indexed by product pk with a column per attribute type pk.
+        """
+        values = ProductAttribute.objects.filter(product__in=self, attribute_type__in=attribute_type_ids)\
+            .values_list('product_id', 'attribute_type_id', 'data__value')
+        df: DataFrame = pd.DataFrame(list(values), columns=['product', 'attribute_type', 'value'])
+        # object dtype stops pandas casting int values to float where the matrix has gaps
+        df['value'] = df['value'].astype(object)
+        return df.pivot(index='product', columns='attribute_type', values='value')
+
+    def for_listing(self) -> 'ProductQuerySet':
+        """
+        Loads everything product list pages display in the same query as the products:
+        brand and category, the thumbnail image and the current average price.
+        """
+        thumbnails = ProductImage.objects.filter(product=OuterRef('pk'), image_type=THUMBNAIL).order_by('pk').values('image')[:1]
+        current_average_prices = WebsiteProductAttribute.objects.published()\
+            .filter(product=OuterRef('pk'), attribute_type__name="price")\
+            .for_day(datetime.datetime.now().date())\
+            .values('product')\
+            .annotate(average_price=Cast(Floor(Avg(Cast(KeyTextTransform('value', 'data'), FloatField()))), IntegerField()))\
+            .values('average_price')
+        return self.select_related('brand', 'category').annotate(
+            thumbnail_image=Subquery(thumbnails),
+            # shadows the cached property of the same name
+            current_average_price_int=Subquery(current_average_prices),
+        )
+
+    def with_scores(self, company: Optional['Company'] = None) -> 'ProductQuerySet':
+        """
+        Annotates each product with its weighted spec score, so products can be sorted and filtered by score in SQL.
+        Uses the company's own scores where it has category attribute configs, falling back to the default scores.
+        """
+        default_scores = ProductScore.objects.filter(product=OuterRef('pk'), company__isnull=True).values('score')[:1]
+        if not company:
+            return self.annotate(score=Subquery(default_scores))
+        company_scores = ProductScore.objects.filter(product=OuterRef('pk'), company=company).values('score')[:1]
+        return self.annotate(score=Coalesce(Subquery(company_scores), Subquery(default_scores)))
+
+    def modified_after(self, timestamp: datetime.datetime) -> 'ProductQuerySet':
+        """
+        Filters to products changed since timestamp, along with their specs, prices or scores,
+        which change without the product itself being saved.
+        """
+        return self.filter(
+            Q(modified__gt=timestamp)
+            | Q(Exists(ProductAttribute.objects.filter(product=OuterRef('pk'), modified__gt=timestamp)))
+            | Q(Exists(WebsiteProductAttribute.objects.filter(product=OuterRef('pk'), attribute_type__name="price", modified__gt=timestamp)))
+            | Q(Exists(ProductScore.objects.filter(product=OuterRef('pk'), modified__gt=timestamp)))
+        )
+
+    def brands_changed(self) -> None:
+        """
+        Follows up on the brands of the products being changed in bulk, as saving each product would:
+        rebuilds their search documents and records a change event for each, with an insert per category.
+        """
+        self.update_search_vectors()
+        changes: Dict[Optional[int], List[Dict[str, Any]]] = defaultdict(list)
+        for product in self.only('pk', 'category_id', 'brand_id'):
+            changes[product.category_id].append(dict(product=product, data={'brand': product.brand_id}))
+        for category_id, category_changes in changes.items():
+            ChangeEvent.objects.record_many(category_id, CHANGE_BRAND_SET, category_changes)
+            if category_id:
+                bump_data_version(category_id)
+
+    @transaction.atomic
+    def set_brand(self, brand: 'Brand') -> int:
+        """Sets the brand of every product in the queryset with a single update. Returns the number of products updated."""
+        pks: List[int] = list(self.select_for_update().values_list('pk', flat=True))
+        updated: int = self.update(brand=brand)
+        Product.objects.filter(pk__in=pks).brands_changed()
+        return updated
+
+    def update_search_vectors(self) -> int:
+        """Rebuilds the search documents of the products from their models, brand and category names, in a single update."""
+        return self.update(search_vector=product_search_vector())
+
+    def search(self, text: str) -> 'ProductQuerySet':
+        """
+        Finds products with words in their model, alternate models, brand or category name starting with each word of text,
+        or, where pg_trgm is installed, with a model similar to text. Results are ordered by relevance.
+        """
+        query: Optional[SearchQuery] = search_query(text)
+        if not query:
+            return self
+        condition: Q = Q(search_vector=query)
+        rank = SearchRank(F('search_vector'), query)
+        if trigram_available():
+            condition |= Q(model__trigram_similar=text)
+            rank = rank + TrigramSimilarity('model', text)
+        return self.filter(condition).annotate(search_rank=rank).order_by('-search_rank', 'pk')
+
+    def facet_counts(self) -> Dict[str, List[Facet]]:
+        """
+        Counts the products by brand, category, current price range and website in a single grouped query.
+        Facets of each kind are ordered by count, except price ranges which are in ascending order.
+        """
+        queryset: ProductQuerySet = self if 'current_average_price_int' in self.query.annotations else self.for_listing()
+        hits_sql, params = queryset.order_by().values(
+            'id', 'brand_id', 'category_id',
+            brand_name=F('brand__name'), category_name=F('category__name'), price=F('current_average_price_int'),
+        ).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH hits AS ({hits_sql})
+                SELECT
+                    GROUPING(hits.brand_id, hits.category_id, price_bucket, websites.website_id),
+                    hits.brand_id, hits.brand_name, hits.category_id, hits.category_name,
+                    price_bucket, websites.website_id, websites.website_name, COUNT(DISTINCT hits.id)
+                FROM hits
+                CROSS JOIN LATERAL (SELECT FLOOR(hits.price / %s) * %s AS price_bucket) buckets
+                LEFT JOIN (
+                    SELECT DISTINCT prices.product_id, prices.website_id, {Website._meta.db_table}.name AS website_name
+                    FROM {WebsiteProductAttribute._meta.db_table} prices
+                    JOIN {Website._meta.db_table} ON {Website._meta.db_table}.id = prices.website_id
+                    WHERE prices.publish AND prices.product_id IN (SELECT id FROM hits)
+                ) websites ON websites.product_id = hits.id
+                GROUP BY GROUPING SETS (
+                    (hits.brand_id, hits.brand_name),
+                    (hits.category_id, hits.category_name),
+                    (price_bucket),
+                    (websites.website_id, websites.website_name)
+                )
+            """, params + (FACET_PRICE_BUCKET_SIZE, FACET_PRICE_BUCKET_SIZE))
+            rows = cursor.fetchall()
+        # grouping sets are identified by a bitmask of the columns they aren't grouped by
+        grouping_facets: Dict[int, str] = {0b0111: FACET_BRAND, 0b1011: FACET_CATEGORY, 0b1101: FACET_PRICE, 0b1110: FACET_WEBSITE}
+        facets: Dict[str, List[Facet]] = {name: [] for name, label in FACETS}
+        for grouping, brand_id, brand_name, category_id, category_name, price_bucket, website_id, website_name, count in rows:
+            name: str = grouping_facets[grouping]
+            value, label = {
+                FACET_BRAND: (brand_id, brand_name),
+                FACET_CATEGORY: (category_id, category_name),
+                FACET_PRICE: (price_bucket, f"€{price_bucket:.0f} - €{price_bucket + FACET_PRICE_BUCKET_SIZE:.0f}" if price_bucket is not None else None),
+                FACET_WEBSITE: (website_id, website_name),
+            }[name]
+            if value is not None:
+                facets[name].append(Facet(name, value, label, count))
+        for name, name_facets in facets.items():
+            name_facets.sort(key=(lambda facet: facet.value) if name == FACET_PRICE else (lambda facet: (-facet.count, facet.label)))
+        return facets
+
 
 class Product(BaseModel):
     model = models.CharField(verbose_name=_("Model"), max_length=MAX_LENGTH, unique=True)
@@ -170,12 +354,21 @@ class Product(BaseModel):
     eprel_scraped = models.BooleanField(verbose_name=_("EPREL Scraped"), default=False, help_text=_("Has the EPREL database been scraped for this product?"))
     eprel_code = models.CharField(verbose_name=_("EPREL Code"), max_length=MAX_LENGTH, unique=True, blank=True, null=True)
     eprel_category = models.ForeignKey(to="cms.EprelCategory", verbose_name=_("EPREL Category"), on_delete=SET_NULL, blank=True, null=True)
+    view_count = models.PositiveIntegerField(verbose_name=_("Views"), default=0, help_text=_("Number of times the product's dashboard page has been viewed."))
+    search_vector = SearchVectorField(verbose_name=_("Search vector"), null=True, editable=False, help_text=_("The product's search document, updated whenever it, its brand or its category is saved."))
 
     def __str__(self):
         return self.model
 
     objects = ProductQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # the api pages through products in order of modification
+            models.Index(fields=['modified', 'id']),
+            GinIndex(fields=['search_vector']),
+        ]
+
     @cached_property
     def image_main_required(self) -> bool:
         return self.images.filter(image_type=MAIN).exists() is False
@@ -195,6 +388,8 @@ class Product(BaseModel):
 
     @property
     def image_thumb(self):
+        if hasattr(self, 'thumbnail_image'):
+            return ProductImage._meta.get_field('image').storage.url(self.thumbnail_image) if self.thumbnail_image else None
         image: ProductImage = self.images.filter(image_type=THUMBNAIL).first()
         return image.image.url if image else None
 
@@ -231,6 +426,20 @@ class Product(BaseModel):
         df_grouper: Series = df['created'].dt.isocalendar().week if time_period == WEEKLY else getattr(df['created'].dt, time_period)
         return getattr(df.groupby(by=df_grouper), aggregation)()
 
+    def price_series(self, start_date: datetime.datetime, end_date: datetime.datetime) -> DataFrame:
+        """
+        The average price across websites per hour in a period, as created and price columns in order of time.
+        Prices crawled from each website in the same run are averaged into a single point, for charting.
+        """
+        prices = self.websiteproductattributes.published()\
+            .filter(created__range=[start_date, end_date], attribute_type__name="price")\
+            .annotate(price=Cast(KeyTextTransform('value', 'data'), FloatField()))\
+            .order_by('created')
+        df: DataFrame = pd.DataFrame(prices.values('created', 'price'))
+        if df.empty:
+            return df
+        return df.groupby(df['created'].dt.floor('H'))['price'].mean().reset_index()
+
     def get_eprel_api_url(self) -> Optional[Union[str, dict]]:
         if not self.eprel_code:
             return
@@ -242,6 +451,9 @@ class Product(BaseModel):
             self.save()
             return eprel_category_url[2]
 
+    def sync_aliases(self) -> None:
+        ProductAlias.objects.sync(self.pk, [self.model] + (self.alternate_models or []), self.category_id)
+
     def update_brand(self, brand_name: str) -> 'Product':
         if self.brand:
             raise Exception(f"Product brand already exists: {self.brand}")
@@ -251,21 +463,28 @@ class Product(BaseModel):
         else:
             self.brand = Brand.objects.create(name=brand_name)
         self.save()
+        ChangeEvent.objects.record(self.category_id, CHANGE_BRAND_SET, product=self, brand=self.brand_id)
         return self
 
 
 class AttributeTypeQuerySet(BaseQuerySet):
 
     def custom_get_or_create(self, name: str, category: Category, unit: Optional[Unit] = None) -> 'AttributeType':
-        attribute_type_check = self.filter(Q(name=name) | Q(alternate_names__contains=[name]), category=category)
-        if attribute_type_check.exists():
-            attribute_type: AttributeType = attribute_type_check.first()
+        attribute_type_id: Optional[int] = AttributeTypeAlias.objects.resolve([name], category).get(name)
+        attribute_type: Optional[AttributeType] = self.filter(pk=attribute_type_id).first() if attribute_type_id else None
+        if attribute_type:
             if not attribute_type.unit and unit:
                 attribute_type.unit = unit
                 attribute_type.save()
             return attribute_type
         return AttributeType.objects.create(name=name, unit=unit, category=category)
 
+    def resolve(self, names: Iterable[str], category: Optional[Category]) -> Dict[str, 'AttributeType']:
+        """Maps each of a batch of scraped attribute labels to its attribute type in the category, in two queries."""
+        attribute_type_ids: Dict[str, int] = AttributeTypeAlias.objects.resolve(names, category)
+        attribute_types: Dict[int, AttributeType] = self.in_bulk(set(attribute_type_ids.values()))
+        return {name: attribute_types[pk] for name, pk in attribute_type_ids.items() if pk in attribute_types}
+
 
 class AttributeType(BaseModel):
     name = models.CharField(verbose_name=_("Name"), max_length=MAX_LENGTH)
@@ -281,6 +500,9 @@ class AttributeType(BaseModel):
     class Meta:
         unique_together = ['name', 'unit', 'category']
 
+    def sync_aliases(self) -> None:
+        AttributeTypeAlias.objects.sync(self.pk, [self.name] + (self.alternate_names or []), self.category_id)
+
     @transaction.atomic
     def convert_unit(self, unit: Unit) -> 'AttributeType':
         """
@@ -309,6 +531,73 @@ class AttributeType(BaseModel):
                 product_attribute.save()
 
 
+class AliasQuerySet(BaseQuerySet):
+    # the field of the alias model pointing to the object it's an alias of
+    target_field: str = None
+
+    def resolve(self, names: Iterable[str], category: Optional[Category]) -> Dict[str, int]:
+        """
+        Maps each of a batch of scraped names to the id of the object it's an alias of in the category, in a single query.
+        Names without an alias are left out.
+        """
+        aliases: Dict[str, str] = {name: normalise_alias(name) for name in names}
+        ids: Dict[str, int] = dict(self.filter(category=category, alias__in=set(aliases.values())).values_list('alias', self.target_field))
+        return {name: ids[alias] for name, alias in aliases.items() if alias in ids}
+
+    def sync(self, target_id: int, names: Iterable[str], category_id: Optional[int]) -> None:
+        """
+        Makes an object's aliases the normalised forms of its names in its category.
+        Aliases already held by another object in the category are left to it.
+        """
+        aliases = {normalise_alias(name) for name in names if name and name.strip()}
+        self.filter(**{self.target_field: target_id}).exclude(category_id=category_id, alias__in=aliases).delete()
+        self.bulk_create([self.model(category_id=category_id, alias=alias, **{self.target_field: target_id}) for alias in aliases], ignore_conflicts=True)
+
+
+class BaseAlias(BaseModel):
+    alias = models.CharField(verbose_name=_("Alias"), max_length=MAX_LENGTH, help_text=_("A normalised name the object is known by, matched against scraped names."))
+    category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, blank=True, null=True, related_name='+')
+
+    def __str__(self):
+        return self.alias
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'alias'], name='%(app_label)s_%(class)s_unique_category_alias'),
+            # nulls are distinct in unique constraints, so aliases without a category need their own
+            models.UniqueConstraint(fields=['alias'], condition=Q(category__isnull=True), name='%(app_label)s_%(class)s_unique_alias'),
+        ]
+
+
+class ProductAliasQuerySet(AliasQuerySet):
+    target_field = 'product_id'
+
+
+class ProductAlias(BaseAlias):
+    """A product's model or alternate model, indexed for matching scraped model numbers. Kept in sync when products are saved."""
+    product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=CASCADE, related_name="aliases")
+
+    objects = ProductAliasQuerySet.as_manager()
+
+    class Meta(BaseAlias.Meta):
+        verbose_name_plural = _("Product aliases")
+
+
+class AttributeTypeAliasQuerySet(AliasQuerySet):
+    target_field = 'attribute_type_id'
+
+
+class AttributeTypeAlias(BaseAlias):
+    """An attribute type's name or alternate name, indexed for matching scraped labels. Kept in sync when attribute types are saved."""
+    attribute_type = models.ForeignKey(to=AttributeType, verbose_name=_("Attribute type"), on_delete=CASCADE, related_name="aliases")
+
+    objects = AttributeTypeAliasQuerySet.as_manager()
+
+    class Meta(BaseAlias.Meta):
+        verbose_name_plural = _("Attribute type aliases")
+
+
 class BaseProductAttribute(BaseModel):
     product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=CASCADE, related_name="%(class)ss")
     attribute_type = models.ForeignKey(to=AttributeType, verbose_name=_("Data type"), on_delete=SET_NULL, blank=True, null=True, help_text=_("The data type for this attribute"), related_name="%(class)ss")
@@ -333,7 +622,34 @@ class ProductAttributeQuerySet(BaseQuerySet):
             return product_attribute_check.first()
         if attribute_type.unit:
             value = attribute_type.unit.serializer.serializer(value)
-        return self.create(product=product, attribute_type=attribute_type, data={'value': value})
+        product_attribute: ProductAttribute = self.create(product=product, attribute_type=attribute_type, data={'value': value})
+        ChangeEvent.objects.record(product.category_id, CHANGE_ATTRIBUTE_ADDED, product=product, attribute_type=attribute_type, value=value)
+        return product_attribute
+
+    @transaction.atomic
+    def bulk_add(self, product_attributes: List['ProductAttribute']) -> List['ProductAttribute']:
+        """
+        Creates product attributes with a single insert, recording a change event for each with an insert per category
+        and indexing their values, as saving each would.
+        The data versions and product scores of their categories are updated once per category.
+        """
+        from cms.tasks import queue_product_scores_update
+        product_attributes = self.bulk_create(product_attributes)
+        new_products: Dict[Tuple[int, Any], int] = defaultdict(int)
+        for product_attribute in product_attributes:
+            new_products[(product_attribute.attribute_type_id, product_attribute.data['value'])] += 1
+        AttributeValue.objects.record(new_products)
+        changes: Dict[Optional[int], List[Dict[str, Any]]] = defaultdict(list)
+        for product_attribute in product_attributes:
+            changes[product_attribute.product.category_id].append(dict(
+                product=product_attribute.product, attribute_type=product_attribute.attribute_type, data={'value': product_attribute.data['value']},
+            ))
+        for category_id, category_changes in changes.items():
+            ChangeEvent.objects.record_many(category_id, CHANGE_ATTRIBUTE_ADDED, category_changes)
+            if category_id:
+                bump_data_version(category_id)
+                queue_product_scores_update(category_id)
+        return product_attributes
 
     def products(self) -> 'ProductAttributeQuerySet':
         return Product.objects.filter(pk__in=[product_attribute.product.pk for product_attribute in self])
@@ -389,6 +705,10 @@ class WebsiteProductAttribute(BaseProductAttribute):
 
     objects = WebsiteProductAttributeQuerySet.as_manager()
 
+    class Meta:
+        # the api pages through prices in order of modification
+        indexes = [models.Index(fields=['modified', 'id'])]
+
 
 class ProductImage(BaseModel):
     product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=CASCADE, related_name="images")
@@ -399,6 +719,136 @@ class ProductImage(BaseModel):
         return f"{self.product} | {self.image}"
 
 
+class AttributeValueQuerySet(QuerySet):
+
+    def record(self, new_products: Dict[Tuple[int, Any], int]) -> None:
+        """
+        Records attribute values seen on ingest with a single statement, given the number of new products with each
+        attribute type and value. Values already indexed have their product count incremented and are marked as seen.
+        Counts only include new product attributes, so values seen again on websites drift until the index is rebuilt.
+        Only text values are indexed.
+        """
+        rows: List[Tuple[int, str, int]] = [
+            (attribute_type_id, value, count) for (attribute_type_id, value), count in new_products.items()
+            if attribute_type_id and isinstance(value, str) and value and len(value) <= ATTRIBUTE_VALUE_MAX_LENGTH
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH seen (attribute_type_id, value, new_products) AS (VALUES {', '.join(['(%s, %s, %s)'] * len(rows))}),
+                updated AS (
+                    UPDATE {AttributeValue._meta.db_table} indexed
+                    SET product_count = indexed.product_count + seen.new_products, last_seen = NOW()
+                    FROM seen
+                    WHERE indexed.attribute_type_id = seen.attribute_type_id AND indexed.value = seen.value
+                    RETURNING indexed.attribute_type_id, indexed.value
+                )
+                INSERT INTO {AttributeValue._meta.db_table} (attribute_type_id, value, product_count, last_seen)
+                SELECT seen.attribute_type_id, seen.value, GREATEST(seen.new_products, 1), NOW() FROM seen
+                WHERE NOT EXISTS (SELECT 1 FROM updated WHERE updated.attribute_type_id = seen.attribute_type_id AND updated.value = seen.value)
+                ON CONFLICT (attribute_type_id, value) DO NOTHING
+            """, [column for row in rows for column in row])
+
+    def rebuild(self, attribute_type_ids: Optional[List[int]] = None) -> None:
+        """
+        Recounts the values of the given attribute types, or of all of them, from product and website product attributes
+        with a single statement. Values no longer seen are removed.
+        """
+        def condition(alias: str) -> str:
+            if attribute_type_ids is None:
+                return f"{alias}.attribute_type_id IS NOT NULL"
+            return f"{alias}.attribute_type_id = ANY(%(attribute_type_ids)s)"
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH seen AS (
+                    SELECT attribute_type_id, data->>'value' AS value, product_id, created FROM {ProductAttribute._meta.db_table} attribute
+                    WHERE {condition('attribute')} AND jsonb_typeof(data->'value') = 'string'
+                    UNION ALL
+                    SELECT attribute_type_id, data->>'value' AS value, product_id, created FROM {WebsiteProductAttribute._meta.db_table} attribute
+                    WHERE {condition('attribute')} AND jsonb_typeof(data->'value') = 'string'
+                ),
+                counted AS (
+                    SELECT attribute_type_id, value, COUNT(DISTINCT product_id) AS product_count, MAX(created) AS last_seen FROM seen
+                    WHERE value <> '' AND LENGTH(value) <= %(max_length)s
+                    GROUP BY attribute_type_id, value
+                ),
+                removed AS (
+                    DELETE FROM {AttributeValue._meta.db_table} indexed
+                    WHERE {condition('indexed')} AND NOT EXISTS (
+                        SELECT 1 FROM counted WHERE counted.attribute_type_id = indexed.attribute_type_id AND counted.value = indexed.value
+                    )
+                )
+                INSERT INTO {AttributeValue._meta.db_table} (attribute_type_id, value, product_count, last_seen)
+                SELECT attribute_type_id, value, product_count, last_seen FROM counted
+                ON CONFLICT (attribute_type_id, value) DO UPDATE SET product_count = EXCLUDED.product_count, last_seen = EXCLUDED.last_seen
+            """, {'attribute_type_ids': attribute_type_ids, 'max_length': ATTRIBUTE_VALUE_MAX_LENGTH})
+
+    def unknown(self, attribute_type: AttributeType, values: List[str]) -> List[str]:
+        """Returns the values that aren't values of the attribute type, nor brand names, checking them all in a single query."""
+        known: Set[str] = set(
+            self.filter(attribute_type=attribute_type, value__in=values).values_list('value', flat=True)
+            .union(Brand.objects.filter(name__in=values).values_list('name', flat=True))
+        )
+        return [value for value in values if value not in known]
+
+    def suggest(self, attribute_type_id: int, prefix: str = '') -> 'AttributeValueQuerySet':
+        """The values of the attribute type starting with prefix, the values most products have first."""
+        return self.filter(attribute_type_id=attribute_type_id, value__istartswith=prefix).order_by('-product_count', 'value')
+
+
+class AttributeValue(models.Model):
+    """
+    A distinct text value of an attribute type, with the number of products it's seen for and when it was last seen.
+    An index of product and website product attributes, so axis values can be validated and suggested without scanning them.
+    Maintained as attributes are saved, and recounted by AttributeValueQuerySet.rebuild.
+    """
+    attribute_type = models.ForeignKey(to=AttributeType, verbose_name=_("Attribute type"), on_delete=CASCADE, related_name="values")
+    value = models.CharField(verbose_name=_("Value"), max_length=ATTRIBUTE_VALUE_MAX_LENGTH)
+    product_count = models.PositiveIntegerField(verbose_name=_("Products"), default=0)
+    last_seen = models.DateTimeField(verbose_name=_("Last seen"))
+
+    objects = AttributeValueQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.attribute_type} > {self.value}"
+
+    class Meta:
+        unique_together = ['attribute_type', 'value']
+
+
+class CategoryAttributeConfigQuerySet(BaseQuerySet):
+
+    def for_company(self, company: Optional['Company'] = None) -> 'CategoryAttributeConfigQuerySet':
+        """
+        Returns the company's configs, or the default configs if the company doesn't have any.
+        Intended for configs already filtered to a single category.
+        """
+        if company and self.filter(company=company).exists():
+            return self.filter(company=company)
+        return self.filter(company__isnull=True)
+
+    def missing_product_attributes(self) -> 'CategoryAttributeConfigQuerySet':
+        """
+        Finds the published products in each config's category without a product attribute of the config's attribute type,
+        with a single anti-join. Returns a config per missing product attribute, annotated with the product's product_id.
+        Where several companies configure the same attribute type for a category, only the first of their configs is returned.
+        """
+        first_configs = self.values('category', 'attribute_type').annotate(first=Min('pk')).values('first')
+        product_attributes = ProductAttribute.objects.filter(product=OuterRef('product_id'), attribute_type=OuterRef('attribute_type'))
+        return self.filter(pk__in=first_configs, category__product__publish=True)\
+            .annotate(product_id=F('category__product'))\
+            .filter(~Exists(product_attributes))
+
+    def missing_product_attribute_counts(self) -> QuerySet:
+        """Counts the missing product attributes of each category, see missing_product_attributes."""
+        return self.missing_product_attributes()\
+            .values('category', 'category__name')\
+            .annotate(count=Count('pk'))\
+            .order_by('category__name')
+
+
 class CategoryAttributeConfig(BaseModel):
     attribute_type = models.ForeignKey(to=AttributeType, verbose_name=_("Attribute"), on_delete=CASCADE, related_name="category_attribute_configs")
     category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, related_name="category_attribute_configs")
@@ -406,6 +856,8 @@ class CategoryAttributeConfig(BaseModel):
     company = models.ForeignKey(to="accounts.Company", verbose_name=_("Company"), on_delete=CASCADE, related_name="category_attribute_configs", blank=True, null=True)
     scoring = models.CharField(verbose_name=_("Scoring"), max_length=MAX_LENGTH, choices=SCORING_CHOICES, help_text=_("The mechanism by which values for this attribute should be scored."), blank=True, null=True)
 
+    objects = CategoryAttributeConfigQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.category} | {self.attribute_type}"
 
@@ -423,10 +875,277 @@ class CategoryAttributeConfig(BaseModel):
             return 'exclude'
         return 'filter'
 
+    def score_values(self, values: Series, value: Union[str, int, float, bool, None]) -> Series:
+        """
+        Vectorised equivalent of filtering product attributes with product_attribute_data_filter_kwargs.
+        Flags the values in the series that are as good as value, according to this config's scoring.
+        Missing values never match.
+        """
+        if self.scoring in [SCORING_NUMERICAL_HIGHER, SCORING_NUMERICAL_LOWER]:
+            if isinstance(value, str):
+                values = values.where(values.map(lambda spec_value: isinstance(spec_value, str)).astype(bool))
+            else:
+                values = pd.to_numeric(values, errors='coerce')
+            present: Series = values.notna()
+            values = values.where(present, value)
+            if self.scoring == SCORING_NUMERICAL_HIGHER:
+                return present & (values >= value)
+            return present & (values <= value)
+        present: Series = values.notna()
+        if self.scoring == SCORING_BOOL_FALSE:
+            return present & (values != value)
+        return present & (values == value)
+
+    def normalise_values(self, values: Series) -> Series:
+        """
+        Scales spec values between 0 and 1 according to this config's scoring, 1 being the best value in the series.
+        Numerical values are min-max scaled, boolean values score 1 when they match the preferred value.
+        Missing or unscorable values score 0.
+        """
+        if self.scoring in [SCORING_NUMERICAL_HIGHER, SCORING_NUMERICAL_LOWER]:
+            numbers: Series = pd.to_numeric(values, errors='coerce').astype(float)
+            value_range: float = numbers.max() - numbers.min()
+            normalised: Series = (numbers - numbers.min()) / value_range if value_range else numbers.notna().astype(float)
+            if self.scoring == SCORING_NUMERICAL_LOWER and value_range:
+                normalised = 1 - normalised
+            return normalised.fillna(0)
+        if self.scoring in [SCORING_BOOL_TRUE, SCORING_BOOL_FALSE]:
+            return (values == (self.scoring == SCORING_BOOL_TRUE)).astype(float)
+        return pd.Series(0.0, index=values.index)
+
     class Meta:
         unique_together = ['category', 'attribute_type', 'company']
 
 
+class ProductScoreQuerySet(BaseQuerySet):
+
+    def update_scores(self, category: Category, company: Optional['Company'] = None) -> None:
+        """
+        Recomputes the weighted spec scores of a category's products, using the company's category attribute configs.
+        Spec values are normalised across the whole category, so every product is scored in one NumPy pass,
+        but only scores that changed are written.
+        """
+        configs: List[CategoryAttributeConfig] = [
+            config for config in category.category_attribute_configs.for_company(company) if config.scoring and config.weight
+        ]
+        products: ProductQuerySet = Product.objects.filter(category=category)
+        product_pks: List[int] = list(products.values_list('pk', flat=True))
+        spec_values: DataFrame = products.spec_values([config.attribute_type_id for config in configs])
+        spec_values = spec_values.reindex(index=product_pks, columns=[config.attribute_type_id for config in configs])
+        weights: np.ndarray = np.array([config.weight for config in configs], dtype=float)
+        if configs:
+            normalised: np.ndarray = np.column_stack([config.normalise_values(spec_values[config.attribute_type_id]).to_numpy() for config in configs])
+            scores: np.ndarray = (normalised @ weights / np.abs(weights).sum() * 100).round(2)
+        else:
+            scores = np.zeros(len(product_pks))
+
+        product_scores: Dict[int, float] = dict(zip(product_pks, scores.tolist()))
+        existing: Dict[int, ProductScore] = {
+            product_score.product_id: product_score for product_score in self.filter(company=company, product_id__in=product_scores)
+        }
+        created: List[ProductScore] = []
+        updated: List[ProductScore] = []
+        for product_id, score in product_scores.items():
+            product_score: Optional[ProductScore] = existing.get(product_id)
+            if not product_score:
+                created.append(ProductScore(product_id=product_id, category=category, company=company, score=score))
+            elif product_score.score != score or product_score.category_id != category.pk:
+                product_score.score = score
+                product_score.category = category
+                # bulk updates don't touch modified, which incremental API pulls filter on
+                product_score.modified = timezone.now()
+                updated.append(product_score)
+        with transaction.atomic():
+            self.bulk_create(created)
+            self.bulk_update(updated, ['score', 'category', 'modified'])
+            self.filter(category=category, company=company).exclude(product_id__in=product_pks).delete()
+
+    def update_category_scores(self, category: Category) -> None:
+        """Recomputes the default scores, and the scores of every company with its own configs for the category."""
+        from cms.accounts.models import Company
+        company_ids = category.category_attribute_configs.filter(company__isnull=False).values_list('company_id', flat=True)
+        for company in [None, *Company.objects.filter(pk__in=company_ids)]:
+            self.update_scores(category, company)
+
+
+class ProductScore(BaseModel):
+    """
+    A product's weighted spec score within its category, as seen by a company.
+    Scores are precomputed from the category attribute configs so products can be ranked in SQL.
+    """
+    product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=CASCADE, related_name="scores")
+    category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, related_name="product_scores")
+    company = models.ForeignKey(to="accounts.Company", verbose_name=_("Company"), on_delete=CASCADE, related_name="product_scores", blank=True, null=True)
+    score = models.FloatField(verbose_name=_("Score"), help_text=_("Weighted spec score, from 0 to 100."), default=0)
+
+    objects = ProductScoreQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.product} | {self.company}: {self.score}"
+
+    class Meta:
+        indexes = [models.Index(fields=['category', 'company', 'score'])]
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'company'], name='unique_product_company_score'),
+            models.UniqueConstraint(fields=['product'], condition=Q(company__isnull=True), name='unique_product_default_score'),
+        ]
+
+
+@receiver([post_save, post_delete], sender=CategoryAttributeConfig)
+def category_attribute_config_changed(sender, instance: CategoryAttributeConfig, **kwargs):
+    """Configs change how the category's products are scored and compared, so they count as a data change."""
+    from cms.tasks import queue_product_scores_update
+    bump_data_version(instance.category_id)
+    queue_product_scores_update(instance.category_id)
+
+
+class ChangeEventQuerySet(BaseQuerySet):
+
+    def lock_version(self, category_id: int) -> int:
+        """
+        Locks the category until the end of the transaction and returns the version of its latest change event.
+        Recording is serialised per category by the lock, so versions are unique and ordered within a category.
+        """
+        list(Category.objects.select_for_update().filter(pk=category_id).values_list('pk', flat=True))
+        return self.latest_version(category_id)
+
+    def latest_version(self, category_id: int) -> int:
+        """Returns the version of the category's latest change event, or 0 if it has none."""
+        return self.filter(category_id=category_id).aggregate(version=Max('version'))['version'] or 0
+
+    @transaction.atomic
+    def record(self, category_id: Optional[int], event_type: str, product: Optional[Product] = None,
+               attribute_type: Optional[AttributeType] = None, **data) -> Optional['ChangeEvent']:
+        """
+        Records a change to a category's data as the category's next version.
+        Changes to products without a category aren't recorded.
+        """
+        if not category_id:
+            return None
+        version: int = self.lock_version(category_id) + 1
+        return self.create(category_id=category_id, version=version, event_type=event_type, product=product, attribute_type=attribute_type, data=data)
+
+    @transaction.atomic
+    def record_many(self, category_id: Optional[int], event_type: str, changes: List[Dict[str, Any]]) -> List['ChangeEvent']:
+        """
+        Records several changes to a category's data with a single insert, as record does.
+        Each change is a dict of the event's product, attribute_type and data, all optional.
+        """
+        if not category_id or not changes:
+            return []
+        version: int = self.lock_version(category_id)
+        return self.bulk_create([
+            ChangeEvent(category_id=category_id, version=version + index, event_type=event_type, **change)
+            for index, change in enumerate(changes, start=1)
+        ])
+
+    def since(self, category_id: int, version: int) -> 'ChangeEventQuerySet':
+        """Returns the category's change events after the given data version, in the order they were recorded."""
+        return self.filter(category_id=category_id, version__gt=version).order_by('version')
+
+
+class ChangeEvent(models.Model):
+    """
+    An outbox of changes made to a category's data by ingestion and merges.
+    Consumers such as caches, snapshots and rollups process the events since the last version they saw, rather than rebuilding.
+    """
+    category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, related_name="change_events")
+    version = models.PositiveBigIntegerField(verbose_name=_("Version"))
+    event_type = models.CharField(verbose_name=_("Type"), max_length=30, choices=CHANGE_EVENT_TYPES)
+    product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=SET_NULL, related_name="change_events", blank=True, null=True)
+    attribute_type = models.ForeignKey(to=AttributeType, verbose_name=_("Attribute"), on_delete=SET_NULL, related_name="change_events", blank=True, null=True)
+    data = models.JSONField(verbose_name=_("Data"), encoder=DjangoJSONEncoder, default=dict)
+    created = CreationDateTimeField(verbose_name=_('creation time'))
+
+    objects = ChangeEventQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.category_id} v{self.version}: {self.get_event_type_display()}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['category', 'version'], name='unique_category_change_version')]
+
+
+class ChangeEventConsumerQuerySet(BaseQuerySet):
+
+    @transaction.atomic
+    def consume(self, name: str, category_id: int, handler: Callable[[List[ChangeEvent]], Any], batch_size: int = 1000) -> int:
+        """
+        Passes the category's change events since the consumer's last seen version to handler, then advances the consumer.
+        The consumer is locked while the batch is handled, and isn't advanced if handler raises, so no event is skipped.
+        Returns the number of events handled.
+        """
+        consumer, _created = self.select_for_update().get_or_create(name=name, category_id=category_id)
+        events: List[ChangeEvent] = list(ChangeEvent.objects.since(category_id, consumer.version)[:batch_size])
+        if events:
+            handler(events)
+            consumer.version = events[-1].version
+            consumer.save()
+        return len(events)
+
+    @transaction.atomic
+    def changed_categories(self, name: str) -> List[int]:
+        """
+        Returns the categories with change events the named consumer hasn't seen, and advances it past them.
+        For consumers rebuilding whatever changed in a category, rather than handling each event.
+        """
+        seen: Dict[int, int] = dict(self.select_for_update().filter(name=name).values_list('category_id', 'version'))
+        latest: Dict[int, int] = dict(ChangeEvent.objects.values('category').annotate(version=Max('version')).values_list('category', 'version'))
+        changed: Dict[int, int] = {category_id: version for category_id, version in latest.items() if version > seen.get(category_id, 0)}
+        for category_id, version in changed.items():
+            self.update_or_create(name=name, category_id=category_id, defaults={'version': version})
+        return sorted(changed)
+
+
+class ChangeEventConsumer(BaseModel):
+    """The last category data version a named consumer of change events has processed."""
+    name = models.CharField(verbose_name=_("Name"), max_length=MAX_LENGTH)
+    category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, related_name="change_event_consumers")
+    version = models.PositiveBigIntegerField(verbose_name=_("Version"), default=0)
+
+    objects = ChangeEventConsumerQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name}: {self.category} v{self.version}"
+
+    class Meta:
+        unique_together = ['name', 'category']
+
+
+class DuplicateCandidateQuerySet(BaseQuerySet):
+
+    def pending(self) -> 'DuplicateCandidateQuerySet':
+        return self.filter(status=DUPLICATE_PENDING)
+
+    def approved(self) -> 'DuplicateCandidateQuerySet':
+        return self.filter(status=DUPLICATE_APPROVED)
+
+
+class DuplicateCandidate(BaseModel):
+    """
+    A pair of products in the same category and brand that may be the same product, queued for review in order of score.
+    Approved candidates are merged in batches, the duplicate into the product.
+    """
+    product = models.ForeignKey(to=Product, verbose_name=_("Product"), on_delete=SET_NULL, related_name="duplicate_candidates", blank=True, null=True)
+    duplicate = models.ForeignKey(to=Product, verbose_name=_("Duplicate"), on_delete=SET_NULL, related_name="+", blank=True, null=True)
+    product_model = models.CharField(verbose_name=_("Product model"), max_length=MAX_LENGTH)
+    duplicate_model = models.CharField(verbose_name=_("Duplicate model"), max_length=MAX_LENGTH)
+    category = models.ForeignKey(to=Category, verbose_name=_("Category"), on_delete=CASCADE, related_name="duplicate_candidates")
+    score = models.FloatField(verbose_name=_("Score"), help_text=_("Likelihood the products are the same, from 0 to 1."))
+    model_similarity = models.FloatField(verbose_name=_("Model similarity"))
+    spec_agreement = models.FloatField(verbose_name=_("Spec agreement"), blank=True, null=True, help_text=_("Share of the specs both products have that agree."))
+    status = models.CharField(verbose_name=_("Status"), max_length=MAX_LENGTH, choices=DUPLICATE_STATUSES, default=DUPLICATE_PENDING)
+
+    objects = DuplicateCandidateQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.duplicate_model} -> {self.product_model}"
+
+    class Meta:
+        ordering = '-score',
+        unique_together = ['product', 'duplicate']
+
+
 class SpiderResult(BaseModel):
     spider_name = models.CharField(verbose_name=_("spider name"), max_length=MAX_LENGTH)
     website = models.ForeignKey(to="cms.Website", on_delete=SET_NULL, related_name="spider_results", blank=True, null=True)
@@ -455,3 +1174,32 @@ class Brand(BaseModel):
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance: Product, **kwargs):
+    Product.objects.filter(pk=instance.pk).update_search_vectors()
+    instance.sync_aliases()
+
+
+@receiver(post_save, sender=AttributeType)
+def attribute_type_saved(sender, instance: AttributeType, **kwargs):
+    instance.sync_aliases()
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance: Brand, **kwargs):
+    Product.objects.filter(brand=instance).update_search_vectors()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance: Category, **kwargs):
+    Product.objects.filter(category=instance).update_search_vectors()
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_save, sender=WebsiteProductAttribute)
+def product_attribute_saved(sender, instance: BaseProductAttribute, created: bool, **kwargs):
+    """Indexes the attribute's value. Only new product attributes count another product, website attributes are saved again whenever they're scraped."""
+    new_products: int = 1 if created and sender is ProductAttribute else 0
+    AttributeValue.objects.record({(instance.attribute_type_id, (instance.data or {}).get('value')): new_products})
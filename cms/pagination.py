@@ -0,0 +1,41 @@
+from typing import Optional
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from cms.constants import ESTIMATED_COUNT_THRESHOLD
+
+
+def estimated_count(queryset: QuerySet) -> Optional[int]:
+    """
+    Estimates the number of rows in a queryset without counting them.
+    Unfiltered querysets are estimated from the table's row estimate in pg_class, and filtered ones from the query plan.
+    Returns None if the table has never been analysed.
+    """
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # tables that have never been vacuumed or analysed have an estimate of -1, or 0 before postgres 14
+            return row[0] if row and row[0] > 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator for the admin lists of large tables, where an exact COUNT(*) would take longer than the page itself.
+    Querysets estimated to have more than ESTIMATED_COUNT_THRESHOLD rows use the estimate as their count, smaller ones are counted.
+    Use with show_full_result_count = False, so the admin doesn't count the whole table as well.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        if isinstance(self.object_list, QuerySet):
+            estimate: Optional[int] = estimated_count(self.object_list)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
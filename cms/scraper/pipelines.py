@@ -1,12 +1,13 @@
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Set, Tuple
 
 from django.db import transaction
 
-from cms.constants import PRICE, MAIN, THUMBNAIL, ENERGY_LABEL_IMAGE, ENERGY_LABEL_QR
+from cms.cache import bump_data_version
+from cms.constants import PRICE, MAIN, THUMBNAIL, ENERGY_LABEL_IMAGE, ENERGY_LABEL_QR, CHANGE_BRAND_SET
 from cms.data_processing.image_processing import small_pdf_2_image, energy_label_cropped_2_qr, read_qr, \
     extract_eprel_code_from_url
 from cms.data_processing.utils import create_product_attribute
-from cms.models import Product, Selector, AttributeType, ProductImage, Category, EprelCategory
+from cms.models import Product, Selector, AttributeType, ProductImage, Category, EprelCategory, ChangeEvent
 from cms.scraper.items import ProductPageItem, EnergyLabelItem
 from cms.scraper.settings import IMAGES_FOLDER, IMAGES_ENERGY_LABELS_FOLDER
 from cms.scraper.tasks import create_product_attributes
@@ -28,12 +29,13 @@ class ProductAttributePipeline:
     def process_item(self, item, spider):
         if isinstance(item, ProductPageItem):
             product: Product = item['product']
+            attribute_types: Dict[str, AttributeType] = AttributeType.objects.resolve([attribute['label'] for attribute in item['attributes']], product.category)
             for attribute in item['attributes']:
                 attribute: Dict
                 if attribute['label'] == 'brand' and not product.brand:
                     product.update_brand(attribute['value'])
                 else:
-                    create_product_attribute(product, attribute['label'], attribute['value'])
+                    create_product_attribute(product, attribute['label'], attribute['value'], attribute_types.get(attribute['label']))
         return item
 
 
@@ -135,6 +137,28 @@ class SpecFinderPDFEnergyLabelPipeline:
             product.eprel_code = eprel_code
             product.eprel_scraped = True
             product.eprel_category = eprel_category
+            brand_changed: bool = product.brand != item['brand']
             product.brand = item['brand']
             product.save()
+            if brand_changed:
+                ChangeEvent.objects.record(product.category_id, CHANGE_BRAND_SET, product=product, brand=product.brand_id)
         return item
+
+
+class DataVersionPipeline:
+    """
+    Bumps the data version of each category the crawl touched once it finishes,
+    so cached reports aren't thrown away for every item scraped.
+    """
+
+    def open_spider(self, spider):
+        self.category_ids: Set[int] = set()
+
+    def process_item(self, item, spider):
+        if isinstance(item, (ProductPageItem, EnergyLabelItem)) and item.get('category'):
+            self.category_ids.add(item['category'].pk)
+        return item
+
+    def close_spider(self, spider):
+        for category_id in self.category_ids:
+            bump_data_version(category_id)
@@ -66,6 +66,7 @@ ITEM_PIPELINES = {
    'scraper.pipelines.ProductImagePipeline': 500,
    'scraper.pipelines.PDFEnergyLabelConverterPipeline': 600,
    'scraper.pipelines.SpecFinderPDFEnergyLabelPipeline': 700,
+   'scraper.pipelines.DataVersionPipeline': 800,
 }
 
 IMAGES_FOLDER = 'product_images'
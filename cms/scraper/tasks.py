@@ -1,15 +1,18 @@
-from typing import Optional, Union
+from typing import Optional, Union, Set, List
 
 import requests
-from celery import shared_task
+from celery import shared_task, chain
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
-from cms.constants import WEBSITE_TYPE_RETAILER, WEBSITE_TYPE_SUPPLIER
+from cms.cache import bump_data_version
+from cms.constants import WEBSITE_TYPE_RETAILER, WEBSITE_TYPE_SUPPLIER, PRODUCT_SCORES_CONSUMER
+from cms.dashboard.tasks import queue_cache_warmup, warm_changed_caches
 from cms.data_processing.utils import create_product_attribute
-from cms.models import Website, Product, Brand, Category
+from cms.models import Website, Product, Brand, Category, ChangeEventConsumer
 from cms.scraper.spiders.ecommerce import EcommerceSpider
 from cms.scraper.spiders.spec_finder import SpecFinderSpider
+from cms.tasks import update_product_scores
 from cms.utils import camel_case_to_sentence
 
 
@@ -19,6 +22,9 @@ def crawl_websites():
     for website in Website.objects.published().filter(website_type=WEBSITE_TYPE_RETAILER):
         process.crawl(EcommerceSpider, website=website)
     process.start()
+    category_ids: List[int] = ChangeEventConsumer.objects.changed_categories(PRODUCT_SCORES_CONSUMER)
+    # dashboards rank products by their scores, so the caches are warmed once the changed categories are rescored
+    chain(*[update_product_scores.si(category_id) for category_id in category_ids], warm_changed_caches.si()).delay()
 
 
 def create_product_attributes(product: Product, data: dict) -> None:
@@ -30,6 +36,7 @@ def create_product_attributes(product: Product, data: dict) -> None:
 
 @shared_task
 def crawl_eprel_data():
+    category_ids: Set[int] = set()
     for product in Product.objects.published().filter(eprel_scraped=False, eprel_code__isnull=False):
         url_or_data: Optional[Union[str, dict]] = product.get_eprel_api_url()
         if url_or_data:
@@ -37,6 +44,12 @@ def crawl_eprel_data():
             create_product_attributes(product, data)
             product.eprel_scraped = True
             product.save()
+            bump_data_version(product.category_id)
+            category_ids.add(product.category_id)
+    for category_id in category_ids:
+        update_product_scores(category_id)
+    if category_ids:
+        queue_cache_warmup(list(category_ids))
 
 
 @shared_task
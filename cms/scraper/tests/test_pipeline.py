@@ -2,9 +2,11 @@ import os
 from typing import List, Dict
 
 import requests
+from django.core.cache import cache
 from django.test import TestCase
 from model_mommy import mommy
 
+from cms.cache import get_data_version
 from cms.constants import PRICE, MAIN, THUMBNAIL, ENERGY_LABEL_IMAGE, ENERGY_LABEL_QR
 from cms.form_widgets import FloatInput
 from cms.models import Category, Product, ProductAttribute, Unit, Website, Selector, WebsiteProductAttribute, \
@@ -13,7 +15,7 @@ from cms.utils import get_dotted_path
 
 from cms.scraper.items import ProductPageItem, EnergyLabelItem
 from cms.scraper.pipelines import ProductPipeline, ProductAttributePipeline, WebsiteProductAttributePipeline, \
-    ProductImagePipeline, PDFEnergyLabelConverterPipeline, SpecFinderPDFEnergyLabelPipeline
+    ProductImagePipeline, PDFEnergyLabelConverterPipeline, SpecFinderPDFEnergyLabelPipeline, DataVersionPipeline
 
 
 class TestPipeline(TestCase):
@@ -148,3 +150,17 @@ class TestPipeline(TestCase):
             self.assertTrue(product.eprel_scraped)
             self.assertEqual(product.eprel_category, eprel_category)
             self.assertEqual(product.brand, brand)
+
+    def test_data_version_pipeline(self):
+        cache.clear()
+        version: int = get_data_version(self.category.pk)
+        item: ProductPageItem = ProductPageItem(product=self.product, category=self.category)
+        pipeline: DataVersionPipeline = DataVersionPipeline()
+        pipeline.open_spider({})
+        self.assertEqual(pipeline.process_item(item, {}), item)
+        self.assertEqual(pipeline.process_item(item, {}), item)
+        with self.subTest("not bumped per item"):
+            self.assertEqual(get_data_version(self.category.pk), version)
+        with self.subTest("bumped once the crawl finishes"):
+            pipeline.close_spider({})
+            self.assertNotEqual(get_data_version(self.category.pk), version)
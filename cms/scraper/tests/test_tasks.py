@@ -1,8 +1,12 @@
+from unittest import mock
+
 from django.test import TestCase
 from model_mommy import mommy
 
-from cms.models import Product, ProductAttribute, Category, EprelCategory
-from cms.scraper.tasks import crawl_eprel_data, create_product_attributes
+from cms.constants import CHANGE_PRODUCT_CREATED
+from cms.models import Product, ProductAttribute, Category, EprelCategory, ChangeEvent
+from cms.scraper.tasks import crawl_eprel_data, create_product_attributes, crawl_websites, update_product_scores, \
+    warm_changed_caches
 
 
 class TestTasks(TestCase):
@@ -26,6 +30,21 @@ class TestTasks(TestCase):
             product: Product = Product.objects.get(pk=product.pk)
             self.assertTrue(product.eprel_scraped)
 
+    @mock.patch('cms.scraper.tasks.chain')
+    @mock.patch('cms.scraper.tasks.CrawlerProcess')
+    def test_crawl_websites(self, crawler_process, chain):
+        category, other_category = mommy.make(Category, _quantity=2)
+        ChangeEvent.objects.record(category.pk, CHANGE_PRODUCT_CREATED)
+
+        with self.subTest("changed categories rescored"):
+            crawl_websites()
+            chain.assert_called_once_with(update_product_scores.si(category.pk), warm_changed_caches.si())
+
+        with self.subTest("nothing changed"):
+            chain.reset_mock()
+            crawl_websites()
+            chain.assert_called_once_with(warm_changed_caches.si())
+
     def test_create_product_attributes(self):
         product: Product = Product.objects.create(model="FFB 8448 WV UK")
         create_product_attributes(product, {
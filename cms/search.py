@@ -0,0 +1,40 @@
+import functools
+import re
+from typing import Optional, List
+
+from django.contrib.postgres.search import SearchQuery, SearchVector, CombinedSearchVector
+from django.db import connection
+from django.db.models import F, Func, Value, Subquery, OuterRef
+
+# products are matched on model numbers and names, which shouldn't be stemmed
+SEARCH_CONFIG = 'simple'
+
+
+@functools.lru_cache(maxsize=None)
+def trigram_available() -> bool:
+    """
+    Whether the pg_trgm extension is installed, for fuzzy matching of model numbers.
+    It's created by migration where the database server provides it, otherwise search only matches by prefix.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search_query(text: str) -> Optional[SearchQuery]:
+    """A full text query matching documents containing words starting with each word in text, or None if it has no words."""
+    words: List[str] = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f"{word}:*" for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def product_search_vector() -> CombinedSearchVector:
+    """
+    The search document of a product, for updating its search_vector.
+    Models are weighted above brand names, which are weighted above category names.
+    """
+    from cms.models import Brand, Category
+    return SearchVector('model', Func(F('alternate_models'), Value(' '), function='array_to_string'), weight='A', config=SEARCH_CONFIG) + \
+        SearchVector(Subquery(Brand.objects.filter(pk=OuterRef('brand_id')).values('name')), weight='B', config=SEARCH_CONFIG) + \
+        SearchVector(Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')), weight='C', config=SEARCH_CONFIG)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_celery_beat',
     'django_celery_results',
     'django_extensions',
@@ -213,10 +214,37 @@ DEBUG_TOOLBAR_CONFIG = {
     'SHOW_TOOLBAR_CALLBACK': lambda _request: DEBUG
 }
 
-CACHE_DURATION = 60 * 5
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+CACHE_DURATION = int(os.environ.get('CACHE_DURATION', 60 * 5))
+# computed reports are cached under keys that include a data version, so can be kept for longer
+CACHE_DURATION_REPORTS = 60 * 60 * 24
+# after a crawl, dashboards are recomputed this many at a time, along with this many of the most viewed products
+CACHE_WARMUP_CONCURRENCY = 4
+CACHE_WARMUP_PRODUCTS = 50
+# gap analysis snapshots still in progress after this many seconds are assumed to be abandoned
+SNAPSHOT_TIMEOUT = 60 * 60
+
+# only one process recomputes an expired cache entry, its lock expiring after CACHE_LOCK_TIMEOUT seconds in case it fails
+# processes with nothing cached to serve meanwhile wait this many seconds for it before computing it themselves
+CACHE_LOCK_TIMEOUT = 60 * 10
+CACHE_LOCK_WAIT = 10
+CACHE_LOCK_POLL_INTERVAL = 0.1
+
+# memcached is shared by all web and celery workers, tests and local development use a per process cache
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ.get('MEMCACHED_LOCATION').split(','),
+            'KEY_PREFIX': 'specr',
+            'TIMEOUT': CACHE_DURATION,
+            # computed reports can be larger than memcached's default 1mb item size, memcached must be started with a matching -I
+            'OPTIONS': {'server_max_value_length': 1024 * 1024 * 16},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': CACHE_DURATION,
+        }
     }
-}
@@ -1,3 +1,16 @@
 $(document).ready(function() {
-   $('input[data-inputtype="tag"]').amsifySuggestags({});
+   $('input[data-inputtype="tag"]').not('[data-suggestions-url]').amsifySuggestags({});
+   // suggestions are loaded for the attribute selected in the input's attribute field
+   $('input[data-inputtype="tag"][data-suggestions-url]').each(function () {
+      var input = $(this);
+      input.amsifySuggestags({
+         suggestionsAction: {
+            url: input.data('suggestions-url'),
+            minChars: 1,
+            beforeSend: function (xhr, settings) {
+               settings.url += '&' + $.param({attribute_type: $('#' + input.data('attribute-field')).val() || ''});
+            },
+         },
+      });
+   });
 });
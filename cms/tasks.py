@@ -1,9 +1,56 @@
-from typing import List
+from typing import List, Optional
 
 from celery import shared_task
 from django.core.mail import send_mail
+from django.db import transaction
+
+from cms.models import Category, ProductScore, AttributeValue
 
 
 @shared_task
 def send_email(subject: str, message: str, to: List[str], from_addr: str = "info@specr.ie"):
     send_mail(subject, message, from_addr, to, fail_silently=False)
+
+
+@shared_task
+def update_product_scores(category_id: int):
+    category: Optional[Category] = Category.objects.filter(pk=category_id).first()
+    if category:
+        ProductScore.objects.update_category_scores(category)
+
+
+def queue_product_scores_update(category_id: int) -> None:
+    """Queues the category's product scores to be recomputed once the current transaction commits."""
+    transaction.on_commit(lambda: update_product_scores.delay(category_id))
+
+
+@shared_task
+def update_all_product_scores():
+    for category in Category.objects.filter(category_attribute_configs__isnull=False).distinct():
+        ProductScore.objects.update_category_scores(category)
+
+
+@shared_task
+def detect_duplicate_products(category_id: Optional[int] = None):
+    """Queues likely duplicate products in the category for review, or in every category if none is given."""
+    from cms.duplicates import find_duplicate_candidates
+    categories = Category.objects.all() if category_id is None else Category.objects.filter(pk=category_id)
+    for category in categories:
+        find_duplicate_candidates(category)
+
+
+def queue_duplicate_detection(category_id: int) -> None:
+    """Queues duplicate detection for the category once the current transaction commits."""
+    transaction.on_commit(lambda: detect_duplicate_products.delay(category_id))
+
+
+@shared_task
+def merge_approved_duplicates():
+    from cms.duplicates import merge_approved_candidates
+    merge_approved_candidates()
+
+
+@shared_task
+def rebuild_attribute_values():
+    """Recounts the attribute value index, correcting counts drifted by re-scraped and deleted attributes."""
+    AttributeValue.objects.rebuild()
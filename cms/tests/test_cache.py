@@ -0,0 +1,98 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from cms.cache import get_data_version, bump_data_version, hashed_cache_key, namespaced_cache_key, get_or_compute, \
+    set_cached, CachedValue
+
+
+class TestCache(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+
+    def test_data_version(self):
+        version: int = get_data_version(1)
+        self.assertEqual(get_data_version(1), version)
+        with self.subTest("bump"):
+            bump_data_version(1)
+            self.assertNotEqual(get_data_version(1), version)
+        with self.subTest("categories are versioned separately"):
+            version_2: int = get_data_version(2)
+            bump_data_version(1)
+            self.assertEqual(get_data_version(2), version_2)
+        with self.subTest("evicted version"):
+            version = get_data_version(1)
+            cache.clear()
+            self.assertNotEqual(get_data_version(1), version)
+
+    def test_hashed_cache_key(self):
+        self.assertEqual(hashed_cache_key('test', {'a': 1, 'b': [1, 2]}), hashed_cache_key('test', {'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(hashed_cache_key('test', {'a': 1}), hashed_cache_key('test', {'a': 2}))
+        self.assertTrue(hashed_cache_key('test', {'a': 1}).startswith('test:'))
+
+    def test_namespaced_cache_key(self):
+        key: str = namespaced_cache_key('test', {'a': 1}, category_id=2)
+        self.assertEqual(namespaced_cache_key('test', {'a': 1}, category_id=2), key)
+        self.assertTrue(key.startswith('test:category:2:'))
+        with self.subTest("categories"):
+            self.assertNotEqual(namespaced_cache_key('test', {'a': 1}, category_id=3), key)
+        with self.subTest("data version"):
+            bump_data_version(2)
+            self.assertNotEqual(namespaced_cache_key('test', {'a': 1}, category_id=2), key)
+
+    def test_get_or_compute(self):
+        calls = []
+
+        def compute():
+            calls.append(True)
+            return len(calls)
+
+        with self.subTest("miss"):
+            self.assertEqual(get_or_compute('test', compute, 60), 1)
+        with self.subTest("fresh"):
+            self.assertEqual(get_or_compute('test', compute, 60), 1)
+            self.assertEqual(len(calls), 1)
+        with self.subTest("stale"):
+            cache.set('test', CachedValue(1, time.time() - 1))
+            self.assertEqual(get_or_compute('test', compute, 60), 2)
+        with self.subTest("stale while another process recomputes"):
+            cache.set('test', CachedValue(2, time.time() - 1))
+            cache.add('lock:test', True)
+            self.assertEqual(get_or_compute('test', compute, 60), 2)
+            self.assertEqual(len(calls), 2)
+        with self.subTest("cold cache while another process computes"), override_settings(CACHE_LOCK_POLL_INTERVAL=0.01):
+            cache.delete('test')
+
+            def other_process_computes(seconds):
+                # the other process caches its value a few polls in
+                if len(polls) == 3:
+                    set_cached('test', 10, 60)
+                polls.append(seconds)
+
+            polls = []
+            with mock.patch('cms.cache.time.sleep', side_effect=other_process_computes):
+                self.assertEqual(get_or_compute('test', compute, 60), 10)
+            self.assertEqual(len(calls), 2)
+        with self.subTest("cold cache after the other process fails"), override_settings(CACHE_LOCK_POLL_INTERVAL=0.01):
+            cache.delete('test')
+            with mock.patch('cms.cache.time.sleep', side_effect=lambda seconds: cache.delete('lock:test')):
+                self.assertEqual(get_or_compute('test', compute, 60), 3)
+            self.assertFalse(cache.get('lock:test'))
+        with self.subTest("cold cache while a failed process still holds the lock"), override_settings(CACHE_LOCK_WAIT=1, CACHE_LOCK_POLL_INTERVAL=0.1):
+            cache.delete('test')
+            cache.add('lock:test', True)
+            with mock.patch('cms.cache.time.sleep') as sleep:
+                self.assertEqual(get_or_compute('test', compute, 60), 4)
+            self.assertEqual(sleep.call_count, 10)
+            self.assertEqual(get_or_compute('test', compute, 60), 4)
+
+    def test_set_cached(self):
+        set_cached('test', [1, 2], 60)
+        cached: CachedValue = cache.get('test')
+        self.assertEqual(cached.value, [1, 2])
+        self.assertAlmostEqual(cached.stale_at, time.time() + 60, delta=5)
+        self.assertEqual(get_or_compute('test', list), [1, 2])
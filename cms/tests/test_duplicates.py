@@ -0,0 +1,98 @@
+from django.test import TestCase
+from model_mommy import mommy
+
+from cms.constants import DUPLICATE_APPROVED, DUPLICATE_PENDING, DUPLICATE_MERGED, DUPLICATE_REJECTED, MAIN
+from cms.duplicates import normalise_model, model_similarity, find_duplicate_candidates, merge_products, \
+    merge_approved_candidates
+from cms.models import Category, Brand, Product, AttributeType, ProductAttribute, WebsiteProductAttribute, \
+    DuplicateCandidate, ProductImage
+
+
+class TestDuplicates(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category: Category = mommy.make(Category, name="washing machines")
+        cls.brand: Brand = mommy.make(Brand, name="samsung")
+        cls.other_brand: Brand = mommy.make(Brand, name="lg")
+        cls.capacity: AttributeType = mommy.make(AttributeType, name="capacity", category=cls.category)
+
+    def make_product(self, model: str, brand: Brand, capacity=None) -> Product:
+        product: Product = mommy.make(Product, model=model, brand=brand, category=self.category)
+        if capacity is not None:
+            mommy.make(ProductAttribute, product=product, attribute_type=self.capacity, data=dict(value=capacity))
+        return product
+
+    def test_normalise_model(self):
+        self.assertEqual(normalise_model("WW80T554DAW/S1"), "ww80t554daws1")
+        self.assertEqual(normalise_model(" ww80t 554-daw "), "ww80t554daw")
+
+    def test_model_similarity(self):
+        similarity = model_similarity(["WW80T554DAW", "ww80t554daw", "WW80T554DAW/EU", "F4V310WSE"])
+        self.assertAlmostEqual(similarity[0, 1], 1)
+        self.assertGreater(similarity[0, 2], 0.8)
+        self.assertLess(similarity[0, 3], 0.3)
+        self.assertEqual(similarity.shape, (4, 4))
+
+    def test_find_duplicate_candidates(self):
+        product: Product = self.make_product("WW80T554DAW", self.brand, 8)
+        duplicate: Product = self.make_product("WW80T554DAW/EU", self.brand, 8)
+        self.make_product("WW90T554DAW", self.brand, 9)
+        self.make_product("WW80T554DAW-LG", self.other_brand, 8)
+
+        self.assertEqual(find_duplicate_candidates(self.category), 1)
+        candidate: DuplicateCandidate = DuplicateCandidate.objects.get()
+        self.assertEqual((candidate.product, candidate.duplicate), (product, duplicate))
+        self.assertEqual(candidate.spec_agreement, 1)
+        self.assertEqual(candidate.status, DUPLICATE_PENDING)
+
+        with self.subTest("decided candidates are kept"):
+            DuplicateCandidate.objects.update(status=DUPLICATE_REJECTED)
+            self.assertEqual(find_duplicate_candidates(self.category), 0)
+            self.assertEqual(DuplicateCandidate.objects.get().status, DUPLICATE_REJECTED)
+
+    def test_merge_products(self):
+        product: Product = self.make_product("WW80T554DAW", self.brand, 8)
+        duplicate: Product = self.make_product("WW80T554DAW/EU", self.brand, 9)
+        chained: Product = self.make_product("WW80T554DAW/UK", self.brand)
+        missing_attribute: ProductAttribute = mommy.make(ProductAttribute, product=chained, data=dict(value=1))
+        website_attribute: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, product=duplicate)
+        image: ProductImage = ProductImage.objects.create(product=chained, image_type=MAIN)
+
+        merged = merge_products({duplicate.pk: product.pk, chained.pk: duplicate.pk})
+
+        self.assertEqual(merged, [product])
+        self.assertFalse(Product.objects.filter(pk__in=[duplicate.pk, chained.pk]).exists())
+        product.refresh_from_db()
+        self.assertEqual(sorted(product.alternate_models), ["WW80T554DAW/EU", "WW80T554DAW/UK"])
+        self.assertEqual(product.productattributes.get(attribute_type=self.capacity).data["value"], 8)
+        self.assertEqual(ProductAttribute.objects.get(pk=missing_attribute.pk).product, product)
+        self.assertEqual(WebsiteProductAttribute.objects.get(pk=website_attribute.pk).product, product)
+        self.assertEqual(ProductImage.objects.get(pk=image.pk).product, product)
+
+    def test_merge_approved_candidates(self):
+        product: Product = self.make_product("WW80T554DAW", self.brand)
+        other_product: Product = self.make_product("WW80T554DAW/S1", self.brand)
+        duplicate: Product = self.make_product("WW80T554DAW/EU", self.brand)
+        chained: Product = self.make_product("WW80T554DAW/UK", self.brand)
+        best: DuplicateCandidate = mommy.make(DuplicateCandidate, product=product, duplicate=duplicate, category=self.category, score=0.9, status=DUPLICATE_APPROVED)
+        worse: DuplicateCandidate = mommy.make(DuplicateCandidate, product=other_product, duplicate=duplicate, category=self.category, score=0.8, status=DUPLICATE_APPROVED)
+        of_duplicate: DuplicateCandidate = mommy.make(DuplicateCandidate, product=duplicate, duplicate=chained, category=self.category, score=0.7, status=DUPLICATE_APPROVED)
+
+        self.assertEqual(merge_approved_candidates(batch_size=1), 3)
+
+        with self.subTest("approvals of merged products are kept"):
+            # the duplicate's candidates followed it into the products it was merged into
+            self.assertEqual(DuplicateCandidate.objects.get(pk=worse.pk).duplicate, other_product)
+            self.assertEqual(
+                set(DuplicateCandidate.objects.filter(pk__in=[best.pk, worse.pk, of_duplicate.pk]).values_list('status', flat=True)),
+                {DUPLICATE_MERGED},
+            )
+            self.assertEqual(list(Product.objects.filter(brand=self.brand)), [other_product])
+            self.assertEqual(sorted(Product.objects.get(pk=other_product.pk).alternate_models), ["WW80T554DAW", "WW80T554DAW/EU", "WW80T554DAW/UK"])
+
+        with self.subTest("products deleted some other way"):
+            orphan: DuplicateCandidate = mommy.make(DuplicateCandidate, product=other_product, duplicate=self.make_product("WW90", self.brand), category=self.category, score=0.9, status=DUPLICATE_APPROVED)
+            orphan.duplicate.delete()
+            self.assertEqual(merge_approved_candidates(), 0)
+            self.assertEqual(DuplicateCandidate.objects.get(pk=orphan.pk).status, DUPLICATE_REJECTED)
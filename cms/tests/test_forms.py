@@ -1,11 +1,14 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from model_mommy import mommy
 
-from cms.constants import MAIN, THUMBNAIL
+from cms.constants import MAIN, THUMBNAIL, CHANGE_BRAND_SET
 from cms.form_widgets import FloatInput
 from cms.models import Category, Product, ProductAttribute, Website, WebsiteProductAttribute, AttributeType, \
-    ProductImage, Unit
-from cms.forms import ProductMergeForm, AttributeTypeMergeForm, AttributeTypeForm, AttributeTypeUnitConversionForm
+    ProductImage, Unit, ProductAlias, AttributeTypeAlias, ChangeEvent, Brand
+from cms.forms import ProductMergeForm, AttributeTypeMergeForm, AttributeTypeForm, AttributeTypeUnitConversionForm, \
+    get_product_attribute_formset, get_product_brand_formset, ProductBrandPrefixForm, MissingProductAttributeForm
 from cms.utils import get_dotted_path
 
 
@@ -42,6 +45,7 @@ class TestForms(TestCase):
         self.assertEqual(WebsiteProductAttribute.objects.get(pk=prod_web_attr.pk).product, self.product)
         self.assertEqual(ProductImage.objects.get(pk=main_image.pk).product, self.product)
         self.assertEqual(ProductImage.objects.get(pk=thumb_image.pk).product, self.product)
+        self.assertEqual(ProductAlias.objects.resolve(["duplicate"], self.product.category), {"duplicate": self.product.pk})
 
     def test_attribute_type_merge_form(self):
         duplicate: AttributeType = mommy.make(AttributeType, name="duplicate attr", unit__name="kg", alternate_names=["test alternate name"])
@@ -59,6 +63,8 @@ class TestForms(TestCase):
         self.assertEqual(ProductAttribute.objects.get(pk=product_attr__mapped.pk).attribute_type, self.attribute)
         self.assertIsNotNone(AttributeType.objects.get(pk=self.attribute.pk).unit)
         self.assertEqual(WebsiteProductAttribute.objects.get(pk=web_attr__mapped.pk).attribute_type, self.attribute)
+        self.assertEqual(AttributeTypeAlias.objects.resolve(["duplicate attr", "test alternate name"], self.attribute.category),
+                         {"duplicate attr": self.attribute.pk, "test alternate name": self.attribute.pk})
 
     def test_attribute_type_form(self):
         form: AttributeTypeForm = AttributeTypeForm({'name': 'test', 'unit': self.gram, 'alternate_names': []})
@@ -107,3 +113,62 @@ class TestForms(TestCase):
                 form.save()
             self.assertIn("'test' is not defined in the unit registry", str(context.exception))
             self.assertTrue(ProductAttribute.objects.filter(attribute_type=attribute_type, attribute_type__unit=self.gram, data__value='test'))
+
+    def test_product_attribute_formset(self):
+        products = mommy.make(Product, category=self.category, _quantity=3)
+        attribute_type: AttributeType = mommy.make(AttributeType, name="capacity", unit=self.gram)
+        initial = [{'product': product, 'attribute_type': attribute_type} for product in products]
+        data = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 0, 'form-0-data': "8.0", 'form-1-data': "9"}
+        formset = get_product_attribute_formset(extra=3)(data, initial=initial, queryset=ProductAttribute.objects.none())
+        self.assertTrue(formset.is_valid(), msg=formset.errors)
+        with CaptureQueriesContext(connection) as queries:
+            formset.save()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT INTO "cms_productattribute"')]), 1)
+        self.assertEqual(
+            list(ProductAttribute.objects.filter(attribute_type=attribute_type).order_by('product').values_list('product', 'data')),
+            [(products[0].pk, {'value': 8.0}), (products[1].pk, {'value': 9.0})],
+        )
+        self.assertEqual(ChangeEvent.objects.filter(attribute_type=attribute_type).count(), 2)
+
+    def test_missing_product_attribute_formset(self):
+        products = mommy.make(Product, category=self.category, _quantity=2)
+        attribute_type: AttributeType = mommy.make(AttributeType, name="capacity", unit=self.gram)
+        initial = [{'product': product, 'attribute_type': attribute_type} for product in products]
+        data = {
+            'form-TOTAL_FORMS': 2, 'form-INITIAL_FORMS': 0,
+            'form-0-data': "8.0", 'form-0-product_pk': products[0].pk, 'form-0-attribute_type_pk': attribute_type.pk,
+            'form-1-product_pk': products[1].pk, 'form-1-attribute_type_pk': attribute_type.pk,
+        }
+        ProductAttributeFormSet = get_product_attribute_formset(extra=2, form=MissingProductAttributeForm)
+        with self.subTest("rows as shown"):
+            self.assertTrue(ProductAttributeFormSet(data, initial=initial, queryset=ProductAttribute.objects.none()).is_valid())
+        with self.subTest("rows changed since the page was shown"):
+            formset = ProductAttributeFormSet(data, initial=list(reversed(initial)), queryset=ProductAttribute.objects.none())
+            self.assertFalse(formset.is_valid())
+            self.assertTrue(formset.forms[0].non_field_errors())
+            # rows left empty aren't checked
+            self.assertFalse(formset.forms[1].errors)
+
+    def test_product_brand_formset(self):
+        brand: Brand = mommy.make(Brand, name="samsung")
+        products = mommy.make(Product, category=self.category, _quantity=3)
+        data = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 3, 'form-0-brand': brand.pk, 'form-1-brand': brand.pk}
+        for index, product in enumerate(products):
+            data[f'form-{index}-id'] = product.pk
+        formset = get_product_brand_formset()(data, queryset=Product.objects.filter(pk__in=[product.pk for product in products]))
+        self.assertTrue(formset.is_valid(), msg=formset.errors)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(formset.save(), products[:2])
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "cms_product"')]), 1)
+        self.assertEqual(list(Product.objects.filter(brand=brand).order_by('pk')), products[:2])
+
+    def test_product_brand_prefix_form(self):
+        brand: Brand = mommy.make(Brand, name="samsung")
+        matching = [mommy.make(Product, model=model, category=self.category) for model in ["WW80T554", "ww90T554"]]
+        mommy.make(Product, model="F4V310", category=self.category)
+        form = ProductBrandPrefixForm(dict(prefix="ww", brand=brand.pk), queryset=Product.objects.filter(brand__isnull=True))
+        self.assertTrue(form.is_valid(), msg=form.errors)
+        self.assertEqual(form.save(), 2)
+        self.assertEqual(list(Product.objects.filter(brand=brand).order_by('pk')), matching)
+        self.assertEqual(ChangeEvent.objects.filter(event_type=CHANGE_BRAND_SET).count(), 2)
+        self.assertEqual(Product.objects.filter(brand=brand).search("samsung").count(), 2)
@@ -4,15 +4,20 @@ from typing import Iterable
 
 from django import forms
 from django.test import TestCase
+from django.utils import timezone
 from model_mommy import mommy
-from pandas import DataFrame
+from pandas import DataFrame, Series
 from pint import UndefinedUnitError
 
-from cms.constants import MAIN, THUMBNAIL, WEEKLY, MONTHLY, YEARLY, ENERGY_LABEL_IMAGE
+from cms.accounts.models import Company
+from cms.constants import MAIN, THUMBNAIL, WEEKLY, MONTHLY, YEARLY, ENERGY_LABEL_IMAGE, SCORING_NUMERICAL_HIGHER, \
+    SCORING_NUMERICAL_LOWER, SCORING_BOOL_TRUE, SCORING_BOOL_FALSE, CHANGE_PRODUCT_CREATED, CHANGE_ATTRIBUTE_ADDED, \
+    CHANGE_PRICE_CHANGED, CHANGE_BRAND_SET, FACET_BRAND, FACET_CATEGORY, FACET_PRICE, FACET_WEBSITE, Facet
 from cms.form_widgets import FloatInput
 from cms.serializers import serializers
 from cms.models import Product, ProductAttribute, WebsiteProductAttribute, json_data_default, Unit, AttributeType, \
-    Website, Category, ProductImage, WebsiteProductAttributeQuerySet, EprelCategory, Brand
+    Website, Category, ProductImage, WebsiteProductAttributeQuerySet, EprelCategory, Brand, CategoryAttributeConfig, \
+    ProductScore, ChangeEvent, ChangeEventConsumer, ProductAlias, AttributeTypeAlias, AttributeValue
 from cms.utils import get_dotted_path
 
 
@@ -77,6 +82,40 @@ class TestModels(TestCase):
         self.assertEqual(product_created, product_retrieved)
         self.assertEqual(Product.objects.count(), 1)
 
+    def test_product_aliases(self):
+        washers: Category = mommy.make(Category)
+        dryers: Category = mommy.make(Category)
+        product: Product = mommy.make(Product, model="WW80T554DAW", alternate_models=["WW80T554DAW/S1", " "], category=washers)
+
+        with self.subTest("normalised"):
+            self.assertEqual(set(product.aliases.values_list('alias', flat=True)), {"ww80t554daw", "ww80t554daw/s1"})
+            self.assertEqual(Product.objects.custom_get_or_create("ww80t554daw/S1 ", washers), product)
+
+        with self.subTest("bulk resolve"):
+            other: Product = mommy.make(Product, model="WAN28281GB", category=washers)
+            with self.assertNumQueries(1):
+                resolved = ProductAlias.objects.resolve(["WW80T554DAW", "wan28281gb", "unknown"], washers)
+            self.assertEqual(resolved, {"WW80T554DAW": product.pk, "wan28281gb": other.pk})
+            self.assertEqual(ProductAlias.objects.resolve(["WW80T554DAW"], dryers), {})
+
+        with self.subTest("synced"):
+            product.alternate_models = ["WW80T554DAW/S2"]
+            product.category = dryers
+            product.save()
+            self.assertEqual(ProductAlias.objects.resolve(["WW80T554DAW", "WW80T554DAW/S1", "WW80T554DAW/S2"], dryers), {"WW80T554DAW": product.pk, "WW80T554DAW/S2": product.pk})
+            self.assertEqual(ProductAlias.objects.resolve(["WW80T554DAW"], washers), {})
+
+        with self.subTest("claimed by another product"):
+            other.alternate_models = ["WW80T554DAW"]
+            other.category = dryers
+            other.save()
+            self.assertEqual(ProductAlias.objects.resolve(["WW80T554DAW"], dryers), {"WW80T554DAW": product.pk})
+
+        with self.subTest("attribute types"):
+            load_size: AttributeType = mommy.make(AttributeType, name="Load Size", alternate_names=["capacity"], category=washers)
+            self.assertEqual(AttributeType.objects.resolve(["load  size", "Capacity", "noise"], washers), {"load  size": load_size, "Capacity": load_size})
+            self.assertEqual(AttributeTypeAlias.objects.resolve(["capacity"], None), {})
+
     def test_product_images_required(self):
         product: Product = mommy.make(Product)
         self.assertTrue(product.image_main_required)
@@ -100,6 +139,139 @@ class TestModels(TestCase):
         old_attrib.save()
         self.assertEqual(product.current_average_price, str(int(statistics.mean([299.99, 249.99]))))
 
+    def test_products_current_average_prices(self):
+        product: Product = mommy.make(Product)
+        product_2: Product = mommy.make(Product)
+        no_price: Product = mommy.make(Product)
+        attribute: AttributeType = mommy.make(AttributeType, name="price")
+        mommy.make(WebsiteProductAttribute, attribute_type=attribute, data={'value': 299.99}, product=product)
+        mommy.make(WebsiteProductAttribute, attribute_type=attribute, data={'value': 249.99}, product=product)
+        mommy.make(WebsiteProductAttribute, attribute_type=attribute, data={'value': 100}, product=product_2)
+        old_attrib: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, attribute_type=attribute, data={'value': 99.99}, product=product_2)
+        old_attrib.created = datetime.datetime.now() - datetime.timedelta(hours=24)
+        old_attrib.save()
+        with self.assertNumQueries(1):
+            prices = Product.objects.current_average_prices()
+        self.assertEqual(prices, {
+            product.pk: product.current_average_price_int,
+            product_2.pk: product_2.current_average_price_int,
+        })
+        self.assertNotIn(no_price.pk, prices)
+
+    def test_products_spec_values(self):
+        product: Product = mommy.make(Product)
+        product_2: Product = mommy.make(Product)
+        load_size: AttributeType = mommy.make(AttributeType, name="load size")
+        spin: AttributeType = mommy.make(AttributeType, name="spin")
+        mommy.make(ProductAttribute, product=product, attribute_type=load_size, data={'value': 7})
+        mommy.make(ProductAttribute, product=product, attribute_type=spin, data={'value': 1400})
+        mommy.make(ProductAttribute, product=product_2, attribute_type=load_size, data={'value': 8})
+        with self.assertNumQueries(1):
+            spec_values: DataFrame = Product.objects.spec_values([load_size.pk, spin.pk])
+        self.assertEqual(spec_values.loc[product.pk, load_size.pk], 7)
+        self.assertIsInstance(spec_values.loc[product.pk, load_size.pk], int)
+        self.assertEqual(spec_values.loc[product.pk, spin.pk], 1400)
+        self.assertEqual(spec_values.loc[product_2.pk, load_size.pk], 8)
+        self.assertTrue(spec_values.isna().loc[product_2.pk, spin.pk])
+
+    def test_category_attribute_config_score_values(self):
+        values: Series = Series([1200, 1400, 1600, None])
+        with self.subTest("higher"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_NUMERICAL_HIGHER)
+            self.assertEqual(config.score_values(values, 1400).tolist(), [False, True, True, False])
+        with self.subTest("lower"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_NUMERICAL_LOWER)
+            self.assertEqual(config.score_values(values, 1400).tolist(), [True, True, False, False])
+            self.assertEqual(config.score_values(Series(["A", "C", "D", 1]), "C").tolist(), [True, True, False, False])
+        with self.subTest("bool true"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_BOOL_TRUE)
+            self.assertEqual(config.score_values(Series([True, False, None]), True).tolist(), [True, False, False])
+        with self.subTest("bool false"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_BOOL_FALSE)
+            self.assertEqual(config.score_values(Series([True, False, None]), True).tolist(), [False, True, False])
+
+    def test_category_attribute_config_normalise_values(self):
+        values: Series = Series([1200, 1400, 1600, None, "n/a"])
+        with self.subTest("higher"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_NUMERICAL_HIGHER)
+            self.assertEqual(config.normalise_values(values).tolist(), [0, 0.5, 1, 0, 0])
+            self.assertEqual(config.normalise_values(Series([5, 5, None])).tolist(), [1, 1, 0])
+        with self.subTest("lower"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_NUMERICAL_LOWER)
+            self.assertEqual(config.normalise_values(values).tolist(), [1, 0.5, 0, 0, 0])
+        with self.subTest("bool true"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_BOOL_TRUE)
+            self.assertEqual(config.normalise_values(Series([True, False, None])).tolist(), [1, 0, 0])
+        with self.subTest("bool false"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=SCORING_BOOL_FALSE)
+            self.assertEqual(config.normalise_values(Series([True, False, None])).tolist(), [0, 1, 0])
+        with self.subTest("no scoring"):
+            config: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, scoring=None)
+            self.assertEqual(config.normalise_values(values).tolist(), [0] * 5)
+
+    def test_product_scores(self):
+        category: Category = mommy.make(Category)
+        load_size: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, category=category, scoring=SCORING_NUMERICAL_HIGHER, weight=3)
+        energy: CategoryAttributeConfig = mommy.make(CategoryAttributeConfig, category=category, scoring=SCORING_NUMERICAL_LOWER, weight=1)
+        p1: Product = mommy.make(Product, category=category)
+        p2: Product = mommy.make(Product, category=category)
+        p3: Product = mommy.make(Product, category=category)
+        other_category: Product = mommy.make(Product)
+        for product, load_size_value, energy_value in [(p1, 10, 100), (p2, 8, 50), (p3, 6, 75)]:
+            mommy.make(ProductAttribute, product=product, attribute_type=load_size.attribute_type, data={'value': load_size_value})
+            mommy.make(ProductAttribute, product=product, attribute_type=energy.attribute_type, data={'value': energy_value})
+        ProductScore.objects.update_category_scores(category)
+
+        with self.subTest("weighted scores"):
+            scores = dict(ProductScore.objects.filter(company=None).values_list('product_id', 'score'))
+            self.assertEqual(scores, {p1.pk: 75, p2.pk: 62.5, p3.pk: 12.5})
+
+        with self.subTest("sort in sql"):
+            products = Product.objects.filter(category=category).with_scores().order_by('-score')
+            self.assertEqual(list(products), [p1, p2, p3])
+            self.assertIsNone(Product.objects.with_scores().get(pk=other_category.pk).score)
+
+        with self.subTest("only changed scores written"):
+            ProductAttribute.objects.filter(product=p3, attribute_type=energy.attribute_type).update(data={'value': 50})
+            with self.assertNumQueries(8):
+                ProductScore.objects.update_scores(category)
+            self.assertEqual(ProductScore.objects.get(product=p3, company=None).score, 25)
+
+        with self.subTest("company configs"):
+            company: Company = mommy.make(Company)
+            mommy.make(CategoryAttributeConfig, category=category, attribute_type=energy.attribute_type, scoring=SCORING_NUMERICAL_LOWER, weight=1, company=company)
+            ProductScore.objects.update_category_scores(category)
+            products = Product.objects.filter(category=category).with_scores(company)
+            self.assertEqual({product.pk: product.score for product in products}, {p1.pk: 0, p2.pk: 100, p3.pk: 100})
+            other_company: Company = mommy.make(Company)
+            products = Product.objects.filter(category=category).with_scores(other_company)
+            self.assertEqual({product.pk: product.score for product in products}, {p1.pk: 75, p2.pk: 62.5, p3.pk: 25})
+
+        with self.subTest("products leaving the category"):
+            p3.category = None
+            p3.save()
+            ProductScore.objects.update_category_scores(category)
+            self.assertFalse(ProductScore.objects.filter(product=p3).exists())
+
+    def test_products_for_listing(self):
+        price_attr: AttributeType = mommy.make(AttributeType, name='price')
+        product: Product = mommy.make(Product, brand=mommy.make(Brand), category=mommy.make(Category))
+        mommy.make(WebsiteProductAttribute, product=product, attribute_type=price_attr, data={'value': 100})
+        mommy.make(WebsiteProductAttribute, product=product, attribute_type=price_attr, data={'value': 150.99})
+        mommy.make(ProductImage, product=product, image_type=THUMBNAIL, image='product_images/thumb.jpg')
+        no_data: Product = mommy.make(Product)
+        current_average_price_int, image_thumb = product.current_average_price_int, product.image_thumb
+        with self.assertNumQueries(1):
+            products = {listed.pk: listed for listed in Product.objects.for_listing()}
+            listed: Product = products[product.pk]
+            self.assertEqual(listed.current_average_price_int, current_average_price_int)
+            self.assertEqual(listed.current_average_price, "125")
+            self.assertEqual(listed.image_thumb, image_thumb)
+            self.assertEqual(listed.brand, product.brand)
+            self.assertEqual(listed.category, product.category)
+            self.assertIsNone(products[no_data.pk].current_average_price_int)
+            self.assertIsNone(products[no_data.pk].image_thumb)
+
     def test_product_price_history(self):
         product: Product = mommy.make(Product)
         # today's prices
@@ -147,6 +319,74 @@ class TestModels(TestCase):
             self.assertEqual(price_history[datetime.datetime.now().year], 125.0)
             self.assertEqual(price_history[last_year.year], 75)
 
+    def test_product_price_series(self):
+        product: Product = mommy.make(Product)
+        price_attribute: AttributeType = mommy.make(AttributeType, name='price')
+        now: datetime.datetime = timezone.now()
+        for value, days_ago in [(100, 0), (150, 0), (80, 2), (70, 10)]:
+            price: WebsiteProductAttribute = mommy.make(WebsiteProductAttribute, product=product, data={'value': value}, attribute_type=price_attribute)
+            WebsiteProductAttribute.objects.filter(pk=price.pk).update(created=now - datetime.timedelta(days=days_ago))
+        mommy.make(WebsiteProductAttribute, product=product, data={'value': 1})
+        df: DataFrame = product.price_series(now - datetime.timedelta(days=7), now)
+        self.assertEqual(list(df.columns), ['created', 'price'])
+        self.assertEqual(list(df['price']), [80, 125])
+        self.assertTrue(product.price_series(now - datetime.timedelta(days=30), now - datetime.timedelta(days=20)).empty)
+
+    def test_product_search(self):
+        washers: Category = mommy.make(Category, name="washing machines")
+        dryers: Category = mommy.make(Category, name="dryers")
+        samsung: Brand = mommy.make(Brand, name="samsung")
+        washer: Product = mommy.make(Product, model="WW80T554DAW", alternate_models=["WW80T554DAW-S1"], category=washers, brand=samsung)
+        dryer: Product = mommy.make(Product, model="DV90T5240AW", category=dryers, brand=samsung)
+        other: Product = mommy.make(Product, model="WAN28281GB", category=washers)
+
+        for text, expected in [
+            ("WW80T554DAW", [washer]),
+            ("ww80", [washer]),
+            ("s1", [washer]),
+            ("samsung", [washer, dryer]),
+            ("wash", [washer, other]),
+            ("samsung dry", [dryer]),
+            ("bosch", []),
+        ]:
+            with self.subTest(text):
+                self.assertEqual(set(Product.objects.search(text)), set(expected))
+
+        with self.subTest("ranked by weight"):
+            # the model matches in the product's own model, but only in the other's brand name
+            mommy.make(Product, model="dryer 1", brand=mommy.make(Brand, name="dv90"))
+            self.assertEqual(Product.objects.search("dv90").first(), dryer)
+
+        with self.subTest("no words"):
+            self.assertEqual(Product.objects.search("-").count(), Product.objects.count())
+
+        with self.subTest("brand renamed"):
+            samsung.name = "lg"
+            samsung.save()
+            self.assertEqual(set(Product.objects.search("lg")), {washer, dryer})
+
+    def test_product_facet_counts(self):
+        washers: Category = mommy.make(Category, name="washing machines")
+        dryers: Category = mommy.make(Category, name="dryers")
+        samsung: Brand = mommy.make(Brand, name="samsung")
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+        shop_1: Website = mommy.make(Website, name="shop 1")
+        shop_2: Website = mommy.make(Website, name="shop 2")
+        products = [
+            mommy.make(Product, category=washers, brand=samsung),
+            mommy.make(Product, category=washers, brand=samsung),
+            mommy.make(Product, category=dryers),
+        ]
+        for product, website, price in [(products[0], shop_1, 300), (products[0], shop_2, 320), (products[0], shop_2, 340), (products[1], shop_1, 600)]:
+            mommy.make(WebsiteProductAttribute, product=product, website=website, attribute_type=price_attr, data={'value': price})
+        with self.assertNumQueries(1):
+            facets = Product.objects.all().facet_counts()
+        self.assertEqual(facets[FACET_BRAND], [Facet(FACET_BRAND, samsung.pk, "samsung", 2)])
+        self.assertEqual(facets[FACET_CATEGORY], [Facet(FACET_CATEGORY, washers.pk, "washing machines", 2), Facet(FACET_CATEGORY, dryers.pk, "dryers", 1)])
+        self.assertEqual(facets[FACET_PRICE], [Facet(FACET_PRICE, 250, "€250 - €500", 1), Facet(FACET_PRICE, 500, "€500 - €750", 1)])
+        self.assertEqual(facets[FACET_WEBSITE], [Facet(FACET_WEBSITE, shop_1.pk, "shop 1", 2), Facet(FACET_WEBSITE, shop_2.pk, "shop 2", 1)])
+        self.assertEqual(Product.objects.filter(category=dryers).facet_counts()[FACET_WEBSITE], [])
+
     def test_custom_get_or_create__attribute_type(self):
         unit: Unit = mommy.make(Unit)
         category: Category = mommy.make(Category)
@@ -317,3 +557,126 @@ class TestModels(TestCase):
         searchable_names = list(searchable_names)
         self.assertIn("washers", searchable_names)
         self.assertIn("front loaders", searchable_names)
+
+    def test_change_events(self):
+        category: Category = mommy.make(Category)
+        website: Website = mommy.make(Website)
+        price_attr: AttributeType = mommy.make(AttributeType, name="price")
+
+        with self.subTest("ingestion"):
+            product: Product = Product.objects.custom_get_or_create("model", category)
+            ProductAttribute.objects.custom_get_or_create(product, mommy.make(AttributeType, category=category), "A")
+            for price in [100, 100, 120]:
+                website.create_product_attribute(product, price_attr, price)
+            product.update_brand("brand")
+            self.assertEqual(
+                list(ChangeEvent.objects.since(category.pk, 0).values_list('version', 'event_type')),
+                [(1, CHANGE_PRODUCT_CREATED), (2, CHANGE_ATTRIBUTE_ADDED), (3, CHANGE_PRICE_CHANGED), (4, CHANGE_PRICE_CHANGED), (5, CHANGE_BRAND_SET)],
+            )
+            self.assertEqual(ChangeEvent.objects.get(version=4).data, {'website': website.pk, 'previous_value': 100, 'value': 120})
+            self.assertEqual(ChangeEvent.objects.lock_version(category.pk), 5)
+
+        with self.subTest("no category"):
+            self.assertIsNone(ChangeEvent.objects.record(None, CHANGE_PRODUCT_CREATED))
+            self.assertEqual(ChangeEvent.objects.record_many(None, CHANGE_PRODUCT_CREATED, [dict(data={})]), [])
+
+        with self.subTest("many"):
+            events = ChangeEvent.objects.record_many(category.pk, CHANGE_BRAND_SET, [dict(product=product, data={'brand': 1}), dict(product=product, data={'brand': 2})])
+            self.assertEqual([event.version for event in events], [6, 7])
+            self.assertEqual(ChangeEvent.objects.lock_version(category.pk), 7)
+            ChangeEvent.objects.filter(version__gt=5).delete()
+
+        with self.subTest("consume"):
+            handled = []
+            self.assertEqual(ChangeEventConsumer.objects.consume("test", category.pk, handled.extend, batch_size=3), 3)
+            self.assertEqual(ChangeEventConsumer.objects.consume("test", category.pk, handled.extend, batch_size=3), 2)
+            self.assertEqual(ChangeEventConsumer.objects.consume("test", category.pk, handled.extend, batch_size=3), 0)
+            self.assertEqual([event.version for event in handled], [1, 2, 3, 4, 5])
+            self.assertEqual(ChangeEventConsumer.objects.get(name="test").version, 5)
+
+        with self.subTest("consumer not advanced when handler fails"):
+            Product.objects.custom_get_or_create("another model", category)
+
+            def failing_handler(events):
+                raise ValueError
+
+            with self.assertRaises(ValueError):
+                ChangeEventConsumer.objects.consume("test", category.pk, failing_handler)
+            self.assertEqual(ChangeEventConsumer.objects.get(name="test").version, 5)
+
+        with self.subTest("not versioned by category saves"):
+            stale: Category = Category.objects.get(pk=category.pk)
+            ChangeEvent.objects.record(category.pk, CHANGE_PRODUCT_CREATED)
+            stale.save()
+            self.assertEqual(ChangeEvent.objects.record(category.pk, CHANGE_PRODUCT_CREATED).version, 8)
+
+        with self.subTest("changed categories"):
+            other_category: Category = mommy.make(Category)
+            ChangeEvent.objects.record(other_category.pk, CHANGE_PRODUCT_CREATED)
+            self.assertEqual(ChangeEventConsumer.objects.changed_categories("rebuild"), [category.pk, other_category.pk])
+            self.assertEqual(ChangeEventConsumer.objects.changed_categories("rebuild"), [])
+            ChangeEvent.objects.record(category.pk, CHANGE_PRODUCT_CREATED)
+            self.assertEqual(ChangeEventConsumer.objects.changed_categories("rebuild"), [category.pk])
+            self.assertEqual(ChangeEventConsumer.objects.get(name="rebuild", category=category).version, 9)
+
+    def test_missing_product_attributes(self):
+        category: Category = mommy.make(Category, name="washing machines")
+        other_category: Category = mommy.make(Category, name="dishwashers")
+        capacity: AttributeType = mommy.make(AttributeType, name="capacity")
+        noise: AttributeType = mommy.make(AttributeType, name="noise")
+        complete: Product = mommy.make(Product, category=category)
+        incomplete: Product = mommy.make(Product, category=category)
+        mommy.make(Product, category=category, publish=False)
+        dishwasher: Product = mommy.make(Product, category=other_category)
+        mommy.make(ProductAttribute, product=complete, attribute_type=capacity)
+        mommy.make(ProductAttribute, product=complete, attribute_type=noise)
+        mommy.make(ProductAttribute, product=incomplete, attribute_type=noise)
+        mommy.make(CategoryAttributeConfig, category=category, attribute_type=capacity, company=None)
+        mommy.make(CategoryAttributeConfig, category=category, attribute_type=capacity, company=mommy.make(Company))
+        mommy.make(CategoryAttributeConfig, category=category, attribute_type=noise, company=None)
+        mommy.make(CategoryAttributeConfig, category=other_category, attribute_type=noise, company=None)
+
+        self.assertCountEqual(
+            CategoryAttributeConfig.objects.missing_product_attributes().values_list('product_id', 'attribute_type'),
+            [(incomplete.pk, capacity.pk), (dishwasher.pk, noise.pk)],
+        )
+        self.assertEqual(
+            list(CategoryAttributeConfig.objects.missing_product_attribute_counts()),
+            [
+                {'category': other_category.pk, 'category__name': "dishwashers", 'count': 1},
+                {'category': category.pk, 'category__name': "washing machines", 'count': 1},
+            ],
+        )
+
+    def test_attribute_values(self):
+        colour: AttributeType = mommy.make(AttributeType, name="colour")
+        website: Website = mommy.make(Website)
+        washers: Iterable[Product] = mommy.make(Product, _quantity=3)
+        mommy.make(ProductAttribute, product=washers[0], attribute_type=colour, data={"value": "white"})
+        mommy.make(ProductAttribute, product=washers[1], attribute_type=colour, data={"value": "white"})
+        mommy.make(ProductAttribute, product=washers[2], attribute_type=colour, data={"value": "black"})
+        mommy.make(ProductAttribute, product=washers[2], attribute_type=mommy.make(AttributeType), data={"value": 8})
+        mommy.make(WebsiteProductAttribute, product=washers[2], website=website, attribute_type=colour, data={"value": "white"})
+
+        with self.subTest("recorded on save"):
+            self.assertEqual(
+                list(AttributeValue.objects.order_by('value').values_list('attribute_type', 'value', 'product_count')),
+                [(colour.pk, "black", 1), (colour.pk, "white", 2)],
+            )
+        with self.subTest("recorded in bulk"):
+            ProductAttribute.objects.bulk_add([ProductAttribute(product=mommy.make(Product), attribute_type=colour, data={"value": "silver"})])
+            self.assertEqual(AttributeValue.objects.get(value="silver").product_count, 1)
+        with self.subTest("rebuild"):
+            ProductAttribute.objects.filter(data__value="black").delete()
+            AttributeValue.objects.rebuild([colour.pk])
+            self.assertEqual(
+                list(AttributeValue.objects.order_by('value').values_list('value', 'product_count')),
+                [("silver", 1), ("white", 3)],
+            )
+        with self.subTest("unknown"):
+            mommy.make(Brand, name="samsung")
+            with self.assertNumQueries(1):
+                self.assertEqual(AttributeValue.objects.unknown(colour, ["white", "samsung", "black", "red"]), ["black", "red"])
+        with self.subTest("suggest"):
+            self.assertEqual(list(AttributeValue.objects.suggest(colour.pk).values_list('value', flat=True)), ["white", "silver"])
+            self.assertEqual(list(AttributeValue.objects.suggest(colour.pk, "S").values_list('value', flat=True)), ["silver"])
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from model_mommy import mommy
+
+from cms.models import Product
+from cms.pagination import estimated_count, EstimatedCountPaginator
+
+
+class TestPagination(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        mommy.make(Product, _quantity=5)
+
+    def analyse(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Product._meta.db_table}")
+
+    def test_estimated_count(self):
+        with self.subTest("table"):
+            self.analyse()
+            self.assertEqual(estimated_count(Product.objects.all()), 5)
+        with self.subTest("filtered"):
+            self.assertIsInstance(estimated_count(Product.objects.filter(model__startswith="a")), int)
+
+    def test_estimated_count_paginator(self):
+        self.analyse()
+        with self.subTest("small tables are counted"):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('pk'), 2).count, 5)
+        with self.subTest("large tables are estimated"), mock.patch('cms.pagination.ESTIMATED_COUNT_THRESHOLD', 1), \
+                mock.patch('cms.pagination.estimated_count', return_value=1000000):
+            paginator: EstimatedCountPaginator = EstimatedCountPaginator(Product.objects.order_by('pk'), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 1000000)
+            self.assertEqual(paginator.num_pages, 500000)
@@ -9,9 +9,9 @@ from django.views.i18n import JavaScriptCatalog
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/v1/', include('cms.api.urls', namespace='api')),
     path('', include('cms.dashboard.urls', namespace='dashboard')),
     path('jsi18n/', JavaScriptCatalog.as_view(), name='javascript-catalog'),
-    path('api/v1/', include('cms.api.urls', namespace='api')),
     path('__debug__/', include(debug_toolbar.urls)),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='auth/login.html')),
     path('accounts/password_reset/', auth_views.PasswordResetView.as_view(template_name='auth/password_reset_form.html')),
@@ -71,6 +71,11 @@ def camel_case_to_sentence(string: str) -> str:
     return re.sub('([a-z]+)([A-Z])', r'\1 \2', string).lower()
 
 
+def normalise_alias(name: str) -> str:
+    """Normalises a model number or attribute label for matching: lowercase, with runs of whitespace collapsed."""
+    return re.sub(r'\s+', ' ', name).strip().lower()
+
+
 def filename_from_path(path: str) -> str:
     return path.split("/")[-1]
 
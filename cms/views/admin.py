@@ -1,17 +1,21 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Any
 
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
+from django.core.paginator import Paginator, Page
 from django.db import transaction
 from django.db.models import QuerySet
+from django.http import HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from django.views.generic import FormView
 
 from cms.forms import ProductMergeForm, AttributeTypeMergeForm, get_product_attribute_formset, \
-    AttributeTypeUnitConversionForm, get_product_brand_formset
-from cms.models import CategoryAttributeConfig, Product, ProductAttribute, AttributeType
+    AttributeTypeUnitConversionForm, get_product_brand_formset, ProductBrandPrefixForm, MissingProductAttributeForm
+from cms.models import CategoryAttributeConfig, Product, ProductAttribute, AttributeType, CategoryAttributeConfigQuerySet, \
+    BaseModel
 
 
 class MapViewMixin(SuccessMessageMixin, FormView):
@@ -44,38 +48,59 @@ class AttributeTypeMapView(MapViewMixin):
 
 
 class ProductAttributeBulkCreateView(SuccessMessageMixin, FormView):
-    template_name = 'site/simple_formset.html'
+    """
+    A worklist of the product attributes missing from products in categories configured to have them, a page at a time.
+    The worklist can be scoped to a single category with the category query parameter.
+    """
+    template_name = 'site/missing_product_attributes.html'
     success_message = _('Products attributes updated successfully')
+    paginate_by = 50
 
     def get_success_url(self):
-        return reverse('admin:map_product_attributes')
+        return f"{reverse('admin:map_product_attributes')}?{self.request.GET.urlencode()}"
+
+    @property
+    def category_id(self) -> Optional[str]:
+        category_id: str = self.request.GET.get('category', '')
+        return category_id if category_id.isdigit() else None
+
+    @cached_property
+    def page(self) -> Page:
+        configs: CategoryAttributeConfigQuerySet = CategoryAttributeConfig.objects.published()
+        if self.category_id:
+            configs = configs.filter(category_id=self.category_id)
+        missing_product_attributes = configs.missing_product_attributes()\
+            .select_related('category', 'attribute_type__unit')\
+            .order_by('category__name', 'attribute_type__name', 'product_id')
+        return Paginator(missing_product_attributes, self.paginate_by).get_page(self.request.GET.get('page'))
 
     def get_form(self, form_class=None):
         initial: List[dict] = self.get_initial_data()
-        ProductAttributeFormSet = get_product_attribute_formset(extra=len(initial))
+        ProductAttributeFormSet = get_product_attribute_formset(extra=len(initial), form=MissingProductAttributeForm)
         return ProductAttributeFormSet(self.request.POST or None, initial=initial, queryset=ProductAttribute.objects.none())
 
-    def get_initial_data(self):
-        """
-        Gets list of dicts for each product attribute required.
-        CategoryAttributeConfig is used to identify attributes required.
-        """
-        output_data: List[Dict[str, str, str]] = []
-        configs: QuerySet[CategoryAttributeConfig] = CategoryAttributeConfig.objects.published().order_by('category__name')
-        for config in configs.iterator():
-            output_data += [{'product': product, 'attribute_type': config.attribute_type} for product in
-                            Product.objects.published().exclude(productattributes__attribute_type=config.attribute_type)]
-        return output_data
+    def get_initial_data(self) -> List[Dict[str, Any]]:
+        """Gets a dict of the product and attribute type of each missing product attribute on the current page."""
+        configs: List[CategoryAttributeConfig] = list(self.page)
+        products: Dict[int, Product] = Product.objects.in_bulk([config.product_id for config in configs])
+        return [{'product': products[config.product_id], 'attribute_type': config.attribute_type} for config in configs]
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(formset=self.get_form(), **kwargs)
+        kwargs.setdefault('formset', self.get_form())
+        return super().get_context_data(
+            page_obj=self.page,
+            paginator=self.page.paginator,
+            category=self.category_id,
+            category_counts=CategoryAttributeConfig.objects.published().missing_product_attribute_counts(),
+            **kwargs
+        )
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
         formset = self.get_form()
         if not formset.is_valid():
             messages.error(request, _('There was an error processing product attributes'))
-            return render(request, self.template_name, {'formset': formset})
+            return render(request, self.template_name, self.get_context_data(formset=formset))
         formset.save()
         return self.form_valid(formset)
 
@@ -108,24 +133,82 @@ class AttributeTypeConversionView(SuccessMessageMixin, FormView):
         return self.form_valid(form)
 
 
-class ProductBrandBulkUpdateView(SuccessMessageMixin, FormView):
-    template_name = 'site/simple_formset.html'
-    success_message = _('Products brands updated successfully')
+class ChunkedBulkEditView(SuccessMessageMixin, FormView):
+    """
+    Edits a queryset with a model formset a chunk at a time, paging by primary key with the after query parameter,
+    so later chunks are as quick to load as the first and saved objects leaving the queryset don't shift the chunks after them.
+    The formset class should save with a bulk update, see BaseBulkUpdateFormSet.
+    Optionally, matching_form_class is a form changing every object in the queryset matching it with a single update.
+    """
+    template_name = 'site/chunked_formset.html'
+    queryset: QuerySet = None
+    formset_class = None
+    chunk_size = 100
+    matching_form_class = None
+    matching_form_prefix = 'matching'
+    matching_success_message = _('%(count)s objects updated successfully')
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.all()
 
-    def get_success_url(self):
-        return reverse('admin:map_product_brands')
+    @property
+    def after(self) -> int:
+        after: str = self.request.GET.get('after', '')
+        return int(after) if after.isdigit() else 0
 
     def get_form(self, form_class=None):
-        return get_product_brand_formset()(self.request.POST or None, queryset=Product.objects.published().filter(brand__isnull=True))
+        chunk: QuerySet = self.get_queryset().filter(pk__gt=self.after).order_by('pk')[:self.chunk_size]
+        data = None if self.is_matching_post else self.request.POST or None
+        return self.formset_class(data, queryset=chunk)
+
+    def get_matching_form(self):
+        if self.matching_form_class:
+            data = self.request.POST if self.is_matching_post else None
+            return self.matching_form_class(data, prefix=self.matching_form_prefix, queryset=self.get_queryset())
+
+    @property
+    def is_matching_post(self) -> bool:
+        return f"{self.matching_form_prefix}-submit" in self.request.POST
+
+    def get_success_url(self):
+        return self.request.get_full_path()
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(formset=self.get_form(), **kwargs)
+        kwargs.setdefault('formset', self.get_form())
+        kwargs.setdefault('form', kwargs['formset'])
+        kwargs.setdefault('matching_form', self.get_matching_form())
+        chunk: List[BaseModel] = list(kwargs['formset'].get_queryset())
+        return super().get_context_data(
+            matching_form_prefix=self.matching_form_prefix,
+            next_after=chunk[-1].pk if len(chunk) == self.chunk_size else None,
+            **kwargs
+        )
+
+    def formset_saved(self, objects: List[BaseModel]) -> None:
+        """Called with the objects changed once the formset is saved."""
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
+        if self.is_matching_post:
+            matching_form = self.get_matching_form()
+            if not matching_form.is_valid():
+                return render(request, self.template_name, self.get_context_data(matching_form=matching_form))
+            messages.success(request, self.matching_success_message % {'count': matching_form.save()})
+            return HttpResponseRedirect(self.get_success_url())
         formset = self.get_form()
         if not formset.is_valid():
-            messages.error(request, _('There was an error processing product brands'))
-            return render(request, self.template_name, {'formset': formset})
-        formset.save()
+            messages.error(request, _('There was an error processing the changes'))
+            return render(request, self.template_name, self.get_context_data(formset=formset))
+        self.formset_saved(formset.save())
         return self.form_valid(formset)
+
+
+class ProductBrandBulkUpdateView(ChunkedBulkEditView):
+    success_message = _('Products brands updated successfully')
+    matching_success_message = _('Brand set for %(count)s products')
+    queryset = Product.objects.published().filter(brand__isnull=True)
+    formset_class = get_product_brand_formset()
+    matching_form_class = ProductBrandPrefixForm
+
+    def formset_saved(self, objects: List[Product]) -> None:
+        Product.objects.filter(pk__in=[product.pk for product in objects]).brands_changed()